@@ -4,68 +4,160 @@
 app.py
 简单的 Flask Web 应用：
 1. 首页提供多文件上传和日期范围选择（精确到日）。
-2. POST /process 接收文件与日期范围，调用 compute_logic.compute_metrics。
-3. 返回生成的 Excel 文件供下载。
+2. POST /process 接收文件与日期范围，作为后台任务调用 compute_logic.compute_metrics，
+   立即返回任务 id；GET /jobs/<id>/status 查询任务状态，完成后跳转 /jobs/<id>/result。
+3. 结果页的下载由统计结果边生成边输出 Excel（GET /jobs/<id>/export.xlsx），不落临时文件。
 """
 
 from datetime import datetime, date
-from io import BytesIO
-from zipfile import ZipFile
+import json
+import multiprocessing
 import os
-import uuid
-from tempfile import gettempdir
+from urllib.parse import quote
 
 from flask import (
     Flask,
     render_template,
     request,
-    send_file,
     flash,
     redirect,
     url_for,
-    after_this_request,
     session,
+    jsonify,
+    Response,
+    stream_with_context,
 )
 from werkzeug.utils import secure_filename
 
-from compute_logic import compute_metrics
+from compute_logic import aggregate_files, sku_report
+from jobs import DONE, JOB_QUEUE, JobError
+from result_cache import RESULT_CACHE, result_key
+from metrics_query import (
+    FORMATS,
+    PROVINCE_FIELDS,
+    SKU_FIELDS,
+    QueryError,
+    load_stats,
+    query_province,
+    query_sku,
+    sku_rows,
+    to_columns,
+)
+from province_table import MAX_PAGE_ROWS, PAGE_ROWS, ProvinceTable
+from janitor import JANITOR
+from session_store import SESSION_REGISTRY
+from single_flight import ANALYSES
+from upload_store import save_stream
+
+from compute_province_metrics import MissingColumnError, compute_metrics_streams, province_report, sku_view
+from xlsx_writer import XLSX_MIMETYPE, iter_zip, stream_workbook
+from csv_writer import FORMATS as TEXT_FORMATS, mimetype as text_mimetype, stream_delimited
 
-from compute_province_metrics import compute_metrics_streams, build_result_workbook as build_province_workbook
 app = Flask(__name__)
 app.secret_key = "secret-key-change-me"
 
+# SSE 心跳间隔（秒）：没有新进度时按此间隔重发当前进度。浏览器断开要到下一次写入失败时才发现，
+# 之后再等 jobs.DISCONNECT_GRACE 秒无人查看才取消任务，关闭页面的任务最迟约 15 秒后取消
+SSE_HEARTBEAT = 5
+
+
+@app.before_request
+def _start_janitor():
+    """处理第一个请求时启动后台清理线程（按类别 TTL + 总磁盘预算，见 janitor.py）。
+    不在导入时启动：解析子进程（forkserver / spawn）会重新导入主模块，子进程里不需要清理线程"""
+    JANITOR.start()
+
+
+def _session_id(create: bool = False):
+    """当前会话 id（cookie 中只保存该 id，文件列表登记在服务端，见 session_store.py）"""
+    sid = session.get("sid")
+    if sid is None and create:
+        sid = session["sid"] = SESSION_REGISTRY.new_session()
+    return sid
+
+
+@app.before_request
+def _migrate_cookie_files():
+    """旧版 cookie 中的文件列表转入服务端登记。
+
+    更早的 cookie 只有 {name, path}：路径上的文件仍在时按内容存入存储后登记，已不存在的跳过。
+    """
+    if "uploaded_files" not in session:
+        return
+    legacy = session.pop("uploaded_files")
+    entries = []
+    for item in legacy or []:
+        if item.get("sha256"):
+            entries.append((item["name"], item["sha256"], None))
+            continue
+        path = item.get("path")
+        if not path or not os.path.isfile(path):
+            continue
+        filename = secure_filename(item.get("name") or os.path.basename(path))
+        try:
+            with open(path, "rb") as f:
+                digest, stored = save_stream(f, filename)
+        except OSError:
+            continue
+        entries.append((filename, digest, os.path.getsize(stored)))
+    if entries:
+        SESSION_REGISTRY.add_files(_session_id(create=True), entries)
+
+
+def _store_uploads(files, sid):
+    """把上传文件写入内容寻址存储，并登记到会话的文件列表。
+
+    相同内容（摘要相同）只保留一条；同名但内容不同的文件视为新版本，替换旧条目。
+    """
+    entries = []
+    for f in files:
+        filename = secure_filename(f.filename)
+        digest, path = save_stream(f.stream, filename)
+        entries.append((filename, digest, os.path.getsize(path)))
+    SESSION_REGISTRY.add_files(sid, entries)
+
+
+def _result_key(saved, start_date, end_date, mode):
+    """结果缓存键"""
+    return result_key([item["sha256"] for item in saved], start_date, end_date, mode)
+
+
+def _cached_result(cache_key):
+    """命中结果缓存时返回统计结果，否则返回 None"""
+    return RESULT_CACHE.get(cache_key) if cache_key else None
+
 
 @app.route("/")
 def index():
-    # 从session获取已保存文件，在会话期间保持
-    saved_files = session.get("uploaded_files", [])
+    # 会话已保存的文件（服务端登记），在会话期间保持
+    saved_files = [
+        {"name": item["name"], "sha256": item["sha256"], "size": item["size"]}
+        for item in SESSION_REGISTRY.files(_session_id())
+    ]
     return render_template("index.html", saved_files=saved_files)
 
 
-@app.route("/process", methods=["POST"])
-def process():
+def _analysis_inputs():
+    """保存本次上传的文件并解析日期范围，返回 (会话文件列表, 开始日期, 结束日期)；输入有误时抛出 JobError"""
     files = request.files.getlist("files") if "files" in request.files else []
 
     if files and files[0].filename != "":
-        # 有新文件上传，保存到临时目录并加入session
-        saved = session.get("uploaded_files", [])
-        for f in files:
-            filename = secure_filename(f.filename)
-            tmp_path = os.path.join(gettempdir(), f"{uuid.uuid4().hex}_{filename}")
-            f.save(tmp_path)
-            # 避免重复添加相同文件名
-            if not any(item["name"] == filename for item in saved):
-                saved.append({"name": filename, "path": tmp_path})
-        session["uploaded_files"] = saved
-    else:
-        # 没有新文件，使用session中已保存的文件
-        saved = session.get("uploaded_files")
-        if not saved:
-            flash("请至少上传一个文件！")
-            return redirect(url_for("index"))
-    
-    # 记录文件数量，用于后续显示
-    total_files_count = len(saved)
+        # 有新文件上传，按内容摘要存储并登记到会话
+        _store_uploads(files, _session_id(create=True))
+    # 没有新文件时使用会话中已保存的文件
+    sid = _session_id()
+    saved = SESSION_REGISTRY.files(sid)
+    if not saved:
+        raise JobError("请至少上传一个文件！")
+    missing = [item for item in saved if item["path"] is None]
+    if missing:
+        SESSION_REGISTRY.remove_files(sid, [item["sha256"] for item in missing])
+        raise JobError(f"以下文件已被清理，请重新上传：{', '.join(item['name'] for item in missing)}")
+    for item in saved:
+        try:
+            os.utime(item["path"])  # 刷新最近使用时间，供过期清理参考（见 janitor.py）
+        except OSError:
+            pass
 
     # 日期解析
     try:
@@ -74,221 +166,472 @@ def process():
         start_date = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else date.min
         end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else date.max
     except ValueError:
-        flash("日期格式错误，应为 YYYY-MM-DD")
-        return redirect(url_for("index"))
+        raise JobError("日期格式错误，应为 YYYY-MM-DD")
 
     if start_date > end_date:
-        flash("开始日期不能晚于结束日期！")
-        return redirect(url_for("index"))
+        raise JobError("开始日期不能晚于结束日期！")
+    return list(saved), start_date, end_date
 
-    # 读取临时文件到内存流，但不删除文件（保持在session中）
-    file_streams = []
-    for item in saved:
-        with open(item["path"], "rb") as f:
-            file_streams.append(BytesIO(f.read()))
 
-    try:
-        wb, stats = compute_metrics(file_streams, start_date, end_date)
-        if not stats:
-            flash("在所选日期范围内未找到符合条件的数据，请调整日期或检查文件！")
-            return redirect(url_for("index"))
-    except Exception as e:
-        flash(f"处理文件时发生错误: {e}")
-        return redirect(url_for("index"))
+def _analyse_sku(job, saved, start_date, end_date):
+    """后台任务：SKU 指标分析，返回渲染 results.html 所需的参数"""
+    # 直接按路径流式读取上传文件，不整体读入内存
+    file_streams = [item["path"] for item in saved]
+
+    # 相同文件内容 + 日期范围的结果直接取缓存；工作簿在下载时才由统计结果生成
+    cache_key = _result_key(saved, start_date, end_date, "sku")
+    stats = _cached_result(cache_key)
+    if stats is None:
+        def compute(progress, cancel):
+            # 拿到跨进程锁时其它进程可能刚算完，先查一次缓存
+            stats = _cached_result(cache_key)
+            if stats is None:
+                stats = aggregate_files(file_streams, start_date, end_date, progress=progress, cancel=cancel).sku_stats
+                if not stats:
+                    raise JobError("在所选日期范围内未找到符合条件的数据，请调整日期或检查文件！")
+                RESULT_CACHE.put(cache_key, stats)
+            return stats
+
+        # 相同的分析正在进行时挂到它上面，共享一次计算（见 single_flight.py）
+        stats = ANALYSES.run(cache_key, compute, job.progress, job.token)
 
-    # 将结果保存到临时文件
-    temp_filename = f"order_metrics_{uuid.uuid4().hex[:8]}.xlsx"
-    temp_path = os.path.join(gettempdir(), temp_filename)
-    wb.save(temp_path)
-    
     # 准备结果数据用于前端显示
-    results_data = []
-    for sku, metrics in sorted(stats.items(), key=lambda x: (-x[1]["total"], x[0])):
-        total = metrics["total"]
-        if total == 0:
-            continue
-        completed_rate = metrics.get("completed", 0) / total * 100
-        delivered_rate = metrics.get("delivered", 0) / total * 100
-        refund_rate = metrics.get("refund", 0) / total * 100
-        cancel_before_rate = metrics.get("cancel_before", 0) / total * 100
-        cancel_after_rate = metrics.get("cancel_after", 0) / total * 100
-        in_transit_rate = metrics.get("in_transit", 0) / total * 100
-        sign_rate = completed_rate + delivered_rate + refund_rate
-        
-        results_data.append({
-            'seller_sku': sku,
-            'total': total,
-            'sign_rate': round(sign_rate, 2),
-            'completed_rate': round(completed_rate, 2),
-            'delivered_rate': round(delivered_rate, 2),
-            'refund_rate': round(refund_rate, 2),
-            'cancel_before_rate': round(cancel_before_rate, 2),
-            'cancel_after_rate': round(cancel_after_rate, 2),
-            'in_transit_rate': round(in_transit_rate, 2),
-        })
-    
-    return render_template(
-        "results.html",
+    results_data = sku_rows(stats)
+
+    return dict(
         results=results_data,
         sku_count=len(results_data),
         start_date=start_date,
         end_date=end_date,
-        temp_filename=temp_filename,
-        total_files=total_files_count,
+        stats=stats,
+        total_files=len(saved),
         total_orders=sum(r['total'] for r in results_data),
         sku_options=[],
     )
 
 
+def _analyse_province(job, saved, start_date, end_date):
+    """后台任务：按省份分析，返回渲染 results.html 所需的参数"""
+    # 直接按路径流式读取上传文件，不整体读入内存
+    file_streams = [item["path"] for item in saved]
+
+    # 相同文件内容 + 日期范围的结果直接取缓存；工作簿在下载时才由统计结果生成
+    cache_key = _result_key(saved, start_date, end_date, "province")
+    cached = _cached_result(cache_key)
+    if cached is None:
+        def compute(progress, cancel):
+            # 拿到跨进程锁时其它进程可能刚算完，先查一次缓存
+            cached = _cached_result(cache_key)
+            if cached is None:
+                try:
+                    stats, sku_totals = compute_metrics_streams(
+                        file_streams, start_date, end_date, progress=progress, cancel=cancel
+                    )
+                except MissingColumnError as e:
+                    raise JobError(str(e))
+                if not stats:
+                    raise JobError("在所选日期范围内未找到符合条件的数据，请调整日期或检查文件！")
+                cached = {"stats": stats, "sku_totals": sku_totals}
+                RESULT_CACHE.put(cache_key, cached)
+            return cached
+
+        # 相同的分析正在进行时挂到它上面，共享一次计算（见 single_flight.py）
+        cached = ANALYSES.run(cache_key, compute, job.progress, job.token)
+    stats, sku_totals = cached["stats"], cached["sku_totals"]
+
+    # 结果页只渲染 SKU 列表与订单数，省份行由前端按需读取（见 province_table.py）
+    table = ProvinceTable(stats, sku_totals)
+    total_orders = table.total_orders
+    sku_count = len(stats)
+    sku_options = table.sku_list()
+
+    return dict(
+        province_total=len(table),
+        province_table=table,
+        results=[],
+        sku_count=sku_count,
+        start_date=start_date,
+        end_date=end_date,
+        stats=stats,
+        sku_totals=sku_totals,
+        total_files=len(saved),
+        total_orders=total_orders,
+        sku_options=sku_options,
+    )
+
+
+def _wants_json():
+    """前端用 fetch 提交时要求返回 JSON，普通表单提交返回跳转"""
+    return request.accept_mimetypes.best == "application/json"
+
+
+def _job_payload(job):
+    payload = job.to_dict()
+    payload["status_url"] = url_for("job_status", job_id=job.id)
+    payload["result_url"] = url_for("job_result", job_id=job.id)
+    payload["events_url"] = url_for("job_events", job_id=job.id)
+    payload["cancel_url"] = url_for("job_cancel", job_id=job.id)
+    return payload
+
+
+def _submit_analysis(kind, fn):
+    """提交后台分析任务，立即返回任务 id（JSON）或跳转到任务等待页"""
+    try:
+        saved, start_date, end_date = _analysis_inputs()
+        job = JOB_QUEUE.submit(kind, fn, saved, start_date, end_date)
+    except JobError as e:
+        if _wants_json():
+            return jsonify(error=str(e)), e.status_code
+        flash(str(e))
+        return redirect(url_for("index"))
+
+    if _wants_json():
+        return jsonify(_job_payload(job)), 202
+    return redirect(url_for("job_page", job_id=job.id))
+
+
+@app.route("/process", methods=["POST"])
+def process():
+    return _submit_analysis("sku", _analyse_sku)
+
+
 @app.route("/process_province", methods=["POST"])
 def process_province():
-    files = request.files.getlist("files") if "files" in request.files else []
-    
-    if files and files[0].filename != "":
-        # 有新文件上传，保存到临时目录并加入session
-        saved = session.get("uploaded_files", [])
-        for f in files:
-            filename = secure_filename(f.filename)
-            tmp_path = os.path.join(gettempdir(), f"{uuid.uuid4().hex}_{filename}")
-            f.save(tmp_path)
-            # 避免重复添加相同文件名
-            if not any(item["name"] == filename for item in saved):
-                saved.append({"name": filename, "path": tmp_path})
-        session["uploaded_files"] = saved
-    else:
-        # 没有新文件，使用session中已保存的文件
-        saved = session.get("uploaded_files")
-        if not saved:
-            flash("请至少上传一个文件！")
-            return redirect(url_for("index"))
-    
-    # 记录文件数量，用于后续显示
-    total_files_count = len(saved)
+    return _submit_analysis("province", _analyse_province)
 
-    try:
-        start_str = request.form.get("start_date")
-        end_str = request.form.get("end_date")
-        start_date = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else date.min
-        end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else date.max
-    except ValueError:
-        flash("日期格式错误，应为 YYYY-MM-DD")
+
+@app.route("/jobs/<job_id>")
+def job_page(job_id):
+    """任务等待页：轮询任务状态，完成后跳转到结果页"""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        flash("任务不存在或已过期！")
         return redirect(url_for("index"))
+    if not job.pending:
+        return redirect(url_for("job_result", job_id=job.id))
+    JOB_QUEUE.touch(job)
+    return render_template("job.html", job=_job_payload(job))
 
-    if start_date > end_date:
-        flash("开始日期不能晚于结束日期！")
+
+@app.route("/jobs/<job_id>/status")
+def job_status(job_id):
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify(error="任务不存在或已过期"), 404
+    JOB_QUEUE.touch(job)
+    return jsonify(_job_payload(job))
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    """取消任务：解析在下一批行之后停止，任务持有的结果随即释放"""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        if _wants_json():
+            return jsonify(error="任务不存在或已过期"), 404
+        flash("任务不存在或已过期！")
         return redirect(url_for("index"))
+    JOB_QUEUE.cancel(job)
+    if _wants_json():
+        return jsonify(_job_payload(job))
+    flash("分析已取消")
+    return redirect(url_for("index"))
 
-    # 读取临时文件到内存流，但不删除文件（保持在session中）
-    file_streams = []
-    for item in saved:
-        with open(item["path"], "rb") as f:
-            file_streams.append(BytesIO(f.read()))
 
-    try:
-        stats, sku_totals = compute_metrics_streams(file_streams, start_date, end_date)
-        if not stats:
-            flash("在所选日期范围内未找到符合条件的数据，请调整日期或检查文件！")
-            return redirect(url_for("index"))
-        wb = build_province_workbook(stats, sku_totals)
-    except Exception as e:
-        flash(f"处理文件时发生错误: {e}")
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """SSE：推送任务进度（已扫描行数、已读字节、当前文件、预计剩余时间），任务结束后关闭。
+
+    浏览器断开（关闭页面）后若无人再查看，任务自动取消，见 JobQueue.watch。
+    """
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        return jsonify(error="任务不存在或已过期"), 404
+
+    def stream():
+        with JOB_QUEUE.watch(job):
+            while True:
+                payload = _job_payload(job)
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                if not job.pending:
+                    return
+                # 没有新进度时每 SSE_HEARTBEAT 秒重发一次，兼作心跳（写入失败时即可发现连接已断开）
+                job.progress.wait_change(payload["progress"]["version"], timeout=SSE_HEARTBEAT)
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    """渲染已完成任务的结果"""
+    job = JOB_QUEUE.get(job_id)
+    if job is None:
+        flash("任务不存在或已过期！")
+        return redirect(url_for("index"))
+    if job.pending:
+        return redirect(url_for("job_page", job_id=job.id))
+    if job.error:
+        flash(job.error)
         return redirect(url_for("index"))
 
-    temp_filename = f"province_metrics_{uuid.uuid4().hex[:8]}.xlsx"
-    temp_path = os.path.join(gettempdir(), temp_filename)
-    wb.save(temp_path)
-
-    province_results = []
-    for sku, prov_map in sorted(stats.items(), key=lambda x: x[0]):
-        total_sku = sku_totals.get(sku, 0)
-        for prov, m in sorted(prov_map.items(), key=lambda x: (-x[1]["total"], x[0])):
-            total = m["total"]
-            completed_rate = m.get("completed", 0) / total * 100 if total else 0
-            delivered_rate = m.get("delivered", 0) / total * 100 if total else 0
-            refund_rate = m.get("refund", 0) / total * 100 if total else 0
-            cancel_before_rate = m.get("cancel_before", 0) / total * 100 if total else 0
-            cancel_after_rate = m.get("cancel_after", 0) / total * 100 if total else 0
-            in_transit_rate = m.get("in_transit", 0) / total * 100 if total else 0
-            sign_rate = completed_rate + delivered_rate + refund_rate
-            share_rate = total / total_sku * 100 if total_sku else 0
-            province_results.append({
-                'seller_sku': sku,
-                'province': prov,
-                'total': total,
-                'share_rate': round(share_rate, 2),
-                'sign_rate': round(sign_rate, 2),
-                'completed_rate': round(completed_rate, 2),
-                'delivered_rate': round(delivered_rate, 2),
-                'refund_rate': round(refund_rate, 2),
-                'cancel_before_rate': round(cancel_before_rate, 2),
-                'cancel_after_rate': round(cancel_after_rate, 2),
-                'in_transit_rate': round(in_transit_rate, 2),
-            })
-
-    total_orders = sum(r['total'] for r in province_results)
-    sku_count = len(stats)
-    sku_options = [
-        sku for sku, _ in sorted(sku_totals.items(), key=lambda x: (-x[1], x[0]))
+    context = dict(job.result)
+    context.pop("stats")
+    context.pop("sku_totals", None)
+    if context.pop("province_table", None) is not None:
+        context["province_rows_url"] = url_for("province_rows", job_id=job.id)
+        context["sku_provinces_url"] = url_for("sku_provinces", job_id=job.id)
+        context["bundle_url"] = url_for("export_bundle", job_id=job.id)
+    context["export_url"] = url_for("export_xlsx", job_id=job.id)
+    context["export_text_urls"] = [
+        (f"{fmt.upper()}{'.gz' if gz else ''}", url_for("export_text", job_id=job.id, fmt=fmt, gzip=1 if gz else None))
+        for gz in (False, True)
+        for fmt in TEXT_FORMATS
     ]
+    return render_template("results.html", **context)
 
-    return render_template(
-        "results.html",
-        province_results=province_results,
-        results=[],
-        sku_count=sku_count,
+
+def _job_report(job_id):
+    """已完成任务的报表 (表名, 表头, 数据行数, 数据行迭代器)，由任务保留的统计结果生成；不存在时返回 None"""
+    job = JOB_QUEUE.get(job_id)
+    if job is None or job.status != DONE:
+        return None
+    if job.kind == "province":
+        return province_report(job.result["stats"], job.result["sku_totals"])
+    return sku_report(job.result["stats"])
+
+
+def _attachment(chunks, mimetype, ext):
+    """以附件形式流式返回 chunks（分块传输，不设置 Content-Length）"""
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = quote(f"订单指标分析结果_{stamp}.{ext}")
+    return Response(
+        chunks,
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment; filename=order_metrics_{stamp}.{ext}; filename*=UTF-8''{filename}",
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@app.route("/jobs/<job_id>/export.xlsx")
+def export_xlsx(job_id):
+    """下载结果工作簿：由任务的统计结果边生成边输出，可重复下载"""
+    report = _job_report(job_id)
+    if report is None:
+        flash("结果不存在或已过期，请重新计算！")
+        return redirect(url_for("index"))
+    return _attachment(stream_workbook(*report), XLSX_MIMETYPE, "xlsx")
+
+
+@app.route("/jobs/<job_id>/export.<any(csv, tsv):fmt>")
+def export_text(job_id, fmt):
+    """下载 CSV / TSV：由任务的统计结果逐批格式化输出，gzip=1 时边压缩边输出（.csv.gz / .tsv.gz）"""
+    report = _job_report(job_id)
+    if report is None:
+        flash("结果不存在或已过期，请重新计算！")
+        return redirect(url_for("index"))
+    _, headers, _, rows = report
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    chunks = stream_delimited(headers, rows, fmt, compress)
+    return _attachment(chunks, text_mimetype(fmt, compress), f"{fmt}.gz" if compress else fmt)
+
+
+def _bundle_members(stats, sku_totals):
+    """打包下载的成员 (成员名, 字节段迭代器)：SKU 与省份报表各一份工作簿和 CSV。
+    SKU 统计由省份统计汇总得到，与省份结果出自同一次聚合；每个成员在写入 zip 时才逐行生成"""
+    reports = (
+        ("sku_metrics", lambda: sku_report(sku_view(stats))),
+        ("province_metrics", lambda: province_report(stats, sku_totals)),
+    )
+    for name, report in reports:
+        yield f"{name}.xlsx", stream_workbook(*report())
+        _, headers, _, rows = report()
+        yield f"{name}.csv", stream_delimited(headers, rows, "csv")
+
+
+@app.route("/jobs/<job_id>/bundle.zip")
+def export_bundle(job_id):
+    """打包下载全部报表（仅省份分析任务）：zip 边压缩边输出，不在内存或磁盘中缓存整份文件"""
+    job = JOB_QUEUE.get(job_id)
+    if job is None or job.status != DONE:
+        flash("结果不存在或已过期，请重新计算！")
+        return redirect(url_for("index"))
+    if job.kind != "province":
+        flash("打包下载需要省份分析结果（同时包含 SKU 与省份报表），请点击“省份分析”")
+        return redirect(url_for("job_result", job_id=job.id))
+    chunks = iter_zip(_bundle_members(job.result["stats"], job.result["sku_totals"]))
+    return _attachment(chunks, "application/zip", "zip")
+
+
+def _province_table(job_id):
+    """已完成的省份分析任务的结果表，不存在或已过期时返回 None"""
+    job = JOB_QUEUE.get(job_id)
+    if job is None or job.status != DONE:
+        return None
+    return job.result.get("province_table")
+
+
+@app.route("/jobs/<job_id>/sku_provinces")
+def sku_provinces(job_id):
+    """单个 SKU（参数 sku）的省份明细，结果页选择 SKU 时按需读取"""
+    table = _province_table(job_id)
+    if table is None:
+        return jsonify(error="结果不存在或已过期，请重新计算"), 404
+    sku = request.args.get("sku", "")
+    rows = table.sku_rows(sku)
+    if rows is None:
+        return jsonify(error=f"未找到 SKU: {sku}"), 404
+    return jsonify(sku=sku, total=table.sku_totals.get(sku, 0), rows=rows)
+
+
+@app.route("/jobs/<job_id>/province_rows")
+def province_rows(job_id):
+    """省份结果分页：offset/limit 分页，sort + order(asc/desc) 排序，sku 过滤，均在服务端完成"""
+    table = _province_table(job_id)
+    if table is None:
+        return jsonify(error="结果不存在或已过期，请重新计算"), 404
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = int(request.args.get("limit", PAGE_ROWS))
+        total, rows = table.page(
+            offset,
+            min(limit, MAX_PAGE_ROWS),
+            sort=request.args.get("sort") or None,
+            descending=request.args.get("order") == "desc",
+            sku=request.args.get("sku") or None,
+        )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(total=total, offset=offset, rows=rows)
+
+
+def _api_list(params, name):
+    """列表参数：JSON 中的数组，或查询串中重复 / 逗号分隔的值"""
+    if request.is_json:
+        value = params.get(name) or []
+        if isinstance(value, str):
+            return [value]
+        if not isinstance(value, list) or not all(isinstance(v, (str, int, float)) for v in value):
+            raise QueryError(f"{name} 应为字符串或字符串数组")
+        return [str(v) for v in value]
+    return [v for raw in request.args.getlist(name) for v in raw.split(",") if v]
+
+
+def _api_query(mode):
+    """解析查询参数并取得统计结果，返回 (参数, 统计结果, 来源)；参数有误时抛出 QueryError"""
+    if request.is_json:
+        params = request.get_json(silent=True)
+        if params is None:
+            raise QueryError("请求体不是合法 JSON")
+    else:
+        params = request.args
+    if not isinstance(params, dict):
+        raise QueryError("请求体应为 JSON 对象")
+    try:
+        start_str, end_str = params.get("start_date"), params.get("end_date")
+        start_date = datetime.strptime(start_str, "%Y-%m-%d").date() if start_str else date.min
+        end_date = datetime.strptime(end_str, "%Y-%m-%d").date() if end_str else date.max
+    except (TypeError, ValueError):
+        raise QueryError("日期格式错误，应为 YYYY-MM-DD")
+    if start_date > end_date:
+        raise QueryError("开始日期不能晚于结束日期！")
+    try:
+        offset = int(params.get("offset") or 0)
+        limit = params.get("limit")
+        limit = int(limit) if limit not in (None, "") else None
+    except (TypeError, ValueError):
+        raise QueryError("offset / limit 应为整数")
+    fmt = params.get("format") or "rows"
+    if not isinstance(fmt, str) or fmt not in FORMATS:
+        raise QueryError(f"不支持的格式: {fmt}（可选 {', '.join(FORMATS)}）")
+
+    query = dict(
+        files=_api_list(params, "files"),
         start_date=start_date,
         end_date=end_date,
-        temp_filename=temp_filename,
-        total_files=total_files_count,
-        total_orders=total_orders,
-        sku_options=sku_options,
+        skus=_api_list(params, "skus"),
+        provinces=_api_list(params, "provinces"),
+        sort=params.get("sort") or None,
+        descending=params.get("order") == "desc",
+        offset=offset,
+        limit=limit,
+        format=fmt,
     )
-@app.route("/download/<filename>")
-def download(filename):
-    """下载临时生成的结果文件"""
-    temp_path = os.path.join(gettempdir(), filename)
-    if not os.path.exists(temp_path):
-        flash("文件不存在或已过期！")
-        return redirect(url_for("index"))
-    
-    def remove_file():
-        """下载后删除临时文件"""
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-    
-    # 使用 Flask 的 after_this_request 在响应后删除文件
-    @after_this_request
-    def cleanup(response):
-        remove_file()
-        return response
-    
-    return send_file(temp_path, 
-                    as_attachment=True, 
-                    download_name=f"订单指标分析结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    stats, source = load_stats(query["files"], start_date, end_date, mode)
+    return query, stats, source
+
+
+def _api_response(query, total, rows, fields, source):
+    payload = {
+        "files": query["files"],
+        "start_date": query["start_date"].isoformat() if query["start_date"] != date.min else None,
+        "end_date": query["end_date"].isoformat() if query["end_date"] != date.max else None,
+        "total": total,
+        "offset": query["offset"],
+        "limit": query["limit"],
+        "source": source,
+    }
+    if query["format"] == "columns":
+        payload["fields"] = list(fields)
+        payload["columns"] = to_columns(rows, fields)
+    else:
+        payload["rows"] = rows
+    return jsonify(payload)
+
+
+@app.route("/api/storage")
+def api_storage():
+    """各类临时文件（上传、列式缓存、结果缓存、残留文件、会话库）的占用与最近一次清理结果"""
+    return jsonify(JANITOR.report())
+
+
+@app.route("/api/metrics/sku", methods=["GET", "POST"])
+def api_sku_metrics():
+    """SKU 指标（与 /process 一致）的 JSON 查询：按文件摘要 + 日期范围，支持 SKU 过滤、排序、分页与按列返回"""
+    try:
+        query, stats, source = _api_query("sku")
+        total, rows = query_sku(stats, query["skus"], query["sort"], query["descending"], query["offset"], query["limit"])
+    except QueryError as e:
+        return jsonify(error=str(e)), e.status_code
+    return _api_response(query, total, rows, SKU_FIELDS, source)
+
+
+@app.route("/api/metrics/province", methods=["GET", "POST"])
+def api_province_metrics():
+    """SKU×省份 指标（与 /process_province 一致）的 JSON 查询，额外支持省份过滤"""
+    try:
+        query, result, source = _api_query("province")
+        total, rows = query_province(
+            result["stats"],
+            result["sku_totals"],
+            query["skus"],
+            query["provinces"],
+            query["sort"],
+            query["descending"],
+            query["offset"],
+            query["limit"],
+        )
+    except QueryError as e:
+        return jsonify(error=str(e)), e.status_code
+    return _api_response(query, total, rows, PROVINCE_FIELDS, source)
 
 
 @app.route("/clear_files", methods=["POST"])
 def clear_files():
-    """清除session中保存的所有文件"""
-    saved_files = session.get("uploaded_files", [])
-    
-    # 删除临时文件
-    for item in saved_files:
-        try:
-            if os.path.exists(item["path"]):
-                os.remove(item["path"])
-        except:
-            pass
-    
-    # 清空session
-    session.pop("uploaded_files", None)
+    """清除会话中保存的所有文件"""
+    # 上传文件按内容存储，可能仍被其它会话引用，这里只清空本会话的登记，不删除文件
+    SESSION_REGISTRY.clear(_session_id())
     flash("已清除所有上传文件！")
     return redirect(url_for("index"))
 
 
 if __name__ == "__main__":
-    # 在本地测试使用，部署时请使用 WSGI Server
+    # 打包为 exe 时多进程解析需要 freeze_support
+    multiprocessing.freeze_support()
+    # 在本地测试使用（调试模式），部署时请使用 serve.py（多进程、平滑重载）
     app.run(host="0.0.0.0", port=4004, debug=True) 
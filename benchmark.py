@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmark.py
+--------------------------------------------------
+读取性能对比脚本（不参与 Web 服务运行）。
+
+用法：
+    python benchmark.py gen  orders.xlsx --rows 300000     # 生成模拟订单导出
+    python benchmark.py ingest orders.xlsx                 # 对比各读取引擎
+    python benchmark.py ingest orders.xlsx --engines readonly,sheetxml
+
+每个引擎在独立子进程中运行，分别统计峰值内存 (peak RSS) 与每秒行数。
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块
+    resource = None
+
+# 模拟 TikTok 订单导出的列（约 50 列，其中只有少数几列参与计算）
+EXPORT_HEADERS = [
+    "Order ID", "Order Status", "Order Substatus", "Cancelation/Return Type", "Normal or Pre-order",
+    "SKU ID", "Seller SKU", "Product Name", "Variation", "Quantity",
+    "Sku Quantity of return", "SKU Unit Original Price", "SKU Subtotal Before Discount",
+    "SKU Platform Discount", "SKU Seller Discount", "SKU Subtotal After Discount",
+    "Shipping Fee After Discount", "Original Shipping Fee", "Shipping Fee Seller Discount",
+    "Shipping Fee Platform Discount", "Payment platform discount", "Taxes", "Order Amount",
+    "Order Refund Amount", "Created Time", "Paid Time", "RTS Time", "Shipped Time",
+    "Delivered Time", "Cancelled Time", "Cancel By", "Cancel Reason", "Fulfillment Type",
+    "Warehouse Name", "Tracking ID", "Delivery Option", "Shipping Provider Name",
+    "Buyer Message", "Buyer Username", "Recipient", "Phone #", "Zipcode", "Country",
+    "Province", "City", "Districts", "Villages", "Detail Address", "Additional address information",
+    "Payment Method", "Weight(kg)", "Product Category", "Package ID", "Seller Note",
+]
+
+SUBSTATUS_CHOICES = ["已完成", "已送达", "运输中", "已取消", "Completed", "Delivered", "In transit", "Canceled", "Return/Refund"]
+PROVINCES = ["广东", "浙江", "江苏", "山东", "河南", "四川", "湖北", "湖南", "福建", "上海", "北京", "天津"]
+
+
+def generate(path: str, rows: int, seed: int = 7, shared_strings: bool = False):
+    """生成一个宽表订单导出（第 2 行为描述行）。
+
+    默认用 write_only 模式（内联字符串）；shared_strings=True 时用普通模式写出，
+    字符串进入 sharedStrings.xml，更接近平台导出的真实文件，但生成时占用内存较多。
+    """
+    from openpyxl import Workbook
+
+    rnd = random.Random(seed)
+    if shared_strings:
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "orders"
+    else:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("orders")
+    ws.append(EXPORT_HEADERS)
+    ws.append([f"{h} description" for h in EXPORT_HEADERS])
+    idx = {h: i for i, h in enumerate(EXPORT_HEADERS)}
+    base = datetime(2025, 6, 1)
+    for n in range(rows):
+        row = [f"v{n % 97}"] * len(EXPORT_HEADERS)
+        sub = rnd.choice(SUBSTATUS_CHOICES)
+        created = base + timedelta(minutes=rnd.randrange(60 * 24 * 60))
+        row[idx["Order ID"]] = str(580000000000000000 + n)
+        row[idx["Order Substatus"]] = sub
+        row[idx["Cancelation/Return Type"]] = "Cancel" if sub in ("已取消", "Canceled") else ""
+        row[idx["Seller SKU"]] = f"SKU-{rnd.randrange(300):04d}"
+        row[idx["Created Time"]] = created.strftime("%d/%m/%Y %H:%M:%S")
+        row[idx["Shipped Time"]] = "" if rnd.random() < 0.3 else (created + timedelta(days=1)).strftime("%d/%m/%Y %H:%M:%S")
+        row[idx["Province"]] = rnd.choice(PROVINCES)
+        row[idx["Quantity"]] = rnd.randrange(1, 5)
+        ws.append(row)
+    wb.save(path)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    if sys.platform == "darwin":
+        return round(peak / 1024 / 1024, 1)
+    return round(peak / 1024, 1)
+
+
+def _ingest_worker(path: str, engine: str, reader: str):
+    """子进程入口：完整遍历一次文件，输出 JSON 结果"""
+    if reader == "province":
+        from compute_province_metrics import _iter_rows_stream as iter_rows
+    else:
+        from compute_logic import _iter_rows as iter_rows
+
+    t0 = time.perf_counter()
+    count = 0
+    for _ in iter_rows(path, engine=engine):
+        count += 1
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({
+        "engine": engine,
+        "rows": count,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(count / elapsed) if elapsed else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }))
+
+
+def run_ingest(path: str, engines, reader: str):
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for engine in engines:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_worker", path, engine, reader],
+            cwd=here, capture_output=True, text=True,
+        )
+        if out.returncode != 0:
+            print(f"[{engine}] 运行失败:\n{out.stderr}")
+            continue
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    size_mb = os.path.getsize(path) / 1024 / 1024
+    print(f"文件: {path} ({size_mb:.1f} MB), 读取器: {reader}")
+    print(f"{'engine':<10}{'rows':>10}{'seconds':>10}{'rows/sec':>12}{'peak RSS(MB)':>14}")
+    for r in results:
+        print(f"{r['engine']:<10}{r['rows']:>10}{r['seconds']:>10}{r['rows_per_sec']:>12}{str(r['peak_rss_mb']):>14}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订单读取性能对比")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_gen = sub.add_parser("gen", help="生成模拟订单导出 .xlsx")
+    p_gen.add_argument("path")
+    p_gen.add_argument("--rows", type=int, default=100000)
+    p_gen.add_argument("--shared-strings", action="store_true", help="字符串写入共享字符串表")
+
+    p_ing = sub.add_parser("ingest", help="对比读取引擎的峰值内存与吞吐")
+    p_ing.add_argument("path")
+    p_ing.add_argument("--engines", default="full,readonly,sheetxml")
+    p_ing.add_argument("--reader", choices=["sku", "province"], default="sku")
+
+    p_worker = sub.add_parser("_worker")
+    p_worker.add_argument("path")
+    p_worker.add_argument("engine")
+    p_worker.add_argument("reader")
+
+    args = parser.parse_args()
+    if args.cmd == "gen":
+        generate(args.path, args.rows, shared_strings=args.shared_strings)
+        print(f"已生成 {args.rows} 行: {args.path}")
+    elif args.cmd == "ingest":
+        run_ingest(args.path, args.engines.split(","), args.reader)
+    elif args.cmd == "_worker":
+        _ingest_worker(args.path, args.engine, args.reader)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+columnar_cache.py
+--------------------------------------------------
+已解析上传文件的列式缓存。
+
+每个文件首次解析后保存为一个紧凑的列式文件，之后的分析（例如只改了日期范围）
+只读缓存，不再解析 .xlsx / .csv：
+- Seller SKU、省份、(子状态, 取消类型) 分别字典编码为小整数；
+- Shipped Time 是否为空存为 1 个字节的标志位；
+- Created Time 存为整数日序号 (date.toordinal)，无法解析时为 -1；
+- 另存一列组合编码 (SKU, 省份, 状态, 是否发货) 的下标，行按日序号排序。
+
+按日期范围查询时先二分定位行区间，再对组合编码列计数，不需要逐行解析。
+
+文件格式：MAGIC + 4 字节头长度 + JSON 头（字典与列说明）+ 各列原始数组。
+"""
+
+import json
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from tempfile import gettempdir
+from typing import Dict, List, Tuple
+
+from order_status import is_blank
+
+MAGIC = b"OACOL1\n"
+FORMAT_VERSION = 1
+
+CACHE_DIR = os.environ.get("ORDER_ANALYSIS_CACHE_DIR", os.path.join(gettempdir(), "order_analysis_cache"))
+
+# 列名 -> array 类型码
+COLUMNS = (
+    ("day", "i"),
+    ("sku", "I"),
+    ("province", "I"),
+    ("status", "I"),
+    ("shipped", "B"),
+    ("group", "I"),
+)
+
+
+def _cell_text(value):
+    """状态类单元格统一存为字符串（None 保留），分类结果不受影响"""
+    return None if value is None else str(value)
+
+
+class ColumnarBuilder:
+    """边解析边追加行，最后 finish() 得到按日序号排序的 OrderColumns"""
+
+    def __init__(self):
+        self.skus: Dict[str, int] = {}
+        self.provinces: Dict[str, int] = {}
+        self.statuses: Dict[tuple, int] = {}
+        self.groups: Dict[tuple, int] = {}
+        self.data = {name: array(code) for name, code in COLUMNS}
+
+    def add_rows(self, rows, parse_date) -> int:
+        """rows 的列顺序同 compute_logic.ENGINE_KEYS；parse_date 把 Created Time 解析为 date。
+
+        返回读取的行数（含被跳过的空 SKU 行），调用方据此按批处理。
+        """
+        seen = 0
+        skus, provinces, statuses, groups = self.skus, self.provinces, self.statuses, self.groups
+        day_col = self.data["day"].append
+        sku_col = self.data["sku"].append
+        prov_col = self.data["province"].append
+        status_col = self.data["status"].append
+        shipped_col = self.data["shipped"].append
+        group_col = self.data["group"].append
+
+        for seen, (seller_sku, sub, cancel, shipped, created, province) in enumerate(rows, 1):
+            if seller_sku is None:
+                continue
+            sku = str(seller_sku)
+            prov = str(province).strip() if province is not None else ""
+            s = skus.get(sku)
+            if s is None:
+                s = skus[sku] = len(skus)
+            p = provinces.get(prov)
+            if p is None:
+                p = provinces[prov] = len(provinces)
+            st = statuses.get((sub, cancel))
+            if st is None:
+                st = statuses[(sub, cancel)] = len(statuses)
+            sh = 0 if is_blank(shipped) else 1
+            g = groups.get((s, p, st, sh))
+            if g is None:
+                g = groups[(s, p, st, sh)] = len(groups)
+            d = parse_date(created)
+            day_col(d.toordinal() if d is not None else -1)
+            sku_col(s)
+            prov_col(p)
+            status_col(st)
+            shipped_col(sh)
+            group_col(g)
+        return seen
+
+    def extend(self, other: "ColumnarBuilder"):
+        """追加另一个构建器（同一文件的后续区间）的全部行，编码按本构建器的字典重映射"""
+        def remap(mine: dict, theirs: dict) -> List[int]:
+            out = [0] * len(theirs)
+            for value, code in theirs.items():
+                m = mine.get(value)
+                if m is None:
+                    m = mine[value] = len(mine)
+                out[code] = m
+            return out
+
+        sku_map = remap(self.skus, other.skus)
+        prov_map = remap(self.provinces, other.provinces)
+        status_map = remap(self.statuses, other.statuses)
+        group_keys = [None] * len(other.groups)
+        for (s, p, st, sh), code in other.groups.items():
+            group_keys[code] = (sku_map[s], prov_map[p], status_map[st], sh)
+        group_map = remap(self.groups, {k: i for i, k in enumerate(group_keys)})
+
+        data, theirs = self.data, other.data
+        data["day"].extend(theirs["day"])
+        data["shipped"].extend(theirs["shipped"])
+        data["sku"].extend(array("I", [sku_map[c] for c in theirs["sku"]]))
+        data["province"].extend(array("I", [prov_map[c] for c in theirs["province"]]))
+        data["status"].extend(array("I", [status_map[c] for c in theirs["status"]]))
+        data["group"].extend(array("I", [group_map[c] for c in theirs["group"]]))
+
+    def finish(self, name: str, has_province: bool) -> "OrderColumns":
+        day = self.data["day"]
+        order = sorted(range(len(day)), key=day.__getitem__)
+        columns = {}
+        for col, code in COLUMNS:
+            src = self.data[col]
+            columns[col] = array(code, [src[i] for i in order])
+
+        def as_list(d: dict) -> list:
+            return list(d)  # 字典按编码顺序插入，下标即编码
+
+        return OrderColumns(
+            name=name,
+            has_province=has_province,
+            skus=as_list(self.skus),
+            provinces=as_list(self.provinces),
+            statuses=[(_cell_text(a), _cell_text(b)) for a, b in self.statuses],
+            groups=as_list(self.groups),
+            columns=columns,
+        )
+
+
+class OrderColumns:
+    """单个文件的列式数据（行按日序号升序）"""
+
+    def __init__(self, name, has_province, skus, provinces, statuses, groups, columns):
+        self.name = name
+        self.has_province = has_province
+        self.skus: List[str] = skus
+        self.provinces: List[str] = provinces
+        self.statuses: List[Tuple] = statuses
+        self.groups: List[Tuple[int, int, int, int]] = groups
+        self.columns: Dict[str, array] = columns
+
+    @property
+    def rows(self) -> int:
+        return len(self.columns["day"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in self.columns.values())
+
+    def row_range(self, start_day, end_day) -> Tuple[int, int]:
+        """返回日序号在 [start_day, end_day] 内的行区间；start_day 为 None 时返回全部行（含无法解析日期的行）"""
+        day = self.columns["day"]
+        if start_day is None:
+            return 0, len(day)
+        return bisect_left(day, start_day), bisect_right(day, end_day)
+
+    def query(self, start_day, end_day, classify, width: int) -> Tuple[Dict[tuple, List[int]], int]:
+        """按日期范围统计，返回 ({(sku, 省份): [订单数, 各类别计数...]}, 行数)。
+
+        classify(sub, cancel, shipped_empty) 返回类别代码（-1 表示其它），width 为计数列表长度。
+        """
+        lo, hi = self.row_range(start_day, end_day)
+        counts = Counter(self.columns["group"][lo:hi])
+        cells: Dict[tuple, List[int]] = {}
+        skus, provinces, statuses, groups = self.skus, self.provinces, self.statuses, self.groups
+        for g, n in counts.items():
+            s, p, st, sh = groups[g]
+            key = (skus[s], provinces[p])
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0] * width
+            cell[0] += n
+            sub, cancel = statuses[st]
+            code = classify(sub, cancel, not sh)
+            if code >= 0:
+                cell[code + 1] += n
+        return cells, hi - lo
+
+    def save(self, path: str):
+        """原子写入：先写临时文件再替换"""
+        header = {
+            "version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "name": self.name,
+            "has_province": self.has_province,
+            "rows": self.rows,
+            "skus": self.skus,
+            "provinces": self.provinces,
+            "statuses": self.statuses,
+            "groups": self.groups,
+            "columns": [[name, code, array(code).itemsize] for name, code in COLUMNS],
+        }
+        raw = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(raw)))
+            f.write(raw)
+            for name, _ in COLUMNS:
+                self.columns[name].tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "OrderColumns":
+        """读取列式文件；格式不兼容时抛出 ValueError"""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("不是列式缓存文件")
+            (size,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(size).decode("utf-8"))
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError("列式缓存版本不匹配")
+            n = header["rows"]
+            columns = {}
+            for name, code, itemsize in header["columns"]:
+                arr = array(code)
+                if arr.itemsize != itemsize:
+                    raise ValueError("列式缓存与当前平台不兼容")
+                arr.fromfile(f, n)
+                if header["byteorder"] != sys.byteorder:
+                    arr.byteswap()
+                columns[name] = arr
+        return cls(
+            name=header["name"],
+            has_province=header["has_province"],
+            skus=header["skus"],
+            provinces=header["provinces"],
+            statuses=[tuple(x) for x in header["statuses"]],
+            groups=[tuple(x) for x in header["groups"]],
+            columns=columns,
+        )
+
+
+def cache_path(key: str, ext: str = "col") -> str:
+    """缓存文件路径（目录不存在时自动创建）；同一文件的其它缓存（如 .cube）用不同扩展名"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, f"{key}.{ext}")
@@ -10,18 +10,36 @@ compute_logic.py
 3. 以 Seller SKU 为分组键输出各项指标。
 """
 
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from datetime import datetime, date
 from io import BytesIO, TextIOWrapper
-from typing import Dict, List, Iterable, Union
+from itertools import islice
+from operator import itemgetter
+from queue import Empty
+from typing import Dict, List, Iterable, Sequence, Union
+import multiprocessing
+import os
 import re
 import csv
-from zipfile import BadZipFile
+import threading
+import time
+from zipfile import BadZipFile, is_zipfile
 
 from openpyxl import load_workbook, Workbook
 from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import from_excel
 from openpyxl.utils.exceptions import InvalidFileException
 
+from columnar_cache import ColumnarBuilder, OrderColumns, cache_path
+from csv_ranges import align_splits, count_quotes, open_range, raw_splits, read_head
+from daily_cube import DailyCube
+from date_parsing import DateColumnParser
+from order_status import CATEGORY_KEYS, DEFAULT_CLASSIFIER, OTHER, StatusClassifier, is_blank
+from progress import PROGRESS_BATCH, CancelToken, Cancelled, Progress
+from upload_store import file_digest
+from xlsx_reader import XlsxSheetReader
+
 # 列映射
 TARGET_COLUMNS = {
     "order_substatus": ["order substatus"],
@@ -31,6 +49,24 @@ TARGET_COLUMNS = {
     "created_time": ["created time"],
 }
 
+# 可选列：存在时一并定位，缺失不报错
+OPTIONAL_COLUMNS = {
+    # 省份/州/城市等地域字段，兼容常见导出列名
+    "province": [
+        "province",            # 省份
+        "state",               # 州/省
+        "province/state",      # 组合列名
+        "state/province",      # 组合列名
+        "province name",       # 省份名称
+    ],
+}
+
+# .xlsx 读取引擎：
+#   "sheetxml"  按列投影直接解析工作表 XML（默认，见 xlsx_reader.py）
+#   "readonly"  openpyxl 只读流式模式
+#   "full"      openpyxl 整表加载模式（旧实现，仅用于对比）
+XLSX_ENGINE = "sheetxml"
+
 
 def _norm(text):
     return str(text).strip().lower() if text is not None else ""
@@ -46,50 +82,130 @@ def _locate_cols(headers: List[str]):
                 break
         if key not in idx_map:
             raise KeyError(f"列缺失: {aliases[0]}")
+    for key, aliases in OPTIONAL_COLUMNS.items():
+        for a in aliases:
+            if a in header_map:
+                idx_map[key] = header_map[a]
+                break
     return idx_map
 
 
-def _iter_rows(file_bytes: Union[str, bytes, BytesIO]):
-    """遍历文件行，兼容 .xlsx 与 .csv"""
+def _open_source(file_bytes: Union[str, bytes, BytesIO]):
+    """把路径 / bytes / 流统一成可 seek 的二进制文件对象，返回 (fp, 是否需要关闭)"""
     if isinstance(file_bytes, str):
-        with open(file_bytes, "rb") as f:
-            data = BytesIO(f.read())
-    elif isinstance(file_bytes, bytes):
-        data = BytesIO(file_bytes)
-    else:
-        data = file_bytes
-        data.seek(0)
+        # 直接按路径打开，不再整体读入内存
+        return open(file_bytes, "rb"), True
+    if isinstance(file_bytes, bytes):
+        return BytesIO(file_bytes), False
+    file_bytes.seek(0)
+    return file_bytes, False
 
-    try:
+
+def _iter_sheet_values(data, engine: str = XLSX_ENGINE):
+    """逐行产出活动工作表的原始值元组（含标题行与描述行）。
+
+    engine="readonly" 为流式只读模式，内存不随行数增长；
+    engine="full" 为旧的整表 DOM 模式，仅保留用于对比测试。
+    （engine="sheetxml" 不经过这里，见 _iter_projected）
+    """
+    if engine == "full":
         wb = load_workbook(data, data_only=True)
+    else:
+        wb = load_workbook(data, read_only=True, data_only=True)
+    try:
         ws = wb.active
-        header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
-        headers = list(header_row)
-        cols = _locate_cols(headers)
-        for row in ws.iter_rows(min_row=3, values_only=True):  # 跳过描述行
-            yield (
-                row[cols["seller_sku"]],
-                row[cols["order_substatus"]],
-                row[cols["cancel_type"]],
-                row[cols["shipped_time"]],
-                row[cols["created_time"]],
-            )
+        if engine != "full":
+            # 部分导出工具写入的 dimension 不可靠（如 "A1"），会导致只读模式只读到第一列；
+            # 清除后按行内实际单元格产出，行可能长短不一，由 _project 兜底。
+            ws.reset_dimensions()
+        yield from ws.iter_rows(min_row=1, values_only=True)
+    finally:
         wb.close()
-    except (InvalidFileException, BadZipFile):
+
+
+def _project(rows, cols: Dict[str, int], keys: Sequence[str]):
+    """按列名投影每一行，缺失的尾部单元格补 None"""
+    idxs = [cols[k] for k in keys]
+    need = max(idxs) + 1
+    getter = itemgetter(*idxs)
+    for row in rows:
+        if len(row) >= need:
+            yield getter(row)
+        else:
+            n = len(row)
+            yield tuple(row[i] if i < n else None for i in idxs)
+
+
+def _present_keys(cols: Dict[str, int], keys: Sequence[str]) -> Sequence[str]:
+    """返回已定位到的列；未定位的可选列只允许出现在 keys 末尾"""
+    present = [k for k in keys if k in cols]
+    if list(keys[:len(present)]) != present:
+        raise KeyError(f"列缺失: {[k for k in keys if k not in cols]}")
+    return present
+
+
+def _pad(rows, missing: int):
+    """为缺失的尾部可选列补 None"""
+    if not missing:
+        return rows
+    pad = (None,) * missing
+    return (row + pad for row in rows)
+
+
+def _iter_projected(file_bytes: Union[str, bytes, BytesIO], locate, keys: Sequence[str], engine: str = XLSX_ENGINE):
+    """打开文件，按 keys 投影产出数据行（已跳过标题行与第 2 行描述行），兼容 .xlsx 与 .csv
+
+    keys 末尾的可选列（见 OPTIONAL_COLUMNS）在文件中缺失时取值为 None。
+    """
+    data, owned = _open_source(file_bytes)
+    try:
+        if engine == "sheetxml":
+            try:
+                reader = XlsxSheetReader(data)
+            except (InvalidFileException, BadZipFile):
+                reader = None
+            if reader is not None:
+                try:
+                    cols = locate(reader.read_header())
+                    present = _present_keys(cols, keys)
+                    rows = reader.iter_rows([cols[k] for k in present], min_row=3)  # 跳过描述行
+                    yield from _pad(rows, len(keys) - len(present))
+                finally:
+                    reader.close()
+                return
+        else:
+            rows = _iter_sheet_values(data, engine)
+            try:
+                headers = list(next(rows, ()))
+            except (InvalidFileException, BadZipFile):
+                rows = None
+            if rows is not None:
+                cols = locate(headers)
+                present = _present_keys(cols, keys)
+                next(rows, None)  # 跳过描述行
+                yield from _pad(_project(rows, cols, present), len(keys) - len(present))
+                return
+
         data.seek(0)
-        wrapper = TextIOWrapper(data, encoding="utf-8-sig")
+        wrapper = TextIOWrapper(data, encoding="utf-8-sig", newline="")
         reader = csv.reader(wrapper)
         headers = next(reader)
-        cols = _locate_cols(headers)
+        cols = locate(headers)
+        present = _present_keys(cols, keys)
         next(reader, None)  # 跳过描述行
-        for row in reader:
-            yield (
-                row[cols["seller_sku"]] if cols["seller_sku"] < len(row) else None,
-                row[cols["order_substatus"]] if cols["order_substatus"] < len(row) else None,
-                row[cols["cancel_type"]] if cols["cancel_type"] < len(row) else None,
-                row[cols["shipped_time"]] if cols["shipped_time"] < len(row) else None,
-                row[cols["created_time"]] if cols["created_time"] < len(row) else None,
-            )
+        yield from _pad(_project(reader, cols, present), len(keys) - len(present))
+        wrapper.detach()
+    finally:
+        if owned:
+            data.close()
+
+
+ROW_KEYS = ("seller_sku", "order_substatus", "cancel_type", "shipped_time", "created_time")
+
+
+def _iter_rows(file_bytes: Union[str, bytes, BytesIO], engine: str = XLSX_ENGINE):
+    """遍历文件行，兼容 .xlsx 与 .csv"""
+    return _iter_projected(file_bytes, _locate_cols, ROW_KEYS, engine)
 
 
 def _to_date(val) -> Union[date, None]:
@@ -105,7 +221,6 @@ def _to_date(val) -> Union[date, None]:
     # 如果是 Excel 序列号 (openpyxl 会转为数字类型且未设置 date_only)
     if isinstance(val, (int, float)):
         try:
-            from openpyxl.utils.datetime import from_excel
             return from_excel(val).date()
         except Exception:
             pass
@@ -147,79 +262,595 @@ def _date_in_range(d: Union[datetime, date, str, int, float, None], start: date,
     return start <= parsed <= end
 
 
-def compute_metrics(file_streams: Iterable[BytesIO], start_date: date, end_date: date):
-    """核心接口：返回 (Workbook, stats_dict)"""
-    stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-    total_rows = 0
+class ScanPartial:
+    """单个文件的紧凑扫描结果，可在进程间传递并合并。
+
+    cells[(sku, 省份)] = [订单数, 各类别计数...]，类别顺序同 order_status.CATEGORY_KEYS。
+    """
 
+    __slots__ = ("name", "cells", "rows", "has_province", "seconds")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.cells: Dict[tuple, List[int]] = {}
+        self.rows = 0
+        self.has_province = True
+        self.seconds = 0.0
+
+    def update(self, other: "ScanPartial"):
+        """累加同一文件另一区间的结果（按区间顺序调用，键的先后顺序与串行扫描一致）"""
+        cells = self.cells
+        for key, counts in other.cells.items():
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = list(counts)
+            else:
+                for i, n in enumerate(counts):
+                    cell[i] += n
+        self.rows += other.rows
+
+
+class OrderAggregate:
+    """一次扫描得到的聚合结果，同时包含 SKU 级与 SKU×省份级计数。
+
+    - sku_stats[sku][指标]            供 /process (compute_metrics) 使用
+    - province_stats[sku][省份][指标]  供 /process_province (compute_metrics_streams) 使用
+    - sku_totals[sku]                 SKU 总订单数
+    - file_timings                    每个文件的行数与解析耗时
+    """
+
+    def __init__(self):
+        self.sku_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.province_stats: Dict[str, Dict[str, Dict[str, int]]] = defaultdict(
+            lambda: defaultdict(lambda: defaultdict(int))
+        )
+        self.sku_totals: Dict[str, int] = defaultdict(int)
+        self.total_rows = 0
+        # 所有文件都带省份列时为 True；缺失时省份统一记为 ""，省份视图据此报错
+        self.has_province = True
+        self.missing_province: List[str] = []
+        self.file_timings: List[Dict[str, object]] = []
+
+    def merge(self, part: ScanPartial):
+        """把单个文件的扫描结果合并进来（按文件顺序合并，结果与串行扫描一致）"""
+        sku_stats = self.sku_stats
+        province_stats = self.province_stats
+        sku_totals = self.sku_totals
+        for (sku, prov), counts in part.cells.items():
+            s = sku_stats[sku]
+            p = province_stats[sku][prov]
+            total = counts[0]
+            s["total"] += total
+            p["total"] += total
+            sku_totals[sku] += total
+            for code, n in enumerate(counts[1:]):
+                if n:
+                    key = CATEGORY_KEYS[code]
+                    s[key] += n
+                    p[key] += n
+        self.total_rows += part.rows
+        if not part.has_province:
+            self.has_province = False
+            self.missing_province.append(part.name)
+        self.file_timings.append({"file": part.name, "rows": part.rows, "seconds": round(part.seconds, 3)})
+
+    def copy(self) -> "OrderAggregate":
+        """副本：各级计数字典都是新的，修改副本不影响原结果"""
+        agg = OrderAggregate()
+        for sku, m in self.sku_stats.items():
+            agg.sku_stats[sku].update(m)
+        for sku, province_map in self.province_stats.items():
+            target = agg.province_stats[sku]
+            for prov, m in province_map.items():
+                target[prov].update(m)
+        agg.sku_totals.update(self.sku_totals)
+        agg.total_rows = self.total_rows
+        agg.has_province = self.has_province
+        agg.missing_province = list(self.missing_province)
+        agg.file_timings = [dict(t) for t in self.file_timings]
+        return agg
+
+
+# 统一引擎需要的列：省份列可选，必须放在最后（缺失时补 None）
+ENGINE_KEYS = ROW_KEYS + ("province",)
+
+# 单个分析最多使用的解析进程数
+MAX_INGEST_WORKERS = 4
+
+
+def _default_ingest_workers() -> int:
+    """未指定解析进程数时，把 CPU 核数平分给可能同时运行的分析：
+    HTTP 工作进程数（serve.py 设置 ORDER_ANALYSIS_HTTP_WORKERS）× 每个进程同时运行的任务数
+    （ORDER_ANALYSIS_JOB_WORKERS，默认 2），每个分析最多 MAX_INGEST_WORKERS 个进程"""
+    concurrent = max(1, int(os.environ.get("ORDER_ANALYSIS_HTTP_WORKERS") or 1)) * max(
+        1, int(os.environ.get("ORDER_ANALYSIS_JOB_WORKERS") or 2)
+    )
+    return max(1, min((os.cpu_count() or 1) // concurrent, MAX_INGEST_WORKERS))
+
+
+# 多文件并行解析的进程数：环境变量 ORDER_ANALYSIS_WORKERS，未设置时见 _default_ingest_workers；设为 1 即串行
+INGEST_WORKERS = int(os.environ.get("ORDER_ANALYSIS_WORKERS", "0") or 0) or _default_ingest_workers()
+
+# 解析子进程的启动方式：应用进程里有任务线程、清理线程、HTTP 线程与 SQLite 连接，
+# 直接 fork 会把其它线程持有的锁复制进子进程而可能死锁，因此用 forkserver（没有时用 spawn）
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+if _MP_CONTEXT.get_start_method() == "forkserver":
+    # forkserver 进程预先导入本模块（及 openpyxl），子进程由它 fork 出来，不必各自重新导入
+    _MP_CONTEXT.set_forkserver_preload([__name__])
+
+# 不小于该大小的单个 CSV 文件在并行模式下按字节区间拆给多个进程解析
+CSV_SPLIT_BYTES = 32 * 1024 * 1024
+
+# 最近几次聚合结果的缓存：同一批文件、同一日期范围切换 SKU / 省份视图时不再重新解析。
+# 缓存中的聚合结果不交给调用方，命中时返回副本（调用方可能修改计数字典或长期持有）
+_AGGREGATE_CACHE: "OrderedDict[tuple, OrderAggregate]" = OrderedDict()
+_AGGREGATE_CACHE_SIZE = 8
+
+# 已加载的日粒度立方体（大小只与 天数×SKU×省份 有关），避免每次查询都读磁盘；立方体只读，可直接共用
+_CUBE_CACHE: "OrderedDict[str, DailyCube]" = OrderedDict()
+_CUBE_CACHE_SIZE = 32
+
+# 两个内存缓存由多个任务线程、接口线程同时访问
+_MEMO_LOCK = threading.Lock()
+
+
+def _aggregate_cache_key(file_streams, start_date, end_date, engine):
+    """仅当所有输入都是文件路径时可缓存，用内容摘要识别文件（相同内容的不同路径共用结果）"""
+    ident = []
     for fs in file_streams:
-        for seller_sku, sub, cancel, shipped, created in _iter_rows(fs):
-            if seller_sku is None:
+        if not isinstance(fs, str):
+            return None
+        digest = file_digest(fs)
+        if digest is None:
+            return None
+        ident.append(digest)
+    return tuple(ident), start_date, end_date, engine
+
+
+def _scan_rows(part: ScanPartial, rows, start_date, end_date, classifier: StatusClassifier = DEFAULT_CLASSIFIER):
+    """按 (SKU, 省份) 累计通过日期过滤的行；rows 的列顺序同 ENGINE_KEYS"""
+    cells = part.cells
+    width = len(CATEGORY_KEYS) + 1
+    count = 0
+    check_dates = start_date is not None
+    classify = classifier.classify
+    lookup = classifier.table.get
+    parse_date = DateColumnParser(_to_date)  # 每个文件（区间）单独嗅探 Created Time 的格式
+
+    for seller_sku, sub, cancel, shipped, created, province in rows:
+        if seller_sku is None:
+            continue
+        if check_dates:
+            d = parse_date(created)
+            if d is None or d < start_date or d > end_date:
                 continue
-            if not _date_in_range(created, start_date, end_date):
+
+        key = (str(seller_sku), str(province).strip() if province is not None else "")
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0] * width
+        cell[0] += 1
+        count += 1
+
+        shipped_empty = is_blank(shipped)
+        code = lookup((sub, cancel, shipped_empty))
+        if code is None:
+            code = classify(sub, cancel, shipped_empty)
+        if code != OTHER:
+            cell[code + 1] += 1
+        # 其它状态只计入订单数
+
+    part.rows += count
+
+
+def _scan_file(fs, start_date, end_date, engine: str) -> ScanPartial:
+    """扫描单个文件"""
+    t0 = time.perf_counter()
+    part = ScanPartial(os.path.basename(fs) if isinstance(fs, str) else "<stream>")
+    located: Dict[str, int] = {}
+
+    def locate(headers):
+        cols = _locate_cols(headers)
+        located.update(cols)
+        return cols
+
+    _scan_rows(part, _iter_projected(fs, locate, ENGINE_KEYS, engine), start_date, end_date)
+    part.has_province = "province" in located
+    part.seconds = time.perf_counter() - t0
+    return part
+
+
+# 子进程中的进度队列与取消事件（由进程池 initializer 设置），主进程中为 None
+_PROGRESS_QUEUE = None
+_CANCEL_EVENT = None
+
+
+def _init_worker(queue, cancel_event):
+    global _PROGRESS_QUEUE, _CANCEL_EVENT
+    _PROGRESS_QUEUE = queue
+    _CANCEL_EVENT = cancel_event
+
+
+def _worker_report(*args):
+    _PROGRESS_QUEUE.put(args)
+
+
+def _worker_check():
+    if _CANCEL_EVENT.is_set():
+        raise Cancelled("分析已取消")
+
+
+def _add_batched(builder: ColumnarBuilder, rows, report, index: int, part: int, position, check=None):
+    """按 PROGRESS_BATCH 行分批追加，每批结束后调用 report(文件序号, 区间序号, 已读行数, position())；
+    check 不为 None 时每批之后调用一次，任务已取消时由它抛出 Cancelled"""
+    parse_date = DateColumnParser(_to_date)  # 每个文件（区间）单独嗅探 Created Time 的格式
+    seen = 0
+    while True:
+        n = builder.add_rows(islice(rows, PROGRESS_BATCH), parse_date)
+        seen += n
+        if report is not None:
+            report(index, part, seen, position())
+        if check is not None:
+            check()
+        if n < PROGRESS_BATCH:
+            return
+
+
+def _build_columns(path: str, engine: str, index: int = 0, report=None, check=None) -> OrderColumns:
+    """进程池任务入口：完整解析单个文件（不按日期过滤），生成列式数据"""
+    if report is None and _PROGRESS_QUEUE is not None:
+        report = _worker_report
+    if check is None and _CANCEL_EVENT is not None:
+        check = _worker_check
+    located: Dict[str, int] = {}
+
+    def locate(headers):
+        cols = _locate_cols(headers)
+        located.update(cols)
+        return cols
+
+    builder = ColumnarBuilder()
+    with open(path, "rb") as fp:
+        _add_batched(builder, _iter_projected(fp, locate, ENGINE_KEYS, engine), report, index, 0, fp.tell, check)
+    return builder.finish(os.path.basename(path), "province" in located)
+
+
+def _build_csv_range(path: str, start: int, end: int, cols: Dict[str, int], index: int = 0, part: int = 0) -> ColumnarBuilder:
+    """进程池任务入口：解析大 CSV 文件中按记录边界对齐的 [start, end) 字节区间"""
+    present = _present_keys(cols, ENGINE_KEYS)
+    raw, records = open_range(path, start, end)
+    rows = _pad(_project(records, cols, present), len(ENGINE_KEYS) - len(present))
+    report = _worker_report if _PROGRESS_QUEUE is not None else None
+    check = _worker_check if _CANCEL_EVENT is not None else None
+    builder = ColumnarBuilder()
+    try:
+        _add_batched(builder, rows, report, index, part, lambda: raw.position - start, check)
+    finally:
+        raw.close()
+    return builder
+
+
+def _submit_csv_ranges(pool, path: str, parts: int, index: int = 0):
+    """把单个大 CSV 切分为若干区间提交给进程池，返回 (各区间的 future 列表, 列映射)"""
+    headers, data_start, size = read_head(path)
+    cols = _locate_cols(headers)
+    splits = raw_splits(data_start, size, parts)
+    quote_counts = list(pool.map(count_quotes, [path] * parts, splits[:-1], splits[1:]))
+    ranges = align_splits(path, splits, quote_counts)
+    futures = [pool.submit(_build_csv_range, path, s, e, cols, index, n) for n, (s, e) in enumerate(ranges)]
+    return futures, cols
+
+
+def _is_large_csv(path: str) -> bool:
+    try:
+        return os.path.getsize(path) >= CSV_SPLIT_BYTES and not is_zipfile(path)
+    except OSError:
+        return False
+
+
+def _drain_progress(queue, progress: Progress):
+    while True:
+        try:
+            progress.update(*queue.get_nowait())
+        except Empty:
+            return
+
+
+def _build_parallel(
+    paths: List[str],
+    engine: str,
+    workers: int,
+    indexes: List[int],
+    progress: Union[Progress, None] = None,
+    cancel: Union[CancelToken, None] = None,
+) -> List[OrderColumns]:
+    """多进程解析：每个文件交给一个子进程；大 CSV 文件再按字节区间拆给多个子进程，区间结果按顺序拼接。
+
+    indexes 为各文件在本次分析中的序号；progress 不为 None 时子进程经队列上报进度；
+    cancel 被取消时通过共享事件通知子进程在下一批行后停止，尚未开始的区间直接丢弃。
+    """
+    queue = _MP_CONTEXT.Queue() if progress is not None else None
+    cancel_event = _MP_CONTEXT.Event() if cancel is not None else None
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=_MP_CONTEXT,
+        initializer=_init_worker if queue is not None or cancel_event is not None else None,
+        initargs=(queue, cancel_event) if queue is not None or cancel_event is not None else (),
+    ) as pool:
+        jobs = []
+        for p, i in zip(paths, indexes):
+            if _is_large_csv(p):
+                jobs.append(_submit_csv_ranges(pool, p, workers, i))
+            else:
+                jobs.append(pool.submit(_build_columns, p, engine, i))
+
+        if queue is not None or cancel is not None:
+            pending = set()
+            for job in jobs:
+                pending.update(job[0] if isinstance(job, tuple) else [job])
+            while pending:
+                _, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                if queue is not None:
+                    _drain_progress(queue, progress)
+                if cancel is not None and cancel.cancelled:
+                    cancel_event.set()
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    cancel.check()
+
+        built = []
+        for p, job in zip(paths, jobs):
+            if not isinstance(job, tuple):
+                built.append(job.result())
                 continue
+            futures, cols = job
+            builder = futures[0].result() if futures else ColumnarBuilder()
+            for f in futures[1:]:
+                builder.extend(f.result())
+            built.append(builder.finish(os.path.basename(p), "province" in cols))
+        if queue is not None:
+            _drain_progress(queue, progress)
+        return built
 
-            sku = str(seller_sku)
-            s = stats[sku]
-            s["total"] += 1
-            total_rows += 1
-
-            sub_lower = _norm(sub)
-            cancel_lower = _norm(cancel)
-            shipped_empty = shipped is None or str(shipped).strip() == ""
-
-            completed_set = {"已完成", "completed"}
-            delivered_set = {"已送达", "delivered"}
-            canceled_set = {"已取消", "canceled", "cancelled", "cancel"}
-            in_transit_set = {"运输中", "in transit"}
-
-            if sub_lower in completed_set and cancel_lower == "":
-                s["completed"] += 1
-            elif sub_lower in delivered_set:
-                s["delivered"] += 1
-            elif "return" in sub_lower or "refund" in sub_lower:
-                s["refund"] += 1
-            elif sub_lower in canceled_set or cancel_lower in {"canceled", "cancelled", "cancel"}:
-                if shipped_empty:
-                    s["cancel_before"] += 1
-                else:
-                    s["cancel_after"] += 1
-            elif sub_lower in in_transit_set:
-                s["in_transit"] += 1
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "订单指标"
-    headers = [
-        "Seller SKU", "订单数", "签收率(%)", "已完成率(%)", "已送达率(%)", "退款率(%)", "发货前取消率(%)", "发货后取消率(%)", "仍在途率(%)",
-    ]
-    ws.append(headers)
 
-    for sku, m in sorted(stats.items(), key=lambda x: (-x[1]["total"], x[0])):
-        total = m["total"]
-        if total == 0:
-            continue
-        completed_rate = m.get("completed", 0) / total * 100
-        delivered_rate = m.get("delivered", 0) / total * 100
-        refund_rate = m.get("refund", 0) / total * 100
-        cancel_before_rate = m.get("cancel_before", 0) / total * 100
-        cancel_after_rate = m.get("cancel_after", 0) / total * 100
-        in_transit_rate = m.get("in_transit", 0) / total * 100
-        sign_rate = completed_rate + delivered_rate + refund_rate
-
-        ws.append([
-            sku,
-            total,
-            round(sign_rate, 2),
-            round(completed_rate, 2),
-            round(delivered_rate, 2),
-            round(refund_rate, 2),
-            round(cancel_before_rate, 2),
-            round(cancel_after_rate, 2),
-            round(in_transit_rate, 2),
-        ])
+def _load_cached(key: str, ext: str, loader):
+    try:
+        return loader(cache_path(key, ext))
+    except (OSError, ValueError):
+        return None
+
 
+def _save_cached(key: str, ext: str, obj):
+    try:
+        obj.save(cache_path(key, ext))
+    except OSError:
+        pass  # 缓存目录不可写时只保留内存中的结果
+
+
+def _cached_cube(key: str, classifier: StatusClassifier):
+    """先查内存，再查磁盘；不存在或分类规则已变化时返回 None"""
+    with _MEMO_LOCK:
+        cube = _CUBE_CACHE.get(key)
+    if cube is None:
+        cube = _load_cached(key, "cube", DailyCube.load)
+    if cube is None or cube.fingerprint != classifier.fingerprint:
+        return None
+    _remember_cube(key, cube)
+    try:
+        os.utime(cache_path(key, "cube"))  # 刷新最近使用时间，供过期清理参考（见 janitor.py）
+    except OSError:
+        pass
+    return cube
+
+
+def _remember_cube(key: str, cube: DailyCube):
+    with _MEMO_LOCK:
+        _CUBE_CACHE[key] = cube
+        _CUBE_CACHE.move_to_end(key)
+        while len(_CUBE_CACHE) > _CUBE_CACHE_SIZE:
+            _CUBE_CACHE.popitem(last=False)
+
+
+def _load_cubes(
+    paths: List[str],
+    keys: List[str],
+    engine: str,
+    workers: int,
+    classifier: StatusClassifier = DEFAULT_CLASSIFIER,
+    progress: Union[Progress, None] = None,
+    cancel: Union[CancelToken, None] = None,
+) -> List[DailyCube]:
+    """返回各文件的日粒度立方体：命中缓存的直接读取；否则由列式缓存生成，
+    列式缓存也不存在时解析原文件（多个文件并行），两者都写入缓存"""
+    cubes = [_cached_cube(k, classifier) for k in keys]
+    missing = [i for i, c in enumerate(cubes) if c is None]
+    if not missing:
+        return cubes
+
+    columns = {i: _load_cached(keys[i], "col", OrderColumns.load) for i in missing}
+    todo = [i for i in missing if columns[i] is None]
+    if todo:
+        todo_paths = [paths[i] for i in todo]
+        report = None
+        if progress is not None:
+            progress.set_stage("解析文件")
+            for i, p in zip(todo, todo_paths):
+                progress.add_file(i, os.path.basename(p), os.path.getsize(p))
+            report = progress.update
+        check = cancel.check if cancel is not None else None
+        if workers > 1 and (len(todo) > 1 or _is_large_csv(todo_paths[0])):
+            built = _build_parallel(todo_paths, engine, workers, todo, progress, cancel)
+        else:
+            built = [_build_columns(p, engine, i, report, check) for i, p in zip(todo, todo_paths)]
+        for i, col in zip(todo, built):
+            columns[i] = col
+            _save_cached(keys[i], "col", col)
+
+    if progress is not None:
+        progress.set_stage("汇总")
+    for i in missing:
+        if cancel is not None:
+            cancel.check()
+        cube = DailyCube.from_columns(columns.pop(i), classifier, len(CATEGORY_KEYS) + 1)
+        cubes[i] = cube
+        _remember_cube(keys[i], cube)
+        _save_cached(keys[i], "cube", cube)
+    return cubes
+
+
+def _query_cube(cube: DailyCube, name: str, start_date, end_date) -> ScanPartial:
+    """在立方体上按日期范围统计，结果与 _scan_file 一致"""
+    part = ScanPartial(name)
+    if start_date is None:
+        part.cells, part.rows = cube.query(None, None)
+    else:
+        part.cells, part.rows = cube.query(start_date.toordinal(), end_date.toordinal())
+    part.has_province = cube.has_province
+    return part
+
+
+def aggregate_files(
+    file_streams: Iterable[Union[str, BytesIO]],
+    start_date: Union[date, None],
+    end_date: Union[date, None],
+    engine: str = XLSX_ENGINE,
+    workers: Union[int, None] = None,
+    progress: Union[Progress, None] = None,
+    cancel: Union[CancelToken, None] = None,
+) -> OrderAggregate:
+    """统一聚合引擎：每个文件只扫描一次，同时得到 SKU 与 SKU×省份两级统计。
+
+    start_date 为 None 时不按日期过滤。输入全部为文件路径时，每个文件首次解析后
+    写入列式缓存（见 columnar_cache.py）并生成日粒度前缀和立方体（见 daily_cube.py），
+    之后任意日期范围都直接由立方体相减得到；需要解析的多个文件按 workers
+    （默认 INGEST_WORKERS）并行，单个大 CSV 按字节区间并行。
+    progress 不为 None 时上报解析进度；cancel 被取消时在下一批行之后抛出 Cancelled（见 progress.py）。
+    """
+    file_streams = list(file_streams)
+    key = _aggregate_cache_key(file_streams, start_date, end_date, engine)
+    if key is not None:
+        with _MEMO_LOCK:
+            cached = _AGGREGATE_CACHE.get(key)
+            if cached is not None:
+                _AGGREGATE_CACHE.move_to_end(key)
+        if cached is not None:
+            return cached.copy()
+
+    if key is not None:
+        workers = INGEST_WORKERS if workers is None else workers
+        t0 = time.perf_counter()
+        cubes = _load_cubes(file_streams, list(key[0]), engine, workers, progress=progress, cancel=cancel)
+        partials = []
+        for path, cube in zip(file_streams, cubes):
+            part = _query_cube(cube, os.path.basename(path), start_date, end_date)
+            part.seconds = time.perf_counter() - t0  # 含首次解析，记录该文件完成时的墙钟耗时
+            partials.append(part)
+    else:
+        partials = (_scan_file(fs, start_date, end_date, engine) for fs in file_streams)
+
+    agg = OrderAggregate()
+    for part in partials:
+        if cancel is not None:
+            cancel.check()
+        agg.merge(part)
+
+    if key is not None:
+        with _MEMO_LOCK:
+            _AGGREGATE_CACHE[key] = agg.copy()
+            _AGGREGATE_CACHE.move_to_end(key)
+            while len(_AGGREGATE_CACHE) > _AGGREGATE_CACHE_SIZE:
+                _AGGREGATE_CACHE.popitem(last=False)
+    return agg
+
+
+def aggregate_cached(paths: List[str], start_date: Union[date, None], end_date: Union[date, None]) -> Union[OrderAggregate, None]:
+    """只用已缓存的日粒度立方体聚合，不解析文件；任一文件尚无立方体时返回 None（供同步的查询接口使用）"""
+    agg = OrderAggregate()
+    for path in paths:
+        digest = file_digest(path)
+        cube = _cached_cube(digest, DEFAULT_CLASSIFIER) if digest is not None else None
+        if cube is None:
+            return None
+        agg.merge(_query_cube(cube, os.path.basename(path), start_date, end_date))
+    return agg
+
+
+def _result_sheet(wb: Workbook, title: str, headers: List[str], width: int = 14):
+    """在只写工作簿中创建结果表并写入表头（只写模式下列宽须在写入第一行之前设置）。
+
+    只写模式不写出 <dimension>，用 openpyxl 只读模式读取时需先 reset_dimensions()；
+    需要带维度的输出（如下载）用 xlsx_writer.stream_workbook。
+    """
+    ws = wb.create_sheet(title)
     for idx in range(1, len(headers) + 1):
-        ws.column_dimensions[get_column_letter(idx)].width = 14
+        ws.column_dimensions[get_column_letter(idx)].width = width
+    ws.append(headers)
+    return ws
+
+
+SKU_HEADERS = [
+    "Seller SKU", "订单数", "签收率(%)", "已完成率(%)", "已送达率(%)", "退款率(%)", "发货前取消率(%)", "发货后取消率(%)", "仍在途率(%)",
+]
+
+
+def sku_report(stats: Dict[str, Dict[str, int]]):
+    """SKU 报表：返回 (表名, 表头, 数据行数, 数据行迭代器)，工作簿与流式导出（见 xlsx_writer.py）共用"""
+
+    def rows():
+        for sku, m in sorted(stats.items(), key=lambda x: (-x[1]["total"], x[0])):
+            total = m["total"]
+            if total == 0:
+                continue
+            completed_rate = m.get("completed", 0) / total * 100
+            delivered_rate = m.get("delivered", 0) / total * 100
+            refund_rate = m.get("refund", 0) / total * 100
+            cancel_before_rate = m.get("cancel_before", 0) / total * 100
+            cancel_after_rate = m.get("cancel_after", 0) / total * 100
+            in_transit_rate = m.get("in_transit", 0) / total * 100
+            sign_rate = completed_rate + delivered_rate + refund_rate
+
+            yield [
+                sku,
+                total,
+                round(sign_rate, 2),
+                round(completed_rate, 2),
+                round(delivered_rate, 2),
+                round(refund_rate, 2),
+                round(cancel_before_rate, 2),
+                round(cancel_after_rate, 2),
+                round(in_transit_rate, 2),
+            ]
+
+    return "订单指标", SKU_HEADERS, sum(1 for m in stats.values() if m["total"]), rows()
+
+
+def write_report(report) -> Workbook:
+    """把 (表名, 表头, 数据行数, 数据行迭代器) 写成工作簿（只写模式：逐行写出到临时文件，内存占用与行数无关，只能保存一次）"""
+    title, headers, _, rows = report
+    wb = Workbook(write_only=True)
+    ws = _result_sheet(wb, title, headers)
+    for row in rows:
+        ws.append(row)
+    return wb
 
-    return wb, stats
+
+def build_sku_workbook(stats: Dict[str, Dict[str, int]]) -> Workbook:
+    """根据 SKU 级统计结果构建结果工作簿"""
+    return write_report(sku_report(stats))
+
+
+def compute_metrics(
+    file_streams: Iterable[Union[str, BytesIO]],
+    start_date: date,
+    end_date: date,
+    progress: Union[Progress, None] = None,
+    cancel: Union[CancelToken, None] = None,
+):
+    """核心接口：返回 (Workbook, stats_dict)"""
+    agg = aggregate_files(file_streams, start_date, end_date, progress=progress, cancel=cancel)
+    if cancel is not None:
+        cancel.check()
+    if progress is not None:
+        progress.set_stage("生成工作簿")
+    return build_sku_workbook(agg.sku_stats), agg.sku_stats
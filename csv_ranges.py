@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+csv_ranges.py
+--------------------------------------------------
+把单个大 CSV 文件切分成按记录边界对齐的字节区间，供多个进程分别解析。
+
+切分点不能简单取换行符：带引号的字段里可能含有换行。这里按 RFC 4180 的
+引号规则判断（字段内的引号写作 ""，不改变奇偶性）：
+1. 先把数据区均分成若干原始区间，各进程并行统计每个区间内的引号个数；
+2. 由引号个数的前缀奇偶性得到每个原始切分点是否位于引号内；
+3. 从原始切分点向后找到第一个位于引号外的换行符，下一字节即为记录起点。
+
+标题行与第 2 行描述行同样按记录边界跳过，数据区从第 3 条记录开始。
+注意：要求文件为 UTF-8 编码（引号与换行字节不会出现在多字节字符内部）。
+"""
+
+import csv
+import io
+import os
+from typing import List, Tuple
+
+_BLOCK = 1 << 20
+
+
+def next_record_start(fp, pos: int, in_quotes: bool = False) -> int:
+    """从 pos 开始向后找到第一个位于引号外的换行符，返回其后一字节的位置（找不到时返回文件末尾）"""
+    fp.seek(pos)
+    while True:
+        block = fp.read(_BLOCK)
+        if not block:
+            return pos
+        i = 0
+        while True:
+            if in_quotes:
+                j = block.find(b'"', i)
+                if j < 0:
+                    break
+                in_quotes = False
+                i = j + 1
+            else:
+                nl = block.find(b"\n", i)
+                q = block.find(b'"', i)
+                if nl >= 0 and (q < 0 or nl < q):
+                    return pos + nl + 1
+                if q < 0:
+                    break
+                in_quotes = True
+                i = q + 1
+        pos += len(block)
+
+
+def read_head(path: str) -> Tuple[List[str], int, int]:
+    """读取标题行，返回 (标题列表, 数据区起点, 文件大小)；数据区起点已跳过第 2 行描述行"""
+    size = os.path.getsize(path)
+    with open(path, "rb") as fp:
+        header_end = next_record_start(fp, 0)
+        data_start = next_record_start(fp, header_end)  # 跳过描述行
+        fp.seek(0)
+        head = fp.read(header_end)
+    text = head.decode("utf-8-sig")
+    headers = next(csv.reader(io.StringIO(text, newline="")), [])
+    return headers, data_start, size
+
+
+def count_quotes(path: str, start: int, end: int) -> int:
+    """统计 [start, end) 内的引号字节数"""
+    n = 0
+    with open(path, "rb") as fp:
+        fp.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = fp.read(min(_BLOCK, remaining))
+            if not block:
+                break
+            n += block.count(b'"')
+            remaining -= len(block)
+    return n
+
+
+def raw_splits(data_start: int, size: int, parts: int) -> List[int]:
+    """把 [data_start, size) 均分，返回 parts+1 个原始切分点（含两端）"""
+    span = size - data_start
+    return [data_start + span * i // parts for i in range(parts)] + [size]
+
+
+def align_splits(path: str, splits: List[int], quote_counts: List[int]) -> List[Tuple[int, int]]:
+    """根据各原始区间的引号个数把切分点对齐到记录边界，返回非空的 [start, end) 区间列表"""
+    starts = [splits[0]]
+    in_quotes = False
+    with open(path, "rb") as fp:
+        for i in range(1, len(splits) - 1):
+            in_quotes ^= bool(quote_counts[i - 1] & 1)
+            aligned = next_record_start(fp, splits[i], in_quotes)
+            starts.append(max(aligned, starts[-1]))
+    ends = starts[1:] + [splits[-1]]
+    return [(s, e) for s, e in zip(starts, ends) if s < e]
+
+
+class _RangeRaw(io.RawIOBase):
+    """只读取文件 [start, end) 区间的原始流"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._fp = open(path, "rb")
+        self._fp.seek(start)
+        self._end = end
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    @property
+    def position(self) -> int:
+        return self._end - self._remaining
+
+    def readinto(self, buf):
+        if self._remaining <= 0:
+            return 0
+        view = memoryview(buf)[: min(len(buf), self._remaining)]
+        n = self._fp.readinto(view)
+        self._remaining -= n
+        return n
+
+    def close(self):
+        self._fp.close()
+        super().close()
+
+
+def open_range(path: str, start: int, end: int):
+    """返回 (区间原始流, 逐条产出 [start, end) 内 CSV 记录的迭代器)；原始流的 position 为当前文件偏移"""
+    raw = _RangeRaw(path, start, end)
+
+    def records():
+        with io.TextIOWrapper(io.BufferedReader(raw, _BLOCK), encoding="utf-8", newline="") as text:
+            yield from csv.reader(text)
+
+    return raw, records()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+daily_cube.py
+--------------------------------------------------
+按天预聚合的计数立方体 (日期 × SKU × 省份 × 类别)。
+
+文件入库时由列式数据（见 columnar_cache.py）生成：每个 (SKU, 省份) 单元只保存
+出现过订单的日序号，以及沿日期轴的前缀和 [订单数, 各类别计数...]。
+任意日期范围的统计只需对每个单元二分两次、做一次减法，与行数无关。
+
+类别在生成时按分类规则计算，立方体中记录规则指纹；规则变化后由列式数据重新生成，
+不需要重新解析原文件。
+"""
+
+import json
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, List, Tuple
+
+MAGIC = b"OACUBE1\n"
+FORMAT_VERSION = 1
+
+
+class DailyCube:
+    """单个文件的日粒度前缀和立方体。
+
+    keys[c]   第 c 个单元的 (sku, 省份)
+    days[c]   该单元出现过的日序号（升序，-1 表示日期无法解析）
+    cums[c]   扁平化的前缀和，长度 (len(days[c]) + 1) * width，前 width 个为 0
+    """
+
+    def __init__(self, name, has_province, fingerprint, width, keys, days, cums):
+        self.name = name
+        self.has_province = has_province
+        self.fingerprint = fingerprint
+        self.width = width
+        self.keys: List[Tuple[str, str]] = keys
+        self.days: List[array] = days
+        self.cums: List[array] = cums
+
+    @classmethod
+    def from_columns(cls, columns, classifier, width: int) -> "DailyCube":
+        """由 OrderColumns 生成；classifier 为 order_status.StatusClassifier"""
+        classify = classifier.classify
+        skus, provinces, statuses, groups = columns.skus, columns.provinces, columns.statuses, columns.groups
+        per_cell: Dict[tuple, Dict[int, List[int]]] = {}
+        for (g, day), n in Counter(zip(columns.columns["group"], columns.columns["day"])).items():
+            s, p, st, sh = groups[g]
+            by_day = per_cell.setdefault((skus[s], provinces[p]), {})
+            counts = by_day.get(day)
+            if counts is None:
+                counts = by_day[day] = [0] * width
+            counts[0] += n
+            sub, cancel = statuses[st]
+            code = classify(sub, cancel, not sh)
+            if code >= 0:
+                counts[code + 1] += n
+
+        keys, days, cums = [], [], []
+        for key, by_day in per_cell.items():
+            ordered = sorted(by_day)
+            running = [0] * width
+            cum = array("I", running)
+            for day in ordered:
+                running = [a + b for a, b in zip(running, by_day[day])]
+                cum.extend(running)
+            keys.append(key)
+            days.append(array("i", ordered))
+            cums.append(cum)
+        return cls(columns.name, columns.has_province, classifier.fingerprint, width, keys, days, cums)
+
+    def query(self, start_day, end_day) -> Tuple[Dict[tuple, List[int]], int]:
+        """按日期范围 [start_day, end_day] 统计，返回 ({(sku, 省份): 计数列表}, 行数)；
+        start_day 为 None 时返回全部（含日期无法解析的行）"""
+        w = self.width
+        cells: Dict[tuple, List[int]] = {}
+        rows = 0
+        for key, days, cum in zip(self.keys, self.days, self.cums):
+            if start_day is None:
+                lo, hi = 0, len(days)
+            else:
+                lo, hi = bisect_left(days, start_day), bisect_right(days, end_day)
+                if lo == hi:
+                    continue
+            a, b = lo * w, hi * w
+            counts = [cum[b + i] - cum[a + i] for i in range(w)]
+            cells[key] = counts
+            rows += counts[0]
+        return cells, rows
+
+    def save(self, path: str):
+        """原子写入：先写临时文件再替换"""
+        header = {
+            "version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "name": self.name,
+            "has_province": self.has_province,
+            "fingerprint": self.fingerprint,
+            "width": self.width,
+            "keys": self.keys,
+            "lengths": [len(d) for d in self.days],
+            "itemsize": [array("i").itemsize, array("I").itemsize],
+        }
+        raw = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(raw)))
+            f.write(raw)
+            for days, cum in zip(self.days, self.cums):
+                days.tofile(f)
+                cum.tofile(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DailyCube":
+        """读取立方体文件；格式不兼容时抛出 ValueError"""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("不是立方体缓存文件")
+            (size,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(size).decode("utf-8"))
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError("立方体缓存版本不匹配")
+            if header["itemsize"] != [array("i").itemsize, array("I").itemsize]:
+                raise ValueError("立方体缓存与当前平台不兼容")
+            swap = header["byteorder"] != sys.byteorder
+            w = header["width"]
+            days, cums = [], []
+            for n in header["lengths"]:
+                d, c = array("i"), array("I")
+                d.fromfile(f, n)
+                c.fromfile(f, (n + 1) * w)
+                if swap:
+                    d.byteswap()
+                    c.byteswap()
+                days.append(d)
+                cums.append(c)
+        return cls(
+            name=header["name"],
+            has_province=header["has_province"],
+            fingerprint=header["fingerprint"],
+            width=w,
+            keys=[tuple(k) for k in header["keys"]],
+            days=days,
+            cums=cums,
+        )
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+date_parsing.py
+--------------------------------------------------
+Created Time 列的快速日期解析。
+
+逐行调用 compute_logic._to_date 时，每个字符串都要先做三次 replace，
+再依次尝试最多六种 strptime 格式。同一列的格式通常是固定的，
+而且同一天的时间戳只有日期前缀相同，因此：
+1. 用列的前若干个值嗅探格式（ISO "YYYY-MM-DD"、"DD/MM/YYYY"、中文 "YYYY年MM月DD日"）；
+2. 命中格式的值只取日期前缀，按前缀缓存解析结果，同一天的行只需一次字典查找；
+3. 不符合所嗅探格式的值（混合格式列）逐个交给原有的 _to_date 兜底，结果与原实现一致。
+   快速路径同样校验时分秒的取值范围，超出范围的值（如 25:99:99）交给兜底，与原实现一样视为无法解析。
+
+数字（Excel 序列号）按天缓存，不再在循环内 import from_excel。
+"""
+
+from datetime import date, datetime
+from typing import Callable, Dict, Optional
+
+from openpyxl.utils.datetime import from_excel
+
+
+def _time_ok(v: str, i: int) -> bool:
+    # v[i:i+8] 为 "HH:MM:SS"，且取值为合法时间（与 strptime 得到 datetime 的条件一致）
+    h, m, s = v[i:i + 2], v[i + 3:i + 5], v[i + 6:i + 8]
+    return h.isdecimal() and m.isdecimal() and s.isdecimal() and h <= "23" and m <= "59" and s <= "59"
+
+
+def _iso_shape(v: str) -> bool:
+    # "YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM:SS"
+    n = len(v)
+    return (
+        (n == 10 or (n == 19 and v[10] == " " and v[13] == ":" and v[16] == ":" and _time_ok(v, 11)))
+        and v[4] == "-" and v[7] == "-"
+    )
+
+
+def _slash_shape(v: str) -> bool:
+    # "DD/MM/YYYY" 或 "DD/MM/YYYY HH:MM:SS"（也可能是 MM/DD/YYYY，由兜底函数按原顺序判定）
+    n = len(v)
+    return (
+        (n == 10 or (n == 19 and v[10] == " " and v[13] == ":" and v[16] == ":" and _time_ok(v, 11)))
+        and v[2] == "/" and v[5] == "/"
+    )
+
+
+def _cn_shape(v: str) -> bool:
+    # "YYYY年MM月DD日" 或 "YYYY年MM月DD日 HH:MM:SS"
+    n = len(v)
+    return (
+        (n == 11 or (n == 20 and v[11] == " " and v[14] == ":" and v[17] == ":" and _time_ok(v, 12)))
+        and v[4] == "年" and v[7] == "月" and v[10] == "日"
+    )
+
+
+# 格式名 -> (形状校验, 日期前缀长度)
+SHAPES = {
+    "iso": (_iso_shape, 10),
+    "slash": (_slash_shape, 10),
+    "cn": (_cn_shape, 11),
+}
+
+# 嗅探所用的样本数；样本中的字符串全部符合同一格式时启用快速路径
+SNIFF_SAMPLES = 16
+# 快速路径累计失配这么多次后视为混合格式列，改为全部走兜底
+MAX_MISSES = 1024
+
+_EXCEL_MS_PER_DAY = 86400 * 1000
+
+
+class DateColumnParser:
+    """单列日期解析器：解析结果为 date，无法解析时返回 None。
+
+    每个文件的每个日期列使用一个实例；fallback 为原有的逐值解析函数。
+    """
+
+    def __init__(self, fallback: Callable[[object], Optional[date]]):
+        self._fallback = fallback
+        self._shape = None        # 嗅探出的格式形状校验函数
+        self._prefix_len = 0
+        self._samples = []        # 嗅探阶段收集的字符串样本
+        self._misses = 0
+        self._prefix_memo: Dict[str, Optional[date]] = {}
+        self._day_memo: Dict[int, date] = {}
+
+    def _sniff(self):
+        for name, (check, length) in SHAPES.items():
+            if all(check(v) for v in self._samples):
+                self._shape = check
+                self._prefix_len = length
+                return
+        # 样本不符合任何已知格式：全部走兜底
+        self._misses = MAX_MISSES
+
+    def _parse_str(self, val: str) -> Optional[date]:
+        shape = self._shape
+        if shape is None:
+            v = val.strip()
+            if not v:
+                return None
+            if self._misses < MAX_MISSES:
+                self._samples.append(v)
+                if len(self._samples) >= SNIFF_SAMPLES:
+                    self._sniff()
+            return self._fallback(val)
+
+        if not shape(val):
+            v = val.strip()
+            if v is val or not shape(v):
+                self._misses += 1
+                if self._misses >= MAX_MISSES:
+                    self._shape = None
+                return self._fallback(val)
+            val = v
+
+        prefix = val[:self._prefix_len]
+        memo = self._prefix_memo
+        if prefix in memo:
+            return memo[prefix]
+        if self._prefix_len == 10 and prefix[4] == "-":
+            try:
+                d = date.fromisoformat(prefix)
+            except ValueError:
+                d = self._fallback(prefix)
+        else:
+            # 日期前缀与完整时间戳的解析结果相同，交给兜底函数以保持原有的格式优先级
+            d = self._fallback(prefix)
+        memo[prefix] = d
+        return d
+
+    def _parse_serial(self, val) -> Optional[date]:
+        """Excel 序列号：按天缓存，结果与 from_excel(val).date() 一致"""
+        if not 61 <= val < 2958466:  # 1900 闰年修正区间及异常值交给兜底
+            return self._fallback(val)
+        day = int(val)
+        if round((val - day) * _EXCEL_MS_PER_DAY) >= _EXCEL_MS_PER_DAY:
+            day += 1  # 小数部分四舍五入到毫秒后恰好进位到次日
+        d = self._day_memo.get(day)
+        if d is None:
+            d = self._day_memo[day] = from_excel(day).date()
+        return d
+
+    def __call__(self, val) -> Optional[date]:
+        cls = val.__class__
+        if cls is str:
+            return self._parse_str(val)
+        if cls is datetime:
+            return val.date()
+        if cls is date:
+            return val
+        if val is None:
+            return None
+        if cls is int or cls is float:
+            return self._parse_serial(val)
+        return self._fallback(val)
+
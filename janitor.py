@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+janitor.py
+--------------------------------------------------
+临时文件清理：按类别的过期时间 (TTL) + 总磁盘预算 (LRU 淘汰)。
+
+应用在磁盘上产生的文件分为以下几类（"最近使用" 取文件修改时间，使用时会刷新）：
+- uploads   上传存储中按摘要保存的文件（见 upload_store.py）。仍被会话引用的文件不按 TTL 清理，
+            只有超出磁盘预算时才在其它文件之后淘汰；未被引用的文件超过 UPLOAD_TTL 即删除；
+- columnar  列式缓存与日粒度立方体（见 columnar_cache.py、daily_cube.py），删除后下次分析时重新生成；
+- results   分析结果缓存（见 result_cache.py）；
+- partial   中断的上传与缓存写入留下的 .part / .tmp 文件，以及长期未用且未被持有的分析锁文件（见 single_flight.py）；
+- sessions  会话登记数据库（只统计，不清理）。
+
+后台线程每 SWEEP_INTERVAL 秒清理一次：先删除过期文件，总大小仍超出预算时按最近使用时间从旧到新淘汰；
+MIN_AGE 秒内用过的文件（可能正被分析任务读取）不淘汰。多个工作进程之间用文件锁保证同一时间只有一个在清理。
+"""
+
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from columnar_cache import CACHE_DIR
+from result_cache import RESULT_DIR
+from session_store import SESSION_DB, SESSION_REGISTRY
+from single_flight import LOCK_DIR
+from upload_store import UPLOAD_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows 无 fcntl，只有单进程运行
+    fcntl = None
+
+UPLOAD_TTL = float(os.environ.get("ORDER_ANALYSIS_UPLOAD_TTL_HOURS", "24")) * 3600
+CACHE_TTL = float(os.environ.get("ORDER_ANALYSIS_CACHE_TTL_DAYS", "7")) * 86400
+RESULT_TTL = CACHE_TTL
+PARTIAL_TTL = 3600
+DISK_BUDGET_BYTES = int(float(os.environ.get("ORDER_ANALYSIS_DISK_BUDGET_MB", "4096")) * 1024 * 1024)
+SWEEP_INTERVAL = 600
+MIN_AGE = 600
+
+CLASSES = ("uploads", "columnar", "results", "partial", "sessions")
+
+_DIGEST_NAME = re.compile(r"[0-9a-f]{64}")
+_CACHE_FILE = re.compile(r"[0-9a-f]{64}\.(col|cube)")
+
+
+class Artifact:
+    """一个可清理的单元（上传文件以摘要目录为单位）"""
+
+    __slots__ = ("kind", "path", "size", "last_used", "pinned")
+
+    def __init__(self, kind: str, path: str, size: int, last_used: float, pinned: bool = False):
+        self.kind = kind
+        self.path = path
+        self.size = size
+        self.last_used = last_used
+        self.pinned = pinned  # 仍被会话引用：不按 TTL 清理，预算不足时最后淘汰
+
+
+def _files(directory: str):
+    """目录下的普通文件 (名称, stat)；目录不存在时为空"""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file(follow_symlinks=False):
+                yield entry.name, entry.stat()
+        except OSError:
+            continue
+
+
+def _lock_held(path: str) -> bool:
+    """分析锁文件是否正被某个进程持有（计算可能超过 PARTIAL_TTL，持有中的锁文件不能删除）"""
+    if fcntl is None:
+        return False
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except OSError:
+        return True
+    finally:
+        os.close(fd)  # 关闭即释放刚取得的锁
+
+
+def _upload_artifacts(referenced) -> List[Artifact]:
+    artifacts = []
+    try:
+        entries = list(os.scandir(UPLOAD_DIR))
+    except OSError:
+        return artifacts
+    for entry in entries:
+        if not (_DIGEST_NAME.fullmatch(entry.name) and entry.is_dir(follow_symlinks=False)):
+            continue
+        stats = [st for _, st in _files(entry.path)]
+        size = sum(st.st_size for st in stats)
+        last_used = max((st.st_mtime for st in stats), default=0.0)
+        artifacts.append(Artifact("uploads", entry.path, size, last_used, entry.name in referenced))
+    return artifacts
+
+
+def scan(referenced=None) -> List[Artifact]:
+    """列出应用产生的全部文件；referenced 为仍被会话引用的上传摘要（None 时查询会话登记）"""
+    if referenced is None:
+        referenced = SESSION_REGISTRY.referenced_digests()
+    artifacts = _upload_artifacts(referenced)
+    for name, st in _files(UPLOAD_DIR):
+        if name.endswith(".part"):
+            artifacts.append(Artifact("partial", os.path.join(UPLOAD_DIR, name), st.st_size, st.st_mtime))
+    for name, st in _files(LOCK_DIR):
+        if name.endswith(".lock") and not _lock_held(os.path.join(LOCK_DIR, name)):
+            artifacts.append(Artifact("partial", os.path.join(LOCK_DIR, name), st.st_size, st.st_mtime))
+    for path in (SESSION_DB, SESSION_DB + "-wal", SESSION_DB + "-shm"):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        artifacts.append(Artifact("sessions", path, st.st_size, st.st_mtime, pinned=True))
+    for directory, kind, pattern in ((CACHE_DIR, "columnar", _CACHE_FILE), (RESULT_DIR, "results", None)):
+        for name, st in _files(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                artifacts.append(Artifact("partial", path, st.st_size, st.st_mtime))
+            elif pattern.fullmatch(name) if pattern else name.endswith(".json"):
+                artifacts.append(Artifact(kind, path, st.st_size, st.st_mtime))
+    return artifacts
+
+
+def usage(artifacts: Optional[List[Artifact]] = None) -> Dict[str, Dict[str, int]]:
+    """各类文件的 {entries: 个数, bytes: 字节数}"""
+    if artifacts is None:
+        artifacts = scan()
+    result = {kind: {"entries": 0, "bytes": 0} for kind in CLASSES}
+    for a in artifacts:
+        result[a.kind]["entries"] += 1
+        result[a.kind]["bytes"] += a.size
+    return result
+
+
+def _ttl(a: Artifact) -> Optional[float]:
+    if a.pinned:
+        return None
+    return {"uploads": UPLOAD_TTL, "columnar": CACHE_TTL, "results": RESULT_TTL, "partial": PARTIAL_TTL}[a.kind]
+
+
+def plan(artifacts: List[Artifact], now: float, budget: int = DISK_BUDGET_BYTES) -> List[Tuple[Artifact, str]]:
+    """返回要删除的 [(文件, 原因)]：先是过期文件，总大小仍超出预算时按最近使用时间从旧到新淘汰
+    （会话仍引用的上传文件排在最后，会话数据库与 MIN_AGE 秒内用过的文件不淘汰）"""
+    doomed = []
+    kept = []
+    for a in artifacts:
+        ttl = _ttl(a)
+        if ttl is not None and now - a.last_used > ttl:
+            doomed.append((a, "ttl"))
+        else:
+            kept.append(a)
+    total = sum(a.size for a in kept)
+    if total > budget:
+        candidates = [a for a in kept if a.kind != "sessions" and now - a.last_used >= MIN_AGE]
+        candidates.sort(key=lambda a: (a.pinned, a.last_used))
+        for a in candidates:
+            if total <= budget:
+                break
+            doomed.append((a, "budget"))
+            total -= a.size
+    return doomed
+
+
+def _remove_lock(path: str) -> bool:
+    """删除未被持有的分析锁文件：在探测用的锁仍持有时删除，避免检查与删除之间被其它进程拿到"""
+    if fcntl is None:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def _remove(path: str) -> bool:
+    if path.endswith(".lock") and os.path.dirname(path) == LOCK_DIR:
+        return _remove_lock(path)
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+class Janitor:
+    """后台清理线程；last_sweep 记录最近一次清理的时间、过期 / 淘汰个数与各类删除的个数和字节数"""
+
+    def __init__(self, interval: float = SWEEP_INTERVAL, budget: int = DISK_BUDGET_BYTES):
+        self.interval = interval
+        self.budget = budget
+        self.last_sweep: Optional[Dict[str, object]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动后台线程（重复调用无效）"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="janitor", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:  # 清理失败不影响服务，下一轮再试
+                print(f"[janitor] 清理失败: {e}", flush=True)
+            time.sleep(self.interval)
+
+    def sweep(self) -> Optional[Dict[str, object]]:
+        """清理一次；其它进程正在清理时跳过并返回 None"""
+        with _sweep_lock() as acquired:
+            if not acquired:
+                return None
+            now = time.time()
+            removed = {kind: [0, 0] for kind in CLASSES}
+            reasons = {"ttl": 0, "budget": 0}
+            for a, reason in plan(scan(), now, self.budget):
+                if _remove(a.path):
+                    removed[a.kind][0] += 1
+                    removed[a.kind][1] += a.size
+                    reasons[reason] += 1
+            self.last_sweep = {
+                "time": now,
+                "expired": reasons["ttl"],
+                "evicted": reasons["budget"],
+                "removed": {kind: {"entries": n, "bytes": b} for kind, (n, b) in removed.items() if n},
+            }
+            if reasons["ttl"] or reasons["budget"]:
+                freed = sum(b for _, b in removed.values()) / 1024 / 1024
+                print(
+                    f"[janitor] 删除过期文件 {reasons['ttl']} 个、超出预算淘汰 {reasons['budget']} 个，释放 {freed:.1f} MB",
+                    flush=True,
+                )
+            return self.last_sweep
+
+    def report(self) -> Dict[str, object]:
+        """各类文件的占用、总量与预算，以及最近一次清理的结果"""
+        classes = usage()
+        return {
+            "classes": classes,
+            "total_bytes": sum(c["bytes"] for c in classes.values()),
+            "budget_bytes": self.budget,
+            "last_sweep": self.last_sweep,
+        }
+
+
+@contextmanager
+def _sweep_lock():
+    """跨进程的非阻塞文件锁（放在缓存目录下），产出是否拿到锁；没有 fcntl 时总能拿到"""
+    if fcntl is None:
+        yield True
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd = os.open(os.path.join(CACHE_DIR, ".janitor.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)  # 关闭即释放锁
+
+
+JANITOR = Janitor()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jobs.py
+--------------------------------------------------
+后台分析任务队列。
+
+/process 与 /process_province 不再在请求线程里完成解析、聚合与生成 Excel，
+而是把分析提交到一个有上限的线程池，立即返回任务 id；
+前端订阅任务进度（SSE，见 progress.py）或轮询任务状态，完成后跳转到结果页。
+
+- 同时运行的任务数由环境变量 ORDER_ANALYSIS_JOB_WORKERS 控制（默认 2）；
+- 排队 + 运行中的任务超过 ORDER_ANALYSIS_MAX_PENDING（默认 16）时拒绝新任务；
+- 已结束的任务保留 JOB_TTL 秒供查看结果，之后自动清理；
+- 任务可随时取消（/jobs/<id>/cancel）：解析循环在下一批行之后停止，任务持有的结果立即释放；
+  最后一个进度订阅（SSE）断开后 DISCONNECT_GRACE 秒内没有重新订阅或轮询，视为无人等待结果，自动取消。
+
+任务只保存在提交它的进程里；多进程部署（见 serve.py）时任务 id 带上所在进程的前缀
+"<owner>-<uuid>"，其它进程收到该任务的请求时据此转交。停止服务前调用 drain() 等待任务结束。
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from progress import CancelToken, Cancelled, Progress
+
+JOB_WORKERS = int(os.environ.get("ORDER_ANALYSIS_JOB_WORKERS", "2"))
+MAX_PENDING = int(os.environ.get("ORDER_ANALYSIS_MAX_PENDING", "16"))
+JOB_TTL = 3600
+DISCONNECT_GRACE = 10
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "error", "cancelled"
+
+
+class JobError(Exception):
+    """可直接展示给用户的分析错误"""
+
+    status_code = 400
+
+
+class QueueFull(JobError):
+    status_code = 503
+
+
+class Job:
+    """单个分析任务；result 为任务函数的返回值，error 为失败时的错误信息"""
+
+    __slots__ = (
+        "id", "kind", "status", "result", "error", "submitted", "started", "finished", "progress",
+        "token", "watchers", "last_seen",
+    )
+
+    def __init__(self, kind: str, owner: str = ""):
+        self.id = f"{owner}-{uuid.uuid4().hex}" if owner else uuid.uuid4().hex
+        self.kind = kind
+        self.status = QUEUED
+        self.result = None
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.progress = Progress()
+        self.token = CancelToken()
+        self.watchers = 0  # 当前订阅进度的 SSE 连接数
+        self.last_seen = self.submitted  # 最近一次有客户端查看任务状态的时间
+
+    @property
+    def pending(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self) -> Dict[str, object]:
+        end = self.finished or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "elapsed": round(end - (self.started or end), 3),
+            "progress": self.progress.snapshot(),
+        }
+
+
+class JobQueue:
+    """有上限的后台任务队列（线程池），线程安全"""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, max_pending: int = MAX_PENDING, ttl: int = JOB_TTL):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        # 非空时作为新任务 id 的前缀（多进程部署时为所在工作进程的标识）
+        self.owner = ""
+
+    def submit(self, kind: str, fn: Callable, *args) -> Job:
+        """提交任务；排队数已满时抛出 QueueFull"""
+        with self._lock:
+            self._prune()
+            if sum(1 for j in self._jobs.values() if j.pending) >= self.max_pending:
+                raise QueueFull("服务器繁忙，排队中的分析任务过多，请稍后再试")
+            job = Job(kind, self.owner)
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def __len__(self) -> int:
+        """保留中的任务数（含已结束、尚未过期的任务）"""
+        with self._lock:
+            self._prune()
+            return len(self._jobs)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job: Job):
+        """取消任务：排队中的直接结束；运行中的在下一批行之后停止（见 _run）"""
+        job.token.cancel()
+        with self._lock:
+            if job.status != QUEUED:
+                return
+            job.status = CANCELLED
+            job.error = "分析已取消"
+            job.finished = time.time()
+        job.progress.set_stage("已取消")
+
+    def touch(self, job: Job):
+        """记录客户端仍在查看该任务（轮询状态、打开等待页）"""
+        job.last_seen = time.time()
+
+    @contextmanager
+    def watch(self, job: Job):
+        """SSE 连接期间登记订阅者；最后一个订阅者断开且宽限期内无人再查看时取消任务"""
+        with self._lock:
+            job.watchers += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                job.watchers -= 1
+                abandoned = job.watchers == 0 and job.pending
+            job.last_seen = time.time()
+            if abandoned:
+                timer = threading.Timer(DISCONNECT_GRACE, self._cancel_abandoned, (job,))
+                timer.daemon = True
+                timer.start()
+
+    def drain(self, timeout: float) -> bool:
+        """等待排队与运行中的任务结束（停止服务前调用）；超时后取消剩余任务并等其停止。
+        全部任务正常结束时返回 True"""
+        deadline = time.time() + timeout
+        while True:
+            with self._lock:
+                pending = [j for j in self._jobs.values() if j.pending]
+            if not pending:
+                return True
+            if time.time() >= deadline:
+                break
+            time.sleep(0.2)
+        for job in pending:
+            self.cancel(job)
+        # 运行中的任务在下一批行之后停止
+        self._pool.shutdown(wait=True)
+        return False
+
+    def _cancel_abandoned(self, job: Job):
+        if job.pending and job.watchers == 0 and time.time() - job.last_seen >= DISCONNECT_GRACE:
+            self.cancel(job)
+
+    def _run(self, job: Job, fn: Callable, args):
+        with self._lock:
+            if job.status == CANCELLED:
+                return
+            job.started = time.time()
+            job.status = RUNNING
+        job.progress.set_stage("处理中")
+        try:
+            job.result = fn(job, *args)
+            job.token.check()
+            job.status = DONE
+        except Cancelled as e:
+            job.error = str(e)
+            job.status = CANCELLED
+        except JobError as e:
+            job.error = str(e)
+            job.status = FAILED
+        except Exception as e:
+            job.error = f"处理文件时发生错误: {e}"
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            if job.status == CANCELLED:
+                # 取消的任务没有结果可看，立即释放
+                self._release(job)
+            # 更新进度版本，通知等待中的 SSE 连接任务已结束
+            job.progress.set_stage({DONE: "完成", CANCELLED: "已取消"}.get(job.status, "失败"))
+
+    def _prune(self):
+        """清理过期的已结束任务（调用方持有锁）"""
+        now = time.time()
+        expired = [j for j in self._jobs.values() if not j.pending and now - j.finished > self.ttl]
+        for job in expired:
+            del self._jobs[job.id]
+            self._release(job)
+
+    @staticmethod
+    def _release(job: Job):
+        """释放任务结果（统计结果、省份结果表等）；已开始的下载持有自己的引用，不受影响"""
+        job.result = None
+
+
+JOB_QUEUE = JobQueue()
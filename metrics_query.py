@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+metrics_query.py
+--------------------------------------------------
+SKU / 省份指标查询：结果行的构造、过滤、排序与分页，供 JSON 接口（/api/metrics/...）使用。
+
+统计结果优先取结果缓存（见 result_cache.py），未命中时由各文件的日粒度立方体
+（见 daily_cube.py）按日期范围相减得到并写回结果缓存。接口在请求线程中同步执行，
+从不解析原文件：尚未分析过（没有立方体）的文件返回 409，需先经 /process 提交分析任务。
+返回的指标与结果页 / 导出的工作簿一致；format="columns" 时按列返回（每个字段一个数组），
+避免每行重复字段名。
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from compute_logic import aggregate_cached
+from compute_province_metrics import _province_view, missing_province_message
+from order_status import CATEGORY_KEYS
+from province_table import province_row
+from result_cache import RESULT_CACHE, result_key
+from upload_store import stored_path
+
+SKU_FIELDS = (
+    "seller_sku", "total", "sign_rate", "completed_rate", "delivered_rate", "refund_rate",
+    "cancel_before_rate", "cancel_after_rate", "in_transit_rate",
+)
+PROVINCE_FIELDS = (
+    "seller_sku", "province", "total", "share_rate", "sign_rate", "completed_rate", "delivered_rate",
+    "refund_rate", "cancel_before_rate", "cancel_after_rate", "in_transit_rate",
+)
+FORMATS = ("rows", "columns")
+
+
+class QueryError(ValueError):
+    """查询参数有误；status_code 为对应的 HTTP 状态码"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sku_row(sku: str, m: Dict[str, int]) -> Dict[str, object]:
+    """单个 SKU 的结果行（结果页与 JSON 接口共用）；订单数为 0 时调用方应跳过"""
+    total = m["total"]
+    rates = {key: m.get(key, 0) / total * 100 for key in CATEGORY_KEYS}
+    row = {
+        "seller_sku": sku,
+        "total": total,
+        "sign_rate": round(rates["completed"] + rates["delivered"] + rates["refund"], 2),
+    }
+    for key in CATEGORY_KEYS:
+        row[f"{key}_rate"] = round(rates[key], 2)
+    return row
+
+
+def sku_rows(stats: Dict[str, Dict[str, int]]) -> List[Dict[str, object]]:
+    """全部 SKU 结果行，按订单数降序（与结果页、工作簿一致）"""
+    return [
+        sku_row(sku, m)
+        for sku, m in sorted(stats.items(), key=lambda x: (-x[1]["total"], x[0]))
+        if m["total"]
+    ]
+
+
+def resolve_files(digests: Sequence[str]) -> List[str]:
+    """把上传文件的内容摘要解析为存储中的路径并刷新其最近使用时间；摘要未知时抛出 QueryError(404)"""
+    if not digests:
+        raise QueryError("请至少指定一个文件摘要 (files)")
+    paths = []
+    for digest in digests:
+        path = stored_path(digest)
+        if path is None:
+            raise QueryError(f"未找到文件: {digest}", 404)
+        try:
+            os.utime(path)  # 只经接口查询的文件也算在用，不按过期时间清理（见 janitor.py）
+        except OSError:
+            pass
+        paths.append(path)
+    return paths
+
+
+def load_stats(digests: Sequence[str], start_date, end_date, mode: str) -> Tuple[object, str]:
+    """返回 (统计结果, 来源)：来源为 "cache"（结果缓存）或 "cube"（由立方体计算）。
+
+    mode 为 "sku" 时统计结果为 {SKU: 计数}；为 "province" 时为 {"stats": ..., "sku_totals": ...}。
+    任一文件尚无立方体时抛出 QueryError(409)，不在请求线程中解析文件。
+    """
+    paths = resolve_files(digests)
+    key = result_key(digests, start_date, end_date, mode)
+    cached = RESULT_CACHE.get(key)
+    if cached is not None:
+        return cached, "cache"
+
+    agg = aggregate_cached(paths, start_date, end_date)
+    if agg is None:
+        raise QueryError("文件尚未分析，请先提交分析任务（/process 或 /process_province）后再查询", 409)
+    if mode != "sku" and not agg.has_province:
+        raise QueryError(missing_province_message(agg.missing_province))
+    if mode == "sku":
+        result = agg.sku_stats
+        empty = not result
+    else:
+        stats, sku_totals = _province_view(agg)
+        result = {"stats": stats, "sku_totals": sku_totals}
+        empty = not stats
+    if not empty:
+        RESULT_CACHE.put(key, result)  # 与分析任务共用缓存键；空结果不缓存，任务仍按“未找到数据”报错
+    return result, "cube"
+
+
+def _select(rows: List[Dict[str, object]], fields: Sequence[str], sort: Optional[str], descending: bool,
+            offset: int, limit: Optional[int]) -> Tuple[int, List[Dict[str, object]]]:
+    if sort is not None:
+        if sort not in fields:
+            raise QueryError(f"不支持的排序字段: {sort}")
+        rows = sorted(rows, key=lambda r: r[sort], reverse=descending)
+    if offset < 0 or (limit is not None and limit < 0):
+        raise QueryError("offset / limit 不能为负数")
+    end = None if limit is None else offset + limit
+    return len(rows), rows[offset:end]
+
+
+def query_sku(
+    stats: Dict[str, Dict[str, int]],
+    skus: Optional[Iterable[str]] = None,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Tuple[int, List[Dict[str, object]]]:
+    """SKU 指标查询，返回 (符合条件的总行数, 分页后的行)；sort 为 None 时按订单数降序"""
+    if skus:
+        wanted = set(skus)
+        stats = {sku: m for sku, m in stats.items() if sku in wanted}
+    return _select(sku_rows(stats), SKU_FIELDS, sort, descending, offset, limit)
+
+
+def query_province(
+    stats: Dict[str, Dict[str, Dict[str, int]]],
+    sku_totals: Dict[str, int],
+    skus: Optional[Iterable[str]] = None,
+    provinces: Optional[Iterable[str]] = None,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Tuple[int, List[Dict[str, object]]]:
+    """SKU×省份 指标查询；sort 为 None 时按 SKU 升序、SKU 内订单数降序。
+    订单占比始终以该 SKU 的全部订单为分母，不受省份过滤影响"""
+    wanted_skus = set(skus) if skus else None
+    wanted_provs = set(provinces) if provinces else None
+    rows = []
+    for sku, prov_map in sorted(stats.items(), key=lambda x: x[0]):
+        if wanted_skus is not None and sku not in wanted_skus:
+            continue
+        total_sku = sku_totals.get(sku, 0)
+        for prov, m in sorted(prov_map.items(), key=lambda x: (-x[1]["total"], x[0])):
+            if wanted_provs is None or prov in wanted_provs:
+                rows.append(province_row(sku, prov, m, total_sku))
+    return _select(rows, PROVINCE_FIELDS, sort, descending, offset, limit)
+
+
+def to_columns(rows: List[Dict[str, object]], fields: Sequence[str]) -> Dict[str, list]:
+    """按列组织结果：{字段: [各行的值]}"""
+    return {field: [row[field] for row in rows] for field in fields}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+order_status.py
+--------------------------------------------------
+订单状态分类规则与分类器。
+
+规则以数据形式声明在 STATUS_RULES 中，按顺序匹配，命中第一条即停止：
+- substatus        Order Substatus 等于其中任一值（不区分大小写、去除首尾空白）
+- substatus_has    Order Substatus 包含其中任一子串
+- cancel_type      Cancelation/Return Type 等于其中任一值（与 substatus 条件为"或"关系）
+- cancel_empty     要求 Cancelation/Return Type 为空
+- shipped_split    按 Shipped Time 是否为空拆分为 (为空时类别, 不为空时类别)
+
+新增状态只需修改 STATUS_RULES。一份导出中 (子状态, 取消类型, 是否已发货) 的组合
+通常只有几十种，分类器对每种组合只计算一次，之后逐行分类只是一次字典查找。
+"""
+
+import hashlib
+import json
+from typing import Dict, Optional, Tuple
+
+# 指标类别，类别代码即在此元组中的下标
+CATEGORY_KEYS = ("completed", "delivered", "refund", "cancel_before", "cancel_after", "in_transit")
+CATEGORY_CODES = {key: code for code, key in enumerate(CATEGORY_KEYS)}
+# 不属于任何类别（只计入订单数）
+OTHER = -1
+
+STATUS_RULES = [
+    {"category": "completed", "substatus": ["已完成", "completed"], "cancel_empty": True},
+    {"category": "delivered", "substatus": ["已送达", "delivered"]},
+    {"category": "refund", "substatus_has": ["return", "refund"]},
+    {
+        "substatus": ["已取消", "canceled", "cancelled", "cancel"],
+        "cancel_type": ["canceled", "cancelled", "cancel"],
+        "shipped_split": ("cancel_before", "cancel_after"),
+    },
+    {"category": "in_transit", "substatus": ["运输中", "in transit"]},
+]
+
+
+def _norm(text) -> str:
+    return str(text).strip().lower() if text is not None else ""
+
+
+def is_blank(value) -> bool:
+    """单元格是否为空（None 或仅含空白的字符串）"""
+    return value is None or (value.__class__ is str and not value.strip())
+
+
+class StatusClassifier:
+    """把 (子状态, 取消类型, Shipped Time 是否为空) 映射为类别代码，并缓存结果"""
+
+    def __init__(self, rules=STATUS_RULES):
+        self._rules = []
+        for rule in rules:
+            split = rule.get("shipped_split")
+            if split:
+                codes = (CATEGORY_CODES[split[0]], CATEGORY_CODES[split[1]])
+            else:
+                code = CATEGORY_CODES[rule["category"]]
+                codes = (code, code)
+            self._rules.append((
+                frozenset(_norm(v) for v in rule.get("substatus", ())),
+                tuple(_norm(v) for v in rule.get("substatus_has", ())),
+                frozenset(_norm(v) for v in rule.get("cancel_type", ())),
+                bool(rule.get("cancel_empty")),
+                codes,
+            ))
+        # 查找表：原始单元格取值组合 -> 类别代码
+        self.table: Dict[Tuple[object, object, bool], int] = {}
+        # 规则指纹：按类别预聚合的缓存（见 daily_cube.py）据此判断是否需要重新生成
+        raw = json.dumps([CATEGORY_KEYS, rules], ensure_ascii=False, sort_keys=True)
+        self.fingerprint = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _compute(self, sub, cancel, shipped_empty: bool) -> int:
+        sub = _norm(sub)
+        cancel = _norm(cancel)
+        for subs, subs_has, cancels, cancel_empty, codes in self._rules:
+            matched = sub in subs or cancel in cancels or any(part in sub for part in subs_has)
+            if matched and (not cancel_empty or cancel == ""):
+                return codes[0] if shipped_empty else codes[1]
+        return OTHER
+
+    def classify(self, sub, cancel, shipped_empty: bool) -> int:
+        key = (sub, cancel, shipped_empty)
+        code = self.table.get(key)
+        if code is None:
+            code = self.table[key] = self._compute(sub, cancel, shipped_empty)
+        return code
+
+    def category(self, sub, cancel, shipped_empty: bool) -> Optional[str]:
+        """返回类别名，不属于任何类别时返回 None"""
+        code = self.classify(sub, cancel, shipped_empty)
+        return CATEGORY_KEYS[code] if code != OTHER else None
+
+
+DEFAULT_CLASSIFIER = StatusClassifier()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+progress.py
+--------------------------------------------------
+分析任务的解析进度（已扫描行数、已读取字节、当前文件、预计剩余时间）与取消标记。
+
+解析循环每 PROGRESS_BATCH 行上报一次进度并检查一次取消标记（见 compute_logic._add_batched），
+热路径上没有逐行开销；子进程中的上报经队列转发到主进程再更新。
+Progress 线程安全，wait_change() 供 SSE 推送（/jobs/<id>/events）等待新进度。
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# 每解析这么多行上报一次进度
+PROGRESS_BATCH = 10000
+
+
+class Progress:
+    """单个任务的进度状态"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+        self.stage = "排队中"
+        self.started: Optional[float] = None
+        self._files: Dict[int, Tuple[str, int]] = {}           # 文件序号 -> (文件名, 字节数)
+        self._parts: Dict[Tuple[int, int], Tuple[int, int]] = {}  # (文件序号, 区间序号) -> (行数, 已读字节)
+        self._current: Optional[str] = None
+
+    def _changed(self):
+        self.version += 1
+        self._cond.notify_all()
+
+    def set_stage(self, stage: str):
+        with self._cond:
+            self.stage = stage
+            self._changed()
+
+    def add_file(self, index: int, name: str, size: int):
+        """登记一个需要解析的文件"""
+        with self._cond:
+            if self.started is None:
+                self.started = time.time()
+            self._files[index] = (name, size)
+            self._changed()
+
+    def update(self, index: int, part: int, rows: int, nbytes: int):
+        """文件 index 的第 part 个区间累计已解析 rows 行、读取 nbytes 字节"""
+        with self._cond:
+            self._parts[(index, part)] = (rows, nbytes)
+            if index in self._files:
+                self._current = self._files[index][0]
+            self._changed()
+
+    def mirror(self, other: "Progress") -> int:
+        """复制另一份进度（合并到相同分析的任务展示共享计算的进度），返回复制时 other 的版本号"""
+        with other._cond:
+            version = other.version
+            state = (other.stage, other.started, dict(other._files), dict(other._parts), other._current)
+        with self._cond:
+            self.stage, self.started, self._files, self._parts, self._current = state
+            self._changed()
+        return version
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._cond:
+            rows = sum(r for r, _ in self._parts.values())
+            done_bytes = sum(b for _, b in self._parts.values())
+            total_bytes = sum(size for _, size in self._files.values())
+            elapsed = time.time() - self.started if self.started else 0.0
+            eta = None
+            if done_bytes and total_bytes > done_bytes:
+                eta = round(elapsed * (total_bytes - done_bytes) / done_bytes, 1)
+            elif total_bytes and done_bytes >= total_bytes:
+                eta = 0.0
+            return {
+                "stage": self.stage,
+                "rows": rows,
+                "bytes": done_bytes,
+                "total_bytes": total_bytes,
+                "percent": round(min(done_bytes / total_bytes, 1.0) * 100, 1) if total_bytes else None,
+                "current_file": self._current,
+                "files": len(self._files),
+                "elapsed": round(elapsed, 1),
+                "eta": eta,
+                "version": self.version,
+            }
+
+    def wait_change(self, version: int, timeout: float) -> bool:
+        """等待进度版本号超过 version，超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version > version, timeout)
+
+
+class Cancelled(Exception):
+    """分析已被取消"""
+
+
+class CancelToken:
+    """取消标记：任务在每批行之间、各阶段之间调用 check()，已取消时抛出 Cancelled"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled("分析已取消")
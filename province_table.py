@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+province_table.py
+--------------------------------------------------
+省份分析结果表的服务端分页、排序与 SKU 过滤。
+
+省份结果可达 SKU 数 × 省份数（如 3k × 34 ≈ 10 万）行。结果页只渲染 SKU 列表与各 SKU 订单数：
+选中单个 SKU 时由 /jobs/<id>/sku_provinces 读取该 SKU 的省份行，
+查看全部时由 /jobs/<id>/province_rows 按需分页读取（前端虚拟滚动）。
+ProvinceTable 直接引用聚合结果中的计数字典，比率在取页时才计算，
+排序后的行序号按排序键缓存，同一排序的翻页不再重复排序。
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from order_status import CATEGORY_KEYS
+
+# 分页请求的默认行数
+PAGE_ROWS = 100
+# 单次分页请求的最大行数
+MAX_PAGE_ROWS = 1000
+
+# 允许排序的列（与 province_row() 的字段一致）
+SORT_KEYS = (
+    "seller_sku", "province", "total", "share_rate", "sign_rate", "completed_rate", "delivered_rate",
+    "refund_rate", "cancel_before_rate", "cancel_after_rate", "in_transit_rate",
+)
+
+
+def _rate(m: Dict[str, int], key: str) -> float:
+    total = m["total"]
+    return m.get(key, 0) / total * 100 if total else 0
+
+
+def _sign_rate(m: Dict[str, int]) -> float:
+    return _rate(m, "completed") + _rate(m, "delivered") + _rate(m, "refund")
+
+
+def province_row(sku: str, prov: str, m: Dict[str, int], total_sku: int) -> Dict[str, object]:
+    """单个 SKU×省份 的结果行（结果页与 JSON 接口共用）"""
+    total = m["total"]
+    row = {
+        "seller_sku": sku,
+        "province": prov,
+        "total": total,
+        "share_rate": round(total / total_sku * 100 if total_sku else 0, 2),
+        "sign_rate": round(_sign_rate(m), 2),
+    }
+    for key in CATEGORY_KEYS:
+        row[f"{key}_rate"] = round(_rate(m, key), 2)
+    return row
+
+
+class ProvinceTable:
+    """省份结果表；默认顺序为 SKU 升序、SKU 内订单数降序（与导出的工作簿一致）"""
+
+    def __init__(self, stats: Dict[str, Dict[str, Dict[str, int]]], sku_totals: Dict[str, int]):
+        self.sku_totals = sku_totals
+        self._rows: List[Tuple[str, str, Dict[str, int]]] = []
+        self._sku_ranges: Dict[str, Tuple[int, int]] = {}  # SKU -> 默认顺序中的 [起, 止)
+        for sku, prov_map in sorted(stats.items(), key=lambda x: x[0]):
+            start = len(self._rows)
+            for prov, m in sorted(prov_map.items(), key=lambda x: (-x[1]["total"], x[0])):
+                self._rows.append((sku, prov, m))
+            self._sku_ranges[sku] = (start, len(self._rows))
+        self._orders: Dict[Tuple[str, bool], List[int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def total_orders(self) -> int:
+        return sum(m["total"] for _, _, m in self._rows)
+
+    def sku_list(self):
+        """[(SKU, 订单数), ...]，按订单数降序"""
+        return sorted(self.sku_totals.items(), key=lambda x: (-x[1], x[0]))
+
+    def sku_rows(self, sku: str) -> Optional[List[Dict[str, object]]]:
+        """单个 SKU 的全部省份行（默认顺序）；SKU 不存在时返回 None"""
+        if sku not in self._sku_ranges:
+            return None
+        start, end = self._sku_ranges[sku]
+        total_sku = self.sku_totals.get(sku, 0)
+        return [province_row(s, prov, m, total_sku) for s, prov, m in self._rows[start:end]]
+
+    def _sort_key(self, sort: str):
+        rows, totals = self._rows, self.sku_totals
+        if sort == "seller_sku":
+            return lambda i: rows[i][0]
+        if sort == "province":
+            return lambda i: rows[i][1]
+        if sort == "total":
+            return lambda i: rows[i][2]["total"]
+        if sort == "share_rate":
+            return lambda i: rows[i][2]["total"] / totals[rows[i][0]] if totals.get(rows[i][0]) else 0
+        if sort == "sign_rate":
+            return lambda i: _sign_rate(rows[i][2])
+        key = sort[: -len("_rate")]
+        return lambda i: _rate(rows[i][2], key)
+
+    def _order(self, sort: str, descending: bool) -> List[int]:
+        """全表按 sort 排序后的行序号（相同值保持默认顺序）"""
+        with self._lock:
+            order = self._orders.get((sort, descending))
+            if order is None:
+                order = sorted(range(len(self._rows)), key=self._sort_key(sort), reverse=descending)
+                self._orders[(sort, descending)] = order
+            return order
+
+    def page(
+        self,
+        offset: int = 0,
+        limit: int = PAGE_ROWS,
+        sort: Optional[str] = None,
+        descending: bool = False,
+        sku: Optional[str] = None,
+    ) -> Tuple[int, List[Dict[str, object]]]:
+        """返回 (符合条件的总行数, 第 offset 行起最多 limit 行)；sort 为 None 时按默认顺序"""
+        if sort is not None and sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        if sku:
+            start, end = self._sku_ranges.get(sku, (0, 0))
+            indexes = range(start, end)
+            if sort is not None:
+                indexes = sorted(indexes, key=self._sort_key(sort), reverse=descending)
+        elif sort is not None:
+            indexes = self._order(sort, descending)
+        else:
+            indexes = range(len(self._rows))
+
+        limit = max(0, min(limit, MAX_PAGE_ROWS))
+        rows = []
+        for i in indexes[offset: offset + limit]:
+            sku_i, prov, m = self._rows[i]
+            rows.append(province_row(sku_i, prov, m, self.sku_totals.get(sku_i, 0)))
+        return len(indexes), rows
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+result_cache.py
+--------------------------------------------------
+分析结果缓存：以 (文件内容摘要, 日期范围, 模式) 为键，保存统计结果。
+
+返回上一页、结果页重新筛选、下载后刷新等操作会反复提交相同的分析，
+命中缓存时直接读取统计 JSON，不再重新计算；工作簿在下载时由统计结果流式生成（见 xlsx_writer.py）。
+
+- 每条结果在磁盘上保存为 <键>.json，重启后仍然有效；
+- 按最近使用顺序淘汰（以 .json 的修改时间记录使用时间），总大小不超过字节预算，
+  预算由环境变量 ORDER_ANALYSIS_RESULT_CACHE_MB 指定（默认 256 MB）。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Sequence
+
+from columnar_cache import CACHE_DIR
+from order_status import DEFAULT_CLASSIFIER
+
+RESULT_DIR = os.path.join(CACHE_DIR, "results")
+RESULT_BUDGET_BYTES = int(os.environ.get("ORDER_ANALYSIS_RESULT_CACHE_MB", "256")) * 1024 * 1024
+
+
+def result_key(digests: Sequence[str], start_date, end_date, mode: str) -> str:
+    """结果缓存键；digests 为各文件的内容摘要（保持上传顺序），分类规则变化后键随之变化"""
+    ident = json.dumps([list(digests), str(start_date), str(end_date), mode, DEFAULT_CLASSIFIER.fingerprint])
+    return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """按字节预算淘汰的持久化 LRU 结果缓存（线程安全）"""
+
+    def __init__(self, directory: str = RESULT_DIR, budget_bytes: int = RESULT_BUDGET_BYTES):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._index: "OrderedDict[str, int]" = None  # 键 -> 占用字节数，按使用时间从旧到新
+        self._total = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        """首次使用时扫描目录，按上次使用时间恢复 LRU 顺序"""
+        if self._index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".xlsx"):
+                # 旧版本缓存的工作簿，已不再使用
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(".json"):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-5], st.st_size))
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._total = sum(self._index.values())
+
+    def _drop(self, key: str):
+        self._total -= self._index.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key: str):
+        """返回缓存的统计结果，未命中时返回 None"""
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            # 不在索引中的条目可能刚由其它工作进程写入，文件存在时同样命中
+            if key not in self._index and not os.path.exists(path):
+                return None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stats = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                self._drop(key)
+                return None
+            if key not in self._index:
+                size = os.path.getsize(path)
+                self._index[key] = size
+                self._total += size
+            self._index.move_to_end(key)
+            return stats
+
+    def put(self, key: str, stats):
+        """保存结果；stats 需可 JSON 序列化"""
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(stats, f, ensure_ascii=False)
+                os.replace(tmp, path)
+                size = os.path.getsize(path)
+            except OSError:
+                return
+            self._total += size - self._index.pop(key, 0)
+            self._index[key] = size
+            while self._total > self.budget_bytes and len(self._index) > 1:
+                self._drop(next(iter(self._index)))
+
+    def usage(self):
+        """返回 (条目数, 占用字节数)"""
+        with self._lock:
+            self._load_index()
+            return len(self._index), self._total
+
+
+RESULT_CACHE = ResultCache()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+serve.py
+--------------------------------------------------
+生产环境启动入口：预派生 (pre-fork) 多个工作进程，每个进程用有上限的线程池处理请求。
+
+用法：
+    python serve.py                          # 默认 0.0.0.0:4004
+    python serve.py --workers 4 --threads 16
+    kill -HUP  <主进程 PID>                   # 平滑重载：新进程预热就绪后再让旧进程退出
+    kill -TERM <主进程 PID>                   # 停止：不再接收新连接，等待进行中的任务结束（stop.sh）
+
+- 主进程只负责监听端口、派生与回收工作进程，不导入应用代码，因此 SIGHUP 重载会加载磁盘上的新代码；
+- 工作进程导入应用后先预热（模板、URL 映射、缓存索引），就绪后才开始接收连接；
+- 分析任务保存在提交它的进程里（见 jobs.py），任务 id 带有所在进程的前缀，
+  其它进程收到 /jobs/<id>/... 请求时经该进程的 Unix socket 转交（包括 SSE 进度推送与流式下载）；
+- 重载时旧进程停止接收新连接，进行中的任务照常完成，RELOAD_LINGER 秒内仍可查看这些任务的进度与结果；
+- 停止时各进程等待任务结束，最多 DRAIN_TIMEOUT 秒，之后取消剩余任务。
+
+Windows 没有 fork，此时退化为单进程多线程运行。开发调试仍可使用 python app.py。
+"""
+
+import argparse
+import http.client
+import os
+import re
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+HOST = os.environ.get("ORDER_ANALYSIS_HOST", "0.0.0.0")
+PORT = int(os.environ.get("ORDER_ANALYSIS_PORT", "4004"))
+# 工作进程数（默认取 CPU 核数，最多 4）与每个进程的请求线程数
+HTTP_WORKERS = int(os.environ.get("ORDER_ANALYSIS_HTTP_WORKERS", "0") or 0) or min(os.cpu_count() or 1, 4)
+HTTP_THREADS = int(os.environ.get("ORDER_ANALYSIS_HTTP_THREADS", "16"))
+# 停止时等待任务结束的最长秒数（stop.sh 在 SIGKILL 前最多等待 40 秒）
+DRAIN_TIMEOUT = float(os.environ.get("ORDER_ANALYSIS_DRAIN_TIMEOUT", "25"))
+# 重载后旧进程继续提供已结束任务结果的秒数
+RELOAD_LINGER = float(os.environ.get("ORDER_ANALYSIS_RELOAD_LINGER", "300"))
+# 工作进程预热的最长秒数
+READY_TIMEOUT = 60
+
+# 转交请求时附带的头，避免在进程间来回转发
+FORWARDED_HEADER = "X-Order-Analysis-Forwarded"
+_JOB_PATH = re.compile(r"^/jobs/(\d+)-[0-9a-f]{32}(?:/|$)")
+# 不转发的逐跳头
+_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "te", "trailer", "upgrade"}
+
+
+def _log(message: str):
+    print(f"[serve {os.getpid()}] {message}", flush=True)
+
+
+def warm_up(flask_app):
+    """预热：编译全部模板、初始化 MIME 类型表，并在请求上下文中渲染一次首页"""
+    import mimetypes
+
+    mimetypes.init()
+    for name in flask_app.jinja_env.list_templates():
+        flask_app.jinja_env.get_template(name)
+    with flask_app.test_client() as client:
+        client.get("/")
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__("localhost")
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self._path)
+
+
+class JobRouter:
+    """WSGI 中间件：/jobs/<id>/... 的任务不在本进程时，把请求转交给任务所在的工作进程"""
+
+    def __init__(self, app, owner: str, run_dir: str):
+        self.app = app
+        self.owner = owner
+        self.run_dir = run_dir
+
+    def __call__(self, environ, start_response):
+        match = _JOB_PATH.match(environ.get("PATH_INFO", ""))
+        if match and match.group(1) != self.owner and "HTTP_X_ORDER_ANALYSIS_FORWARDED" not in environ:
+            path = os.path.join(self.run_dir, f"{match.group(1)}.sock")
+            if os.path.exists(path):
+                try:
+                    return self._forward(path, environ, start_response)
+                except OSError:
+                    pass  # 任务所在进程已退出，交给本进程处理（任务不存在）
+        return self.app(environ, start_response)
+
+    def _forward(self, path: str, environ, start_response):
+        url = quote(environ.get("SCRIPT_NAME", "") + environ["PATH_INFO"])
+        if environ.get("QUERY_STRING"):
+            url += "?" + environ["QUERY_STRING"]
+        headers = {
+            key[5:].replace("_", "-").title(): value
+            for key, value in environ.items()
+            if key.startswith("HTTP_") and key[5:].replace("_", "-").lower() not in _HOP_HEADERS
+        }
+        if environ.get("CONTENT_TYPE"):
+            headers["Content-Type"] = environ["CONTENT_TYPE"]
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length) if length else None
+        headers[FORWARDED_HEADER] = self.owner
+
+        conn = _UnixHTTPConnection(path)
+        try:
+            conn.request(environ["REQUEST_METHOD"], url, body=body, headers=headers)
+            resp = conn.getresponse()
+        except OSError:
+            conn.close()
+            raise
+        start_response(
+            f"{resp.status} {resp.reason}",
+            [(k, v) for k, v in resp.getheaders() if k.lower() not in _HOP_HEADERS],
+        )
+
+        def relay():
+            try:
+                while True:
+                    chunk = resp.read1(64 * 1024)
+                    if not chunk:
+                        return
+                    yield chunk
+            finally:
+                conn.close()
+
+        return relay()
+
+
+class _RequestPool:
+    """有上限的请求线程池，记录处理中的请求数以便退出前等待"""
+
+    def __init__(self, threads: int):
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="http")
+        self._active = 0
+        self._cond = threading.Condition()
+
+    def submit(self, fn, *args):
+        with self._cond:
+            self._active += 1
+        self._pool.submit(self._run, fn, args)
+
+    def _run(self, fn, args):
+        try:
+            fn(*args)
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._active == 0, timeout)
+
+
+def _make_server(host: str, port: int, app, pool: _RequestPool, fd=None):
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class Handler(WSGIRequestHandler):
+        # 每个连接只处理一个请求：空闲的 keep-alive 连接不会占住线程池；
+        # 流式响应（SSE、下载）以关闭连接结束
+        protocol_version = "HTTP/1.0"
+
+    class PooledWSGIServer(BaseWSGIServer):
+        multithread = True
+
+        def process_request(self, request, client_address):
+            pool.submit(self._process_request_thread, request, client_address)
+
+        def _process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    return PooledWSGIServer(host, port, app, handler=Handler, fd=fd)
+
+
+def _serve_in_thread(server) -> threading.Thread:
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.2}, daemon=True)
+    thread.start()
+    return thread
+
+
+def _worker_main(listen_fd: int, ready_fd: int, host: str, port: int, run_dir: str, threads: int):
+    """工作进程：预热 → 通知主进程就绪 → 处理请求，收到 SIGTERM / SIGUSR1 后退出"""
+    retire = threading.Event()
+    state = {"linger": 0.0}
+
+    def on_term(signum, frame):
+        state["linger"] = 0.0
+        retire.set()
+
+    def on_retire(signum, frame):
+        # 重载：旧进程退役，任务结束后继续提供结果一段时间
+        state["linger"] = RELOAD_LINGER
+        retire.set()
+
+    signal.signal(signal.SIGTERM, on_term)
+    signal.signal(signal.SIGUSR1, on_retire)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程处理
+
+    import app as web
+    from jobs import JOB_QUEUE
+
+    owner = str(os.getpid())
+    JOB_QUEUE.owner = owner
+    warm_up(web.app)
+
+    pool = _RequestPool(threads)
+    public = _make_server(host, port, JobRouter(web.app, owner, run_dir), pool, fd=listen_fd)
+    os.close(listen_fd)  # 服务器持有自己的副本
+    private = _make_server(f"unix://{os.path.join(run_dir, owner + '.sock')}", 0, web.app, pool)
+    _serve_in_thread(public)
+    _serve_in_thread(private)
+    os.write(ready_fd, b"1")
+    os.close(ready_fd)
+
+    while not retire.wait(0.5):
+        pass
+    # 不再从共享端口接收连接；已转交过来的任务请求仍经 Unix socket 处理
+    _log("停止接收新连接" + ("（重载）" if state["linger"] else ""))
+    public.shutdown()
+    public.server_close()
+    # 重载：任务照常运行，结束后的结果在 RELOAD_LINGER 秒内仍可查看；期间收到 SIGTERM 则转为停止
+    deadline = time.time() + state["linger"]
+    while state["linger"] and len(JOB_QUEUE) and time.time() < deadline:
+        time.sleep(0.5)
+    if not JOB_QUEUE.drain(DRAIN_TIMEOUT):
+        _log(f"等待超过 {DRAIN_TIMEOUT:g} 秒，已取消未完成的任务")
+    private.shutdown()
+    private.server_close()
+    pool.wait_idle(5)
+    _log("工作进程退出")
+
+
+def _listen(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    return sock
+
+
+class Master:
+    """主进程：持有监听端口，派生 / 重载 / 回收工作进程"""
+
+    def __init__(self, host: str, port: int, workers: int, threads: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.current = set()  # 当前一代工作进程
+        self.children = set()  # 全部未回收的工作进程（含退役中的旧进程）
+        self._reload = False
+        self._stop = False
+
+    def _spawn(self):
+        """派生一个工作进程，返回 (pid, 就绪通知管道的读端)"""
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(r)
+                _worker_main(self.sock.fileno(), w, self.host, self.port, self.run_dir, self.threads)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        os.close(w)
+        self.children.add(pid)
+        return pid, r
+
+    def _spawn_generation(self):
+        """派生一代工作进程并等待全部预热就绪；有进程未就绪时结束这一代并返回 None"""
+        spawned = dict(self._spawn() for _ in range(self.workers))
+        waiting = {r: pid for pid, r in spawned.items()}
+        deadline = time.time() + READY_TIMEOUT
+        ok = True
+        while waiting and ok:
+            ready, _, _ = select.select(list(waiting), [], [], max(0.0, deadline - time.time()))
+            if not ready:
+                ok = False
+            for r in ready:
+                ok = ok and os.read(r, 1) == b"1"  # 读到 EOF 说明进程在预热中退出
+                os.close(r)
+                waiting.pop(r)
+        for r in waiting:
+            os.close(r)
+        if not ok:
+            for pid in spawned:
+                self._signal(pid, signal.SIGTERM)
+            return None
+        return set(spawned)
+
+    @staticmethod
+    def _signal(pid: int, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        """回收已退出的工作进程；当前一代有进程意外退出时补上"""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.children.discard(pid)
+            if pid in self.current:
+                self.current.discard(pid)
+                if not self._stop:
+                    _log(f"工作进程 {pid} 意外退出（状态 {status}），重新派生")
+                    pid, r = self._spawn()
+                    os.close(r)
+                    self.current.add(pid)
+
+    def _do_reload(self):
+        _log("收到 SIGHUP，重载工作进程")
+        new = self._spawn_generation()
+        if new is None:
+            _log("新工作进程未能就绪，继续使用旧进程")
+            return
+        old, self.current = self.current, new
+        for pid in old:
+            self._signal(pid, signal.SIGUSR1)
+        _log(f"重载完成：{sorted(new)}，旧进程 {sorted(old)} 处理完任务后退出")
+
+    def _on_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stop = True
+
+    def run(self):
+        self.sock = _listen(self.host, self.port)
+        self.run_dir = tempfile.mkdtemp(prefix="order_analysis_serve_")
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+        try:
+            self.current = self._spawn_generation()
+            if self.current is None:
+                _log("工作进程启动失败")
+                self._stop = True
+                self.current = set()
+            else:
+                _log(f"监听 http://{self.host}:{self.port}，工作进程 {sorted(self.current)}，每个 {self.threads} 线程")
+            while not self._stop:
+                if self._reload:
+                    self._reload = False
+                    self._do_reload()
+                self._reap()
+                time.sleep(0.2)
+            self._shutdown()
+        finally:
+            self.sock.close()
+            shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def _shutdown(self):
+        """通知全部工作进程停止，等待它们处理完任务；超时后强制结束"""
+        _log("停止服务，等待进行中的任务结束")
+        for pid in self.children:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.time() + DRAIN_TIMEOUT + 5
+        while self.children and time.time() < deadline:
+            self._reap()
+            time.sleep(0.2)
+        for pid in self.children:
+            self._signal(pid, signal.SIGKILL)
+        _log("已停止")
+
+
+def serve_single(host: str, port: int, threads: int):
+    """单进程多线程运行（没有 fork 的平台）"""
+    import app as web
+    from jobs import JOB_QUEUE
+
+    warm_up(web.app)
+    server = _make_server(host, port, web.app, _RequestPool(threads))
+    _log(f"监听 http://{host}:{port}（单进程，{threads} 线程）")
+    try:
+        server.serve_forever(poll_interval=0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        JOB_QUEUE.drain(DRAIN_TIMEOUT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订单分析系统（生产环境启动入口）")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=HTTP_WORKERS, help="工作进程数")
+    parser.add_argument("--threads", type=int, default=HTTP_THREADS, help="每个工作进程的请求线程数")
+    args = parser.parse_args()
+
+    # 各工作进程的解析子进程数按工作进程数平分 CPU（见 compute_logic._default_ingest_workers）
+    os.environ["ORDER_ANALYSIS_HTTP_WORKERS"] = str(max(1, args.workers))
+    if not hasattr(os, "fork"):
+        serve_single(args.host, args.port, args.threads)
+        return
+    Master(args.host, args.port, max(1, args.workers), max(1, args.threads)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+session_store.py
+--------------------------------------------------
+服务端会话与上传文件登记（SQLite）。
+
+会话上传过的文件不再以 {name, path} 列表放进签名 cookie：cookie 中只保存会话 id，
+每个会话引用了哪些文件（内容摘要 + 文件名、大小、上传时间）登记在 SQLite 数据库里。
+- 请求头大小不随上传文件数增长；
+- 文件路径在读取时由摘要解析（见 upload_store.stored_path），不绑定某个进程或临时目录，
+  多个工作进程、共享存储的多台机器都能服务同一个会话；
+- 数据库使用 WAL 模式，每个线程一个连接，多进程并发读写安全。
+
+数据库路径由环境变量 ORDER_ANALYSIS_SESSION_DB 指定，默认在上传存储目录下；
+超过 SESSION_TTL 秒未访问的会话在创建新会话时清理（只删除登记，不删除文件）。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from upload_store import UPLOAD_DIR, stored_path
+
+SESSION_DB = os.environ.get("ORDER_ANALYSIS_SESSION_DB", os.path.join(UPLOAD_DIR, "sessions.sqlite3"))
+SESSION_TTL = 30 * 86400
+# 会话最近访问时间的更新间隔，避免每个请求都写库
+_TOUCH_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id        TEXT PRIMARY KEY,
+    created   REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_files (
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    position   INTEGER NOT NULL,
+    name       TEXT NOT NULL,
+    sha256     TEXT NOT NULL,
+    size       INTEGER,
+    uploaded   REAL NOT NULL,
+    PRIMARY KEY (session_id, sha256)
+);
+CREATE INDEX IF NOT EXISTS session_files_sha256 ON session_files (sha256);
+"""
+
+
+class SessionRegistry:
+    """会话 → 上传文件 的登记表；各方法线程安全、可跨进程使用"""
+
+    def __init__(self, path: str = SESSION_DB, ttl: int = SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA foreign_keys = ON")
+            with self._init_lock:
+                if not self._ready:
+                    conn.execute("PRAGMA journal_mode = WAL")
+                    conn.executescript(_SCHEMA)
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def new_session(self) -> str:
+        """创建会话并返回 id；顺带清理过期会话"""
+        sid = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+        conn.execute("INSERT INTO sessions (id, created, last_seen) VALUES (?, ?, ?)", (sid, now, now))
+        return sid
+
+    def files(self, sid: Optional[str]) -> List[Dict[str, object]]:
+        """会话的文件列表（按上传顺序）：{name, sha256, size, uploaded, path}；
+        path 为存储中的路径，文件已被清理时为 None"""
+        if not sid:
+            return []
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "UPDATE sessions SET last_seen = ? WHERE id = ? AND last_seen < ?", (now, sid, now - _TOUCH_INTERVAL)
+        )
+        rows = conn.execute(
+            "SELECT name, sha256, size, uploaded FROM session_files WHERE session_id = ? ORDER BY position", (sid,)
+        ).fetchall()
+        return [
+            {"name": name, "sha256": digest, "size": size, "uploaded": uploaded, "path": stored_path(digest)}
+            for name, digest, size, uploaded in rows
+        ]
+
+    def add_files(self, sid: str, entries: Iterable[Tuple[str, str, int]]):
+        """登记上传的文件 (文件名, 摘要, 大小)。
+
+        相同内容（摘要相同）只保留一条；同名但内容不同的文件视为新版本，替换旧条目（保持原位置）。
+        """
+        now = time.time()
+        conn = self._conn()
+        with _transaction(conn):
+            conn.execute(
+                "INSERT INTO sessions (id, created, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET last_seen = excluded.last_seen",
+                (sid, now, now),
+            )
+            for name, digest, size in entries:
+                if conn.execute(
+                    "SELECT 1 FROM session_files WHERE session_id = ? AND sha256 = ?", (sid, digest)
+                ).fetchone():
+                    continue
+                old = conn.execute(
+                    "SELECT position FROM session_files WHERE session_id = ? AND name = ?", (sid, name)
+                ).fetchone()
+                if old is not None:
+                    conn.execute("DELETE FROM session_files WHERE session_id = ? AND name = ?", (sid, name))
+                    position = old[0]
+                else:
+                    position = conn.execute(
+                        "SELECT COALESCE(MAX(position), -1) + 1 FROM session_files WHERE session_id = ?", (sid,)
+                    ).fetchone()[0]
+                conn.execute(
+                    "INSERT INTO session_files (session_id, position, name, sha256, size, uploaded) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (sid, position, name, digest, size, now),
+                )
+
+    def remove_files(self, sid: str, digests: Iterable[str]):
+        """从会话中移除指定摘要的文件"""
+        self._conn().executemany(
+            "DELETE FROM session_files WHERE session_id = ? AND sha256 = ?", [(sid, d) for d in digests]
+        )
+
+    def clear(self, sid: Optional[str]):
+        """清空会话的文件列表（只删除登记，文件可能仍被其它会话引用）"""
+        if sid:
+            self._conn().execute("DELETE FROM session_files WHERE session_id = ?", (sid,))
+
+    def referenced_digests(self) -> Set[str]:
+        """仍被某个会话引用的文件摘要"""
+        return {row[0] for row in self._conn().execute("SELECT DISTINCT sha256 FROM session_files")}
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    """BEGIN IMMEDIATE ... COMMIT / ROLLBACK（连接为自动提交模式）"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+SESSION_REGISTRY = SessionRegistry()
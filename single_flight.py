@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+single_flight.py
+--------------------------------------------------
+相同分析的并发合并（single-flight）：键相同（文件内容摘要 + 日期范围 + 模式，即结果缓存键）的分析
+同一时间只计算一次，并发提交的任务挂到进行中的计算上，共享它的结果。
+
+- 计算在独立线程中进行，使用自己的进度与取消标记；挂在上面的每个任务各自镜像这份进度，
+  单个任务取消只是不再等待，其余任务照常拿到结果；所有任务都取消后计算才被取消；
+- 计算抛出的异常（如日期范围内没有数据）同样交给所有等待的任务：每个任务抛出自己的副本
+  （类型与消息相同，原异常作为 __cause__），不在多个线程中抛出同一个异常对象；
+- 多个工作进程之间（见 serve.py）用按键的文件锁排队：后到的进程等锁释放后，
+  计算函数重新检查结果缓存即可命中，不会再解析一遍文件。
+"""
+
+import copy
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from columnar_cache import CACHE_DIR
+from progress import CancelToken, Progress
+
+try:
+    import fcntl
+except ImportError:  # Windows 无 fcntl，只有单进程运行
+    fcntl = None
+
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+# 等待计算结果 / 跨进程锁时检查取消标记的间隔（秒）
+_POLL = 0.2
+_WAITING = "等待其它进程中的相同分析"
+
+
+class _Flight:
+    """一次进行中的计算"""
+
+    def __init__(self):
+        self.progress = Progress()
+        self.progress.stage = "处理中"
+        self.token = CancelToken()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发的计算（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+
+    def run(self, key: str, fn: Callable, progress: Progress, cancel: CancelToken):
+        """返回 fn(progress, cancel) 的结果；键相同的并发调用共享同一次执行。
+
+        progress / cancel 为调用方任务自己的进度与取消标记：计算的进度镜像到 progress，
+        cancel 被取消时抛出 Cancelled（计算仍为其它等待的任务继续）。
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                threading.Thread(
+                    target=self._compute, args=(key, flight, fn), name="analysis-flight", daemon=True
+                ).start()
+            flight.waiters += 1
+        try:
+            version = -1
+            while not flight.done.is_set():
+                cancel.check()
+                flight.progress.wait_change(version, _POLL)
+                if flight.progress.version != version:
+                    version = progress.mirror(flight.progress)
+            cancel.check()
+        finally:
+            with self._lock:
+                flight.waiters -= 1
+                if flight.waiters == 0 and not flight.done.is_set():
+                    # 没有任务再等待：取消计算，之后提交的相同分析重新开始
+                    flight.token.cancel()
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+        if flight.error is not None:
+            raise _waiter_error(flight.error) from flight.error
+        return flight.result
+
+    def _compute(self, key: str, flight: _Flight, fn: Callable):
+        try:
+            with key_lock(key, flight.token, flight.progress):
+                flight.result = fn(flight.progress, flight.token)
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.done.set()
+            flight.progress.set_stage("计算结束")  # 唤醒等待进度的任务
+
+    def in_flight(self) -> int:
+        """进行中的计算数"""
+        with self._lock:
+            return len(self._flights)
+
+
+def _waiter_error(error: BaseException) -> BaseException:
+    """等待任务各自抛出的异常：原异常的浅拷贝（保留类型，JobError 等照常处理）；无法拷贝时包装为 RuntimeError"""
+    try:
+        dup = copy.copy(error)
+    except Exception:
+        dup = None
+    if type(dup) is not type(error):
+        dup = RuntimeError(f"分析失败: {error}")
+    return dup
+
+
+@contextmanager
+def key_lock(key: str, cancel: CancelToken, progress: Progress):
+    """跨进程的按键文件锁（阻塞等待，期间检查取消标记）；没有 fcntl 时直接进入"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    path = os.path.join(LOCK_DIR, f"{key}.lock")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                if progress.stage != _WAITING:
+                    progress.set_stage(_WAITING)
+                cancel.check()
+                time.sleep(_POLL)
+                continue
+            if _same_file(fd, path):
+                break
+            # 打开后、加锁前锁文件被 janitor.py 删除：锁住的是已脱离目录的旧文件，重新打开
+            os.close(fd)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.utime(fd)  # 刷新使用时间，长期未用的锁文件由 janitor.py 清理
+        yield
+    finally:
+        os.close(fd)  # 关闭即释放锁
+
+
+def _same_file(fd: int, path: str) -> bool:
+    """fd 是否仍是 path 当前指向的文件"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    own = os.fstat(fd)
+    return (own.st_dev, own.st_ino) == (st.st_dev, st.st_ino)
+
+
+ANALYSES = SingleFlight()
@@ -55,4 +55,4 @@ echo    服务启动完成！
 echo ================================
 echo.
 
-python app.py 
\ No newline at end of file
+python serve.py
\ No newline at end of file
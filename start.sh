@@ -95,7 +95,8 @@ if [ -f app.pid ] && kill -0 "$(cat app.pid)" 2>/dev/null; then
   sleep 1
 fi
 
-nohup "$PY" app.py > app.log 2>&1 &
+# 生产模式：预派生多个工作进程（见 serve.py）；重载代码：kill -HUP "$(cat app.pid)"
+nohup "$PY" serve.py > app.log 2>&1 &
 echo $! > app.pid
 sleep 2
 
@@ -0,0 +1,93 @@
+// 后台分析任务：订阅进度（SSE，不支持时轮询），结束后跳转到结果页（失败或取消时结果页会提示并返回首页）
+// homeUrl 为首页地址（由模板的 url_for('index') 给出，部署在子路径下时同样有效）；返回停止订阅的函数
+function watchJob(job, homeUrl, onStatus) {
+    let stopped = false;
+    let source = null;
+    const finish = data => {
+        if (data.status === 'done' || data.status === 'error' || data.status === 'cancelled') {
+            window.location = data.result_url;
+            return true;
+        }
+        return false;
+    };
+
+    const poll = () => {
+        if (stopped) return;
+        fetch(job.status_url, { headers: { 'Accept': 'application/json' } })
+            .then(resp => resp.json())
+            .then(data => {
+                if (stopped) return;
+                if (data.error && !data.status) {
+                    // 任务不存在或已过期
+                    window.location = homeUrl;
+                    return;
+                }
+                if (onStatus) onStatus(data);
+                if (!finish(data)) setTimeout(poll, 1000);
+            })
+            .catch(() => setTimeout(poll, 2000));
+    };
+
+    const stop = () => {
+        stopped = true;
+        if (source) source.close();
+    };
+
+    if (!window.EventSource || !job.events_url) {
+        poll();
+        return stop;
+    }
+    source = new EventSource(job.events_url);
+    source.onmessage = e => {
+        if (stopped) return;
+        const data = JSON.parse(e.data);
+        if (onStatus) onStatus(data);
+        if (finish(data)) source.close();
+    };
+    source.onerror = () => {
+        // 连接中断（如经过不支持 SSE 的代理）时改为轮询
+        source.close();
+        poll();
+    };
+    return stop;
+}
+
+// 取消任务，返回 Promise（任务状态）
+function cancelJob(job) {
+    return fetch(job.cancel_url, { method: 'POST', headers: { 'Accept': 'application/json' } })
+        .then(resp => resp.json());
+}
+
+function formatSeconds(sec) {
+    sec = Math.round(sec);
+    return sec >= 60 ? `${Math.floor(sec / 60)} 分 ${sec % 60} 秒` : `${sec} 秒`;
+}
+
+// 任务状态的中文描述
+function describeJob(data) {
+    if (data.status === 'queued') return '排队中...';
+    if (data.status === 'done') return '已完成，正在跳转...';
+    if (data.status === 'error') return '处理失败';
+    if (data.status === 'cancelled') return '已取消';
+
+    const p = data.progress || {};
+    const parts = [p.stage || '处理中'];
+    if (p.current_file && p.stage === '解析文件') parts.push(p.current_file);
+    if (p.rows) parts.push(`已扫描 ${p.rows.toLocaleString()} 行`);
+    if (p.eta !== null && p.eta !== undefined && p.stage === '解析文件') parts.push(`预计剩余 ${formatSeconds(p.eta)}`);
+    else if (data.elapsed) parts.push(`已用时 ${formatSeconds(data.elapsed)}`);
+    return parts.join(' · ');
+}
+
+// 更新进度条（percent 为空时显示为不确定进度）
+function renderJobProgress(bar, text, data) {
+    const p = data.progress || {};
+    const percent = data.status === 'done' ? 100 : p.percent;
+    if (percent === null || percent === undefined) {
+        bar.style.width = '100%';
+        bar.classList.add('progress-bar-striped', 'progress-bar-animated');
+    } else {
+        bar.style.width = `${percent}%`;
+    }
+    text.textContent = describeJob(data);
+}
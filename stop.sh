@@ -34,8 +34,8 @@ fi
 echo -e "${YELLOW}[步骤1] 尝试优雅停止 PID ${PID} (SIGTERM)...${NC}"
 kill "$PID" 2>/dev/null || true
 
-# 最多等待 10 次 * 0.5s = 5s
-for i in {1..10}; do
+# 服务会先等待进行中的分析任务结束（最多 25s，见 serve.py），最多等待 80 次 * 0.5s = 40s
+for i in {1..80}; do
   if ! kill -0 "$PID" 2>/dev/null; then
     break
   fi
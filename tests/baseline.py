@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+baseline.py
+--------------------------------------------------
+最初版本的计算逻辑（整表加载 openpyxl / csv.reader + 逐行 _to_date + 逐行分类 + 普通模式工作簿），
+只保留计算所需的部分，作为新引擎、列式缓存、日粒度立方体与流式写出器的对照基准。
+"""
+
+import csv
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from io import BytesIO, TextIOWrapper
+from typing import Dict, List
+from zipfile import BadZipFile
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import from_excel
+from openpyxl.utils.exceptions import InvalidFileException
+
+TARGET_COLUMNS = {
+    "order_substatus": ["order substatus"],
+    "cancel_type": ["cancelation/return type", "cancellation/return type"],
+    "seller_sku": ["seller sku"],
+    "shipped_time": ["shipped time"],
+    "created_time": ["created time"],
+    "province": ["province", "state", "province/state", "state/province", "province name"],
+}
+KEYS = ("seller_sku", "province", "order_substatus", "cancel_type", "shipped_time", "created_time")
+
+SKU_HEADERS = [
+    "Seller SKU", "订单数", "签收率(%)", "已完成率(%)", "已送达率(%)", "退款率(%)", "发货前取消率(%)", "发货后取消率(%)", "仍在途率(%)",
+]
+PROVINCE_HEADERS = [
+    "Seller SKU", "Province", "订单数", "订单占比(%)", "签收率(%)", "已完成率(%)", "已送达率(%)", "退款率(%)",
+    "发货前取消率(%)", "发货后取消率(%)", "仍在途率(%)",
+]
+
+
+def _norm(text):
+    return str(text).strip().lower() if text is not None else ""
+
+
+def _locate(headers: List[str]) -> Dict[str, int]:
+    header_map = {_norm(h): idx for idx, h in enumerate(headers) if h is not None}
+    cols = {}
+    for key, aliases in TARGET_COLUMNS.items():
+        for a in aliases:
+            if a in header_map:
+                cols[key] = header_map[a]
+                break
+        if key not in cols:
+            raise KeyError(f"列缺失: {aliases[0]}")
+    return cols
+
+
+def iter_rows(path: str):
+    """(sku, 省份, 子状态, 取消类型, 发货时间, 创建时间)，跳过标题行与描述行"""
+    with open(path, "rb") as f:
+        data = BytesIO(f.read())
+    try:
+        wb = load_workbook(data, data_only=True)
+        ws = wb.active
+        cols = _locate(list(next(ws.iter_rows(min_row=1, max_row=1, values_only=True))))
+        for row in ws.iter_rows(min_row=3, values_only=True):
+            yield tuple(row[cols[k]] for k in KEYS)
+        wb.close()
+    except (InvalidFileException, BadZipFile):
+        data.seek(0)
+        reader = csv.reader(TextIOWrapper(data, encoding="utf-8-sig"))
+        cols = _locate(next(reader))
+        next(reader, None)
+        for row in reader:
+            yield tuple(row[cols[k]] if cols[k] < len(row) else None for k in KEYS)
+
+
+def to_date(val):
+    if val is None:
+        return None
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, date):
+        return val
+    if isinstance(val, (int, float)):
+        try:
+            return from_excel(val).date()
+        except Exception:
+            pass
+    if isinstance(val, str):
+        txt = val.strip().replace("年", "-").replace("月", "-").replace("日", "")
+        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y", "%m/%d/%Y %H:%M:%S", "%m/%d/%Y"):
+            try:
+                return datetime.strptime(txt, fmt).date()
+            except ValueError:
+                continue
+        m = re.fullmatch(r"(\d{4})(\d{2})(\d{2})", txt)
+        if m:
+            try:
+                return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+            except ValueError:
+                pass
+    return None
+
+
+def _classify(s, sub, cancel, shipped):
+    sub = _norm(sub)
+    cancel = _norm(cancel)
+    shipped_empty = shipped is None or str(shipped).strip() == ""
+    if sub in {"已完成", "completed"} and cancel == "":
+        s["completed"] += 1
+    elif sub in {"已送达", "delivered"}:
+        s["delivered"] += 1
+    elif "return" in sub or "refund" in sub:
+        s["refund"] += 1
+    elif sub in {"已取消", "canceled", "cancelled", "cancel"} or cancel in {"canceled", "cancelled", "cancel"}:
+        if shipped_empty:
+            s["cancel_before"] += 1
+        else:
+            s["cancel_after"] += 1
+    elif sub in {"运输中", "in transit"}:
+        s["in_transit"] += 1
+
+
+def compute(paths, start_date=None, end_date=None):
+    """返回 (SKU 级统计, SKU×省份统计, SKU 总订单数)；start_date 为 None 时不按日期过滤"""
+    sku_stats = defaultdict(lambda: defaultdict(int))
+    province_stats = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    sku_totals = defaultdict(int)
+    for path in paths:
+        for sku, province, sub, cancel, shipped, created in iter_rows(path):
+            if sku is None:
+                continue
+            if start_date is not None:
+                d = to_date(created)
+                if d is None or not start_date <= d <= end_date:
+                    continue
+            sku = str(sku)
+            prov = str(province).strip() if province is not None else ""
+            sku_totals[sku] += 1
+            for s in (sku_stats[sku], province_stats[sku][prov]):
+                s["total"] += 1
+                _classify(s, sub, cancel, shipped)
+    return sku_stats, province_stats, sku_totals
+
+
+def plain(stats):
+    """嵌套计数字典转为普通 dict，去掉计数为 0 的项（defaultdict 读取时会插入 0）"""
+    if isinstance(stats, dict) and stats and not isinstance(next(iter(stats.values())), dict):
+        return {k: v for k, v in stats.items() if v}
+    return {k: plain(v) for k, v in stats.items()}
+
+
+def sku_workbook(sku_stats) -> Workbook:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "订单指标"
+    ws.append(SKU_HEADERS)
+    for sku, m in sorted(sku_stats.items(), key=lambda x: (-x[1]["total"], x[0])):
+        total = m["total"]
+        if total == 0:
+            continue
+        rates = [m.get(k, 0) / total * 100 for k in ("completed", "delivered", "refund", "cancel_before", "cancel_after", "in_transit")]
+        ws.append([sku, total, round(rates[0] + rates[1] + rates[2], 2)] + [round(r, 2) for r in rates])
+    for idx in range(1, len(SKU_HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(idx)].width = 14
+    return wb
+
+
+def province_workbook(province_stats, sku_totals) -> Workbook:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "省份指标"
+    ws.append(PROVINCE_HEADERS)
+    for sku, province_map in sorted(province_stats.items(), key=lambda x: x[0]):
+        total_sku = sku_totals.get(sku, 0)
+        for prov, m in sorted(province_map.items(), key=lambda x: (-x[1]["total"], x[0])):
+            total = m["total"]
+            rates = [m[k] / total * 100 if total else 0 for k in ("completed", "delivered", "refund", "cancel_before", "cancel_after", "in_transit")]
+            share = total / total_sku * 100 if total_sku else 0
+            ws.append([sku, prov, total, round(share, 2), round(rates[0] + rates[1] + rates[2], 2)] + [round(r, 2) for r in rates])
+    for idx in range(1, len(PROVINCE_HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(idx)].width = 14
+    return wb
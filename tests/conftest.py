@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""测试公共设置：缓存、上传目录与会话数据库指向临时目录（须在导入应用模块之前设置），以及提交分析任务的辅助函数"""
+
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="order_analysis_test_")
+os.environ["ORDER_ANALYSIS_CACHE_DIR"] = os.path.join(_TMP, "cache")
+os.environ["ORDER_ANALYSIS_UPLOAD_DIR"] = os.path.join(_TMP, "uploads")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FINISHED = ("done", "error", "cancelled")
+
+
+@pytest.fixture
+def client():
+    from app import app
+
+    return app.test_client()
+
+
+@pytest.fixture
+def run_job():
+    """提交分析并等待结束，返回任务状态（JSON）"""
+
+    def run(client, url, path=None, data=None, timeout=60):
+        form = dict(data or {})
+        kwargs = {}
+        if path is not None:
+            with open(path, "rb") as f:
+                form["files"] = [(BytesIO(f.read()), os.path.basename(path))]
+            kwargs["content_type"] = "multipart/form-data"
+        resp = client.post(url, headers={"Accept": "application/json"}, data=form, **kwargs)
+        assert resp.status_code == 202, resp.get_json()
+        job = resp.get_json()
+        deadline = time.time() + timeout
+        while True:
+            status = client.get(job["status_url"]).get_json()
+            if status["status"] in FINISHED:
+                return status
+            assert time.time() < deadline, status
+            time.sleep(0.02)
+
+    return run
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+sample_orders.py
+--------------------------------------------------
+测试用的订单样例数据：列顺序与平台导出一致（第 2 行为描述行），
+包含带引号、逗号与换行的商品名，以及多种 Created Time 写法（ISO、DD/MM/YYYY、中文、日期单元格、Excel 序列号）。
+"""
+
+import csv
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+HEADERS = [
+    "Order ID", "Order Substatus", "Cancelation/Return Type", "Seller SKU", "Product Name",
+    "Created Time", "Shipped Time", "Province", "Quantity",
+]
+SUBSTATUS = ["已完成", "已送达", "运输中", "已取消", "Completed", "Delivered", "In transit", "Canceled", "Return/Refund"]
+PROVINCES = ["广东", "浙江", "江苏", "山东", "四川"]
+BASE = datetime(2025, 6, 1, 8, 30, 0)
+
+
+def _fmt(created: datetime, style: str):
+    if style == "iso":
+        return created.strftime("%Y-%m-%d %H:%M:%S")
+    if style == "slash":
+        return created.strftime("%d/%m/%Y %H:%M:%S")
+    if style == "cn":
+        return created.strftime("%Y年%m月%d日 %H:%M:%S")
+    if style == "datetime":
+        return created  # 写入 .xlsx 时为带日期格式的单元格
+    if style == "serial":
+        # Excel 序列号（1900 日期系统）
+        return (created - datetime(1899, 12, 30)).total_seconds() / 86400
+    raise ValueError(style)
+
+
+def make_orders(n: int = 400, seed: int = 1, styles=("slash",), skus: int = 12):
+    """生成 n 行订单；Created Time 按 styles 轮流使用各种写法"""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        sub = rnd.choice(SUBSTATUS)
+        created = BASE + timedelta(minutes=rnd.randrange(60 * 24 * 40))
+        style = styles[i % len(styles)]
+        shipped = "" if rnd.random() < 0.3 else _fmt(created + timedelta(days=1), "slash")
+        name = f'商品 {i}'
+        if i % 7 == 0:
+            name = f'多行\n"带引号", 商品 {i}'
+        rows.append([
+            str(580000000000000000 + i),
+            sub,
+            "Cancel" if sub in ("已取消", "Canceled") else "",
+            f"SKU-{rnd.randrange(skus):03d}",
+            name,
+            _fmt(created, style),
+            shipped,
+            rnd.choice(PROVINCES),
+            rnd.randrange(1, 4),
+        ])
+    return rows
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(HEADERS)
+        w.writerow([f"{h} description" for h in HEADERS])
+        w.writerows(rows)
+    return str(path)
+
+
+def write_xlsx(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    ws.append([f"{h} description" for h in HEADERS])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return str(path)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""聚合结果内存缓存：命中时返回副本，多线程并发访问安全"""
+
+import threading
+from datetime import date, timedelta
+
+import compute_logic
+from compute_logic import aggregate_files
+from sample_orders import make_orders, write_csv
+
+
+def test_cached_aggregate_is_a_copy(tmp_path):
+    path = write_csv(tmp_path / "orders.csv", make_orders(300, seed=31))
+    first = aggregate_files([path], None, None)
+    expected = {sku: dict(m) for sku, m in first.sku_stats.items()}
+
+    # 调用方修改自己拿到的结果（含 defaultdict 的隐式插入）不影响缓存
+    sku = next(iter(first.sku_stats))
+    first.sku_stats[sku]["total"] += 1000
+    first.province_stats[sku]["不存在的省份"]["cancel_after"]
+    again = aggregate_files([path], None, None)
+    assert again is not first
+    assert {s: dict(m) for s, m in again.sku_stats.items()} == expected
+    assert "不存在的省份" not in again.province_stats[sku]
+
+
+def test_concurrent_access_with_eviction(tmp_path):
+    path = write_csv(tmp_path / "orders.csv", make_orders(300, seed=37))
+    start = date(2025, 6, 1)
+    ranges = [(start + timedelta(days=i), start + timedelta(days=i + 20)) for i in range(compute_logic._AGGREGATE_CACHE_SIZE * 2)]
+    expected = {r: aggregate_files([path], *r).sku_totals.copy() for r in ranges}
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(60):
+                r = ranges[(n * 7 + i) % len(ranges)]
+                assert aggregate_files([path], *r).sku_totals == expected[r]
+        except Exception as e:  # 汇总到主线程断言
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""JSON 查询接口：参数校验与查询结果"""
+
+import csv
+from datetime import date
+
+import pytest
+
+from result_cache import RESULT_CACHE, result_key
+from sample_orders import HEADERS, make_orders, write_csv
+from session_store import SESSION_REGISTRY
+from upload_store import save_stream
+
+
+def _uploaded_digest(client):
+    with client.session_transaction() as sess:
+        return SESSION_REGISTRY.files(sess["sid"])[0]["sha256"]
+
+
+def test_query_uploaded_file(tmp_path, client, run_job):
+    path = write_csv(tmp_path / "orders.csv", make_orders(200, seed=5))
+    status = run_job(client, "/process", path)
+    assert status["status"] == "done"
+    digest = _uploaded_digest(client)
+    resp = client.post("/api/metrics/sku", json={"files": [digest], "sort": "total", "order": "desc"})
+    assert resp.status_code == 200, resp.get_json()
+    rows = resp.get_json()["rows"]
+    assert sum(r["total"] for r in rows) == 200
+    assert [r["total"] for r in rows] == sorted((r["total"] for r in rows), reverse=True)
+
+    # GET 查询参数：省份视图按 SKU 过滤并分页
+    sku = rows[0]["seller_sku"]
+    resp = client.get(f"/api/metrics/province?files={digest}&skus={sku}&limit=2")
+    assert resp.status_code == 200, resp.get_json()
+    body = resp.get_json()
+    assert len(body["rows"]) <= 2 and {r["seller_sku"] for r in body["rows"]} == {sku}
+
+
+def test_new_date_range_is_computed_from_cube_then_cached(tmp_path, client, run_job):
+    path = write_csv(tmp_path / "orders.csv", make_orders(200, seed=6))
+    assert run_job(client, "/process", path)["status"] == "done"
+    digest = _uploaded_digest(client)
+    query = {"files": [digest], "start_date": "2025-06-05", "end_date": "2025-06-20"}
+    first = client.post("/api/metrics/province", json=query).get_json()
+    assert first["source"] == "cube"
+    assert RESULT_CACHE.get(result_key([digest], date(2025, 6, 5), date(2025, 6, 20), "province")) is not None
+    second = client.post("/api/metrics/province", json=query).get_json()
+    assert second["source"] == "cache"
+    assert second["rows"] == first["rows"]
+
+
+def test_unanalysed_file_is_not_parsed_in_request(tmp_path, client):
+    path = write_csv(tmp_path / "fresh.csv", make_orders(50, seed=7))
+    with open(path, "rb") as f:
+        digest, _ = save_stream(f, "fresh.csv")
+    resp = client.post("/api/metrics/sku", json={"files": [digest]})
+    assert resp.status_code == 409
+    assert "error" in resp.get_json()
+
+
+
+def test_missing_province_column_reported_explicitly(tmp_path, client, run_job):
+    keep = [i for i, h in enumerate(HEADERS) if h != "Province"]
+    path = tmp_path / "no_province.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        for row in [HEADERS, HEADERS] + make_orders(40, seed=8):
+            w.writerow([row[i] for i in keep])
+    assert run_job(client, "/process", str(path))["status"] == "done"
+    digest = _uploaded_digest(client)
+    assert client.post("/api/metrics/sku", json={"files": [digest]}).status_code == 200
+    resp = client.post("/api/metrics/province", json={"files": [digest]})
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "未找到列: province (文件: no_province.csv)"
+    status = run_job(client, "/process_province")
+    assert status["status"] == "error"
+    assert status["error"] == "未找到列: province (文件: no_province.csv)"
+
+def test_unknown_file_and_bad_dates(client):
+    resp = client.post("/api/metrics/sku", json={"files": ["0" * 64]})
+    assert resp.status_code == 404
+    resp = client.post("/api/metrics/sku", json={"files": ["0" * 64], "start_date": "2025-02-30"})
+    assert resp.status_code == 400
+    assert "error" in resp.get_json()
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"files": 5},
+        {"files": {"a": 1}},
+        {"files": [["nested"]]},
+        {"skus": 3},
+        {"format": ["rows"]},
+        ["not", "an", "object"],
+        "just a string",
+    ],
+)
+def test_malformed_json_body_is_rejected(client, body):
+    resp = client.post("/api/metrics/sku", json=body)
+    assert resp.status_code == 400
+    assert "error" in resp.get_json()
+
+
+def test_invalid_json_is_rejected(client):
+    resp = client.post("/api/metrics/sku", data='{"files": [', content_type="application/json")
+    assert resp.status_code == 400
+    assert resp.get_json()["error"] == "请求体不是合法 JSON"
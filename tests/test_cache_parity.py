@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""列式缓存与日粒度立方体：任意日期范围的统计与最初的逐行实现一致，重启（只剩磁盘缓存）后依然一致"""
+
+import os
+from datetime import date, timedelta
+
+import pytest
+
+import compute_logic
+from baseline import compute, plain
+from columnar_cache import OrderColumns, cache_path
+from compute_logic import _build_columns, aggregate_files
+from daily_cube import DailyCube
+from order_status import CATEGORY_KEYS, DEFAULT_CLASSIFIER
+from sample_orders import make_orders, write_csv, write_xlsx
+from upload_store import file_digest
+
+RANGES = [
+    (None, None),                                  # 不过滤：含日期无法解析的行
+    (date(2025, 6, 1), date(2025, 7, 15)),         # 覆盖全部数据
+    (date(2025, 1, 1), date(2025, 6, 10)),         # 起点早于数据
+    (date(2025, 6, 20), date(2026, 1, 1)),         # 终点晚于数据
+    (date(2025, 6, 15), date(2025, 6, 15)),        # 单日
+    (date(2024, 1, 1), date(2024, 12, 31)),        # 没有数据
+]
+
+
+def _orders(seed, styles):
+    rows = make_orders(600, seed=seed, styles=styles)
+    rows[10][5] = ""             # 空日期
+    rows[11][5] = "not a date"   # 无法解析
+    rows[12][3] = ""             # 空 SKU（CSV 中为空字符串，仍计入）
+    return rows
+
+
+@pytest.fixture(params=["csv", "xlsx"])
+def order_file(request, tmp_path):
+    if request.param == "csv":
+        return write_csv(tmp_path / "orders.csv", _orders(41, ("slash", "iso", "cn")))
+    return write_xlsx(tmp_path / "orders.xlsx", _orders(42, ("serial", "datetime", "slash")))
+
+
+def _forget_memory():
+    """模拟重启：清空内存中的聚合结果与立方体，只剩磁盘缓存"""
+    compute_logic._AGGREGATE_CACHE.clear()
+    compute_logic._CUBE_CACHE.clear()
+
+
+def _assert_matches(path, start, end):
+    sku_stats, province_stats, sku_totals = compute([path], start, end)
+    agg = aggregate_files([path], start, end, workers=1)
+    assert plain(agg.sku_stats) == plain(sku_stats), (start, end)
+    assert plain(agg.province_stats) == plain(province_stats), (start, end)
+    assert dict(agg.sku_totals) == dict(sku_totals), (start, end)
+
+
+def test_ranges_match_baseline(order_file):
+    for start, end in RANGES:
+        _assert_matches(order_file, start, end)
+
+
+def test_every_single_day_matches_baseline(order_file):
+    day = date(2025, 5, 30)
+    while day <= date(2025, 7, 15):
+        _assert_matches(order_file, day, day + timedelta(days=2))
+        day += timedelta(days=3)
+
+
+def test_disk_cache_after_restart(order_file):
+    key = file_digest(order_file)
+    aggregate_files([order_file], None, None, workers=1)
+    assert os.path.exists(cache_path(key, "col"))
+    assert os.path.exists(cache_path(key, "cube"))
+
+    _forget_memory()
+    for start, end in RANGES:
+        _assert_matches(order_file, start, end)
+
+    # 立方体丢失：由列式缓存重新生成
+    _forget_memory()
+    os.remove(cache_path(key, "cube"))
+    for start, end in RANGES:
+        _assert_matches(order_file, start, end)
+    assert os.path.exists(cache_path(key, "cube"))
+
+
+def test_columns_and_cube_roundtrip(order_file, tmp_path):
+    columns = _build_columns(order_file, compute_logic.XLSX_ENGINE)
+    columns.save(str(tmp_path / "x.col"))
+    loaded = OrderColumns.load(str(tmp_path / "x.col"))
+    width = len(CATEGORY_KEYS) + 1
+    cube = DailyCube.from_columns(loaded, DEFAULT_CLASSIFIER, width)
+    cube.save(str(tmp_path / "x.cube"))
+    cube = DailyCube.load(str(tmp_path / "x.cube"))
+
+    for start, end in RANGES:
+        lo = None if start is None else start.toordinal()
+        hi = None if end is None else end.toordinal()
+        expected = columns.query(lo, hi, DEFAULT_CLASSIFIER.classify, width)
+        assert loaded.query(lo, hi, DEFAULT_CLASSIFIER.classify, width) == expected
+        cells, rows = cube.query(lo, hi)
+        assert rows == expected[1]
+        assert cells == expected[0]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""大 CSV 按字节区间切分：区间边界对齐到记录边界，带引号的换行不被切断"""
+
+import csv
+from datetime import date
+
+import pytest
+
+import compute_logic
+from baseline import compute, plain
+from compute_logic import aggregate_files
+from csv_ranges import align_splits, count_quotes, open_range, raw_splits, read_head
+from sample_orders import HEADERS, make_orders, write_csv
+
+
+def _records(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.reader(f))
+
+
+def _split_records(path, parts):
+    headers, data_start, size = read_head(path)
+    splits = raw_splits(data_start, size, parts)
+    quotes = [count_quotes(path, s, e) for s, e in zip(splits[:-1], splits[1:])]
+    records = []
+    for start, end in align_splits(path, splits, quotes):
+        raw, rows = open_range(path, start, end)
+        try:
+            records.extend(rows)
+        finally:
+            raw.close()
+    return headers, records
+
+
+@pytest.mark.parametrize("parts", [1, 2, 3, 5, 8, 13, 40])
+def test_ranges_reassemble_all_records(tmp_path, parts):
+    path = write_csv(tmp_path / "orders.csv", make_orders(300, seed=11))
+    expected = _records(path)
+    headers, records = _split_records(path, parts)
+    assert headers == HEADERS
+    assert records == expected[2:]  # 跳过标题行与描述行
+
+
+def test_quoted_newlines_in_every_row(tmp_path):
+    # 每条记录都含引号内换行和转义引号，任意切分点都可能落在引号内
+    rows = make_orders(120, seed=12)
+    for i, row in enumerate(rows):
+        row[4] = f'第一行\n"第二行", {i}\n\n'
+    path = write_csv(tmp_path / "orders.csv", rows)
+    expected = _records(path)
+    for parts in range(2, 30):
+        assert _split_records(path, parts)[1] == expected[2:], parts
+
+
+def test_parallel_split_matches_baseline(tmp_path, monkeypatch):
+    path = write_csv(tmp_path / "orders.csv", make_orders(2000, seed=13, styles=("slash", "iso")))
+    monkeypatch.setattr(compute_logic, "CSV_SPLIT_BYTES", 1)  # 任何 CSV 都按区间拆分
+    start, end = date(2025, 6, 2), date(2025, 7, 1)
+    sku_stats, province_stats, sku_totals = compute([path], start, end)
+    agg = aggregate_files([path], start, end, workers=3)
+    assert plain(agg.sku_stats) == plain(sku_stats)
+    assert plain(agg.province_stats) == plain(province_stats)
+    assert dict(agg.sku_totals) == dict(sku_totals)
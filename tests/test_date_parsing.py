@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Created Time 快速解析：格式嗅探、按日期前缀缓存与 Excel 序列号的结果与逐值的 _to_date 一致"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from openpyxl.utils.datetime import from_excel
+
+import date_parsing
+from compute_logic import _to_date
+from date_parsing import SNIFF_SAMPLES, DateColumnParser
+
+BASE = datetime(2025, 6, 1, 8, 30, 15)
+FORMATS = {
+    "iso": "%Y-%m-%d %H:%M:%S",
+    "slash": "%d/%m/%Y %H:%M:%S",
+    "cn": "%Y年%m月%d日 %H:%M:%S",
+}
+# 日期部分合法、时间部分越界或不是数字：原实现视为无法解析（None）
+BAD_TIMES = ["25:00:00", "23:60:00", "23:59:60", "25:99:99", "ab:cd:ef", "1a:00:00", "-1:00:00"]
+EDGE_TIMES = ["00:00:00", "23:59:59", "09:05:07"]
+
+
+def _counting(calls):
+    def fallback(val):
+        calls.append(val)
+        return _to_date(val)
+
+    return fallback
+
+
+def _sniffed(name, calls=None):
+    parser = DateColumnParser(_counting([] if calls is None else calls))
+    for i in range(SNIFF_SAMPLES):
+        parser((BASE + timedelta(hours=i)).strftime(FORMATS[name]))
+    return parser
+
+
+@pytest.mark.parametrize("name", sorted(FORMATS))
+def test_sniffs_column_format(name):
+    parser = _sniffed(name)
+    assert parser._shape is date_parsing.SHAPES[name][0]
+
+
+def test_mixed_samples_use_fallback_only():
+    calls = []
+    parser = DateColumnParser(_counting(calls))
+    values = [(BASE + timedelta(days=i)).strftime(FORMATS[("iso", "slash")[i % 2]]) for i in range(SNIFF_SAMPLES * 2)]
+    assert [parser(v) for v in values] == [_to_date(v) for v in values]
+    assert parser._shape is None
+    assert calls == values
+
+
+@pytest.mark.parametrize("name", sorted(FORMATS))
+def test_out_of_range_time_matches_to_date(name):
+    parser = _sniffed(name)
+    day = BASE.strftime(FORMATS[name])[:-9]
+    for t in BAD_TIMES + EDGE_TIMES:
+        value = f"{day} {t}"
+        assert parser(value) == _to_date(value), value
+    assert parser(f"{day} 25:99:99") is None
+    assert parser(f"{day} 23:59:59") == BASE.date()
+
+
+@pytest.mark.parametrize("name", sorted(FORMATS))
+def test_prefix_memo_parses_each_day_once(name):
+    calls = []
+    parser = _sniffed(name, calls)
+    calls.clear()
+    values = [(BASE + timedelta(minutes=7 * i)).strftime(FORMATS[name]) for i in range(2000)]
+    assert [parser(v) for v in values] == [_to_date(v) for v in values]
+    days = {v[:date_parsing.SHAPES[name][1]] for v in values}
+    assert len(parser._prefix_memo) >= len(days)
+    if name != "iso":  # ISO 前缀由 date.fromisoformat 直接解析，不经过兜底
+        assert len(calls) <= len(days)
+    else:
+        assert calls == []
+
+
+def test_unparseable_and_padded_values():
+    parser = _sniffed("iso")
+    for value in ["", "   ", "not a date", f"  {BASE:%Y-%m-%d %H:%M:%S}  ", "2025-02-30 10:00:00", "2025-06-01"]:
+        assert parser(value) == _to_date(value), value
+
+
+def test_serial_rounding_near_midnight():
+    parser = DateColumnParser(_to_date)
+    ms = 1 / 86400000
+    for day in (61, 45000, 45809, 2958464):
+        for frac in (0.0, 0.5, 1 - ms, 1 - ms / 2, 1 - ms / 2 + 1e-12, 1 - ms / 2 - 1e-12, 1 - 1e-12):
+            val = day + frac
+            assert parser(val) == from_excel(val).date(), val
+    for val in (0, 1, 59, 60, 60.5, 2958466, -3, 12):
+        assert parser(val) == _to_date(val), val
+
+
+def test_cell_types():
+    parser = DateColumnParser(_to_date)
+    assert parser(None) is None
+    assert parser(BASE) == BASE.date()
+    assert parser(date(2025, 6, 1)) == date(2025, 6, 1)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""读取引擎：各 .xlsx 引擎与 CSV 读取的统计结果与最初实现一致"""
+
+from datetime import date
+from io import BytesIO
+
+import pytest
+
+from baseline import compute, plain
+from compute_logic import aggregate_files
+from sample_orders import make_orders, write_csv, write_xlsx
+
+ENGINES = ("full", "readonly", "sheetxml")
+DATE_STYLES = {
+    "slash": ("slash",),
+    "serial": ("serial",),
+    "datetime": ("datetime",),
+    "mixed": ("iso", "slash", "cn", "serial", "datetime"),
+    # 前面格式统一、后面夹杂其它格式：快速路径嗅探后遇到失配要交给兜底解析
+    "mostly_iso": ("iso",) * 40 + ("cn", "slash"),
+}
+RANGES = [(None, None), (date(2025, 6, 5), date(2025, 6, 20)), (date(2025, 6, 10), date(2025, 6, 10))]
+
+
+def _stream_aggregate(path, engine, start, end):
+    """以 BytesIO 输入：不走列式缓存，逐行扫描"""
+    with open(path, "rb") as f:
+        data = BytesIO(f.read())
+    return aggregate_files([data], start, end, engine=engine)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("style", sorted(DATE_STYLES))
+def test_xlsx_engines_match_baseline(tmp_path, engine, style):
+    path = write_xlsx(tmp_path / "orders.xlsx", make_orders(500, seed=3, styles=DATE_STYLES[style]))
+    for start, end in RANGES:
+        sku_stats, province_stats, sku_totals = compute([path], start, end)
+        agg = _stream_aggregate(path, engine, start, end)
+        assert plain(agg.sku_stats) == plain(sku_stats)
+        assert plain(agg.province_stats) == plain(province_stats)
+        assert dict(agg.sku_totals) == dict(sku_totals)
+
+
+@pytest.mark.parametrize("style", ["slash", "mixed", "mostly_iso"])
+def test_csv_matches_baseline(tmp_path, style):
+    styles = tuple(s for s in DATE_STYLES[style] if s != "datetime")
+    path = write_csv(tmp_path / "orders.csv", make_orders(500, seed=4, styles=styles))
+    for start, end in RANGES:
+        sku_stats, province_stats, _ = compute([path], start, end)
+        agg = _stream_aggregate(path, "sheetxml", start, end)
+        assert plain(agg.sku_stats) == plain(sku_stats)
+        assert plain(agg.province_stats) == plain(province_stats)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_multiple_files_merge_like_baseline(tmp_path, workers):
+    # workers > 1 时各文件在子进程中解析，合并后与串行结果一致
+    paths = [
+        write_xlsx(tmp_path / "a.xlsx", make_orders(300, seed=5, styles=("serial",))),
+        write_csv(tmp_path / "b.csv", make_orders(300, seed=6, styles=("iso", "cn"))),
+        write_xlsx(tmp_path / "c.xlsx", make_orders(200, seed=7, styles=("datetime", "slash"))),
+    ]
+    start, end = date(2025, 6, 3), date(2025, 6, 30)
+    sku_stats, province_stats, sku_totals = compute(paths, start, end)
+    agg = aggregate_files(paths, start, end, workers=workers)
+    assert plain(agg.sku_stats) == plain(sku_stats)
+    assert plain(agg.province_stats) == plain(province_stats)
+    assert dict(agg.sku_totals) == dict(sku_totals)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""报表导出：下载由任务的统计结果边生成边输出，内容与最初的工作簿一致，可重复下载；
+结果来自结果缓存（JSON，只含非零类别）时同样能完整导出"""
+
+import csv
+import gzip
+import io
+import zipfile
+from datetime import date
+
+from openpyxl import load_workbook
+
+from baseline import compute, province_workbook, sku_workbook
+from sample_orders import make_orders, write_csv
+
+
+def _xlsx_rows(data):
+    ws = load_workbook(io.BytesIO(data), read_only=True).active
+    return [list(r) for r in ws.iter_rows(values_only=True)]
+
+
+def _baseline_rows(wb):
+    return [list(r) for r in wb.active.iter_rows(values_only=True)]
+
+
+def test_workbook_downloads_match_baseline(tmp_path, client, run_job):
+    path = write_csv(tmp_path / "orders.csv", make_orders(150, seed=17, skus=10))
+    sku_stats, province_stats, sku_totals = compute([path], date.min, date.max)
+    cases = [("/process", sku_workbook(sku_stats)), ("/process_province", province_workbook(province_stats, sku_totals))]
+    for url, expected in cases:
+        status = run_job(client, url, path)
+        assert status["status"] == "done"
+        first = client.get(f"/jobs/{status['job_id']}/export.xlsx")
+        assert first.status_code == 200
+        assert first.headers["Content-Disposition"].startswith("attachment")
+        second = client.get(f"/jobs/{status['job_id']}/export.xlsx")
+        assert _xlsx_rows(first.get_data()) == _xlsx_rows(second.get_data()) == _baseline_rows(expected)
+
+
+def test_text_exports_match_workbook(tmp_path, client, run_job):
+    path = write_csv(tmp_path / "orders.csv", make_orders(150, seed=18, skus=10))
+    status = run_job(client, "/process_province", path)
+    assert status["status"] == "done"
+    base = f"/jobs/{status['job_id']}"
+    expected = [[str(v) for v in row] for row in _xlsx_rows(client.get(f"{base}/export.xlsx").get_data())]
+    for fmt, delimiter in (("csv", ","), ("tsv", "\t")):
+        resp = client.get(f"{base}/export.{fmt}")
+        assert resp.status_code == 200
+        data = resp.get_data()
+        text = data.decode("utf-8-sig")
+        assert list(csv.reader(io.StringIO(text), delimiter=delimiter)) == expected
+        gz = client.get(f"{base}/export.{fmt}?gzip=1")
+        assert f".{fmt}.gz" in gz.headers["Content-Disposition"]
+        assert gzip.decompress(gz.get_data()) == data
+
+
+def test_bundle_holds_every_report(tmp_path, client, run_job):
+    path = write_csv(tmp_path / "orders.csv", make_orders(150, seed=21, skus=10))
+    province = run_job(client, "/process_province", path)
+    sku = run_job(client, "/process")
+    assert province["status"] == sku["status"] == "done"
+
+    resp = client.get(f"/jobs/{province['job_id']}/bundle.zip")
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.get_data())) as zf:
+        assert zf.testzip() is None
+        assert sorted(zf.namelist()) == ["province_metrics.csv", "province_metrics.xlsx", "sku_metrics.csv", "sku_metrics.xlsx"]
+        assert zf.read("province_metrics.csv") == client.get(f"/jobs/{province['job_id']}/export.csv").get_data()
+        assert zf.read("sku_metrics.csv") == client.get(f"/jobs/{sku['job_id']}/export.csv").get_data()
+        assert _xlsx_rows(zf.read("sku_metrics.xlsx")) == _xlsx_rows(client.get(f"/jobs/{sku['job_id']}/export.xlsx").get_data())
+
+    # SKU 分析没有省份结果，不能打包
+    assert client.get(f"/jobs/{sku['job_id']}/bundle.zip").status_code == 302
+
+
+def test_province_exports_from_result_cache(tmp_path, client, run_job):
+    # 行数少、SKU 多：大部分省份只有一两种状态，缓存中的统计缺少其余类别
+    path = write_csv(tmp_path / "orders.csv", make_orders(60, seed=19, skus=20))
+
+    first = run_job(client, "/process_province", path)
+    second = run_job(client, "/process_province")  # 相同文件与日期范围：命中结果缓存
+    assert first["status"] == second["status"] == "done"
+    for name in ("export.xlsx", "export.csv", "export.tsv", "bundle.zip"):
+        fresh = client.get(f"/jobs/{first['job_id']}/{name}")
+        cached = client.get(f"/jobs/{second['job_id']}/{name}")
+        assert fresh.status_code == cached.status_code == 200, name
+        if name == "export.xlsx":
+            assert _xlsx_rows(cached.get_data()) == _xlsx_rows(fresh.get_data())
+        elif name == "bundle.zip":
+            with zipfile.ZipFile(io.BytesIO(cached.get_data())) as zf:
+                assert zf.testzip() is None
+                assert zf.read("province_metrics.csv") == client.get(f"/jobs/{first['job_id']}/export.csv").get_data()
+        else:
+            assert cached.get_data() == fresh.get_data(), name
+
+
+def test_sku_exports_from_result_cache(tmp_path, client, run_job):
+    path = write_csv(tmp_path / "orders.csv", make_orders(30, seed=23, skus=15))
+
+    first = run_job(client, "/process", path)
+    second = run_job(client, "/process")
+    assert first["status"] == second["status"] == "done"
+    a = client.get(f"/jobs/{first['job_id']}/export.xlsx").get_data()
+    b = client.get(f"/jobs/{second['job_id']}/export.xlsx").get_data()
+    assert _xlsx_rows(a) == _xlsx_rows(b)
+    a = client.get(f"/jobs/{first['job_id']}/export.csv").get_data()
+    b = client.get(f"/jobs/{second['job_id']}/export.csv").get_data()
+    assert a == b
+
+
+def test_text_exports_start_with_bom(tmp_path, client, run_job):
+    # 没有 BOM 时 Excel 按本地编码打开 CSV，中文表头乱码；gzip 解压后同样应带 BOM
+    path = write_csv(tmp_path / "orders.csv", make_orders(20, seed=29))
+    job = run_job(client, "/process", path)
+    assert job["status"] == "done"
+    for name in ("export.csv", "export.tsv"):
+        data = client.get(f"/jobs/{job['job_id']}/{name}").get_data()
+        assert data.startswith(b"\xef\xbb\xbfSeller SKU")
+        gz = client.get(f"/jobs/{job['job_id']}/{name}?gzip=1").get_data()
+        assert gzip.decompress(gz) == data
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""过期清理：按类别过期时间与总磁盘预算挑选要删除的文件；持有中的分析锁不删除，只经接口查询的上传文件刷新最近使用时间"""
+
+import os
+import time
+
+import pytest
+
+import janitor
+from janitor import Artifact, plan
+from progress import CancelToken, Progress
+from sample_orders import make_orders, write_csv
+from session_store import SESSION_REGISTRY
+from single_flight import LOCK_DIR, key_lock
+
+NOW = 1_000_000_000.0
+HOUR = 3600
+
+
+def _names(doomed):
+    return [(a.path, reason) for a, reason in doomed]
+
+
+def test_expired_files_removed_by_class():
+    artifacts = [
+        Artifact("uploads", "old-upload", 10, NOW - janitor.UPLOAD_TTL - HOUR),
+        Artifact("uploads", "pinned-upload", 10, NOW - janitor.UPLOAD_TTL - HOUR, pinned=True),
+        Artifact("partial", "old.part", 10, NOW - janitor.PARTIAL_TTL - 1),
+        Artifact("columnar", "fresh.cube", 10, NOW - HOUR),
+        Artifact("sessions", "sessions.sqlite3", 10, NOW - 10 ** 8, pinned=True),
+    ]
+    assert _names(plan(artifacts, NOW, budget=10 ** 9)) == [("old-upload", "ttl"), ("old.part", "ttl")]
+
+
+def test_budget_evicts_oldest_first_and_referenced_uploads_last():
+    artifacts = [
+        Artifact("uploads", "pinned", 40, NOW - 5 * HOUR, pinned=True),
+        Artifact("columnar", "a.cube", 40, NOW - 3 * HOUR),
+        Artifact("results", "b.json", 40, NOW - 4 * HOUR),
+        Artifact("columnar", "in-use.col", 40, NOW - 60),  # MIN_AGE 内用过，不淘汰
+        Artifact("sessions", "sessions.sqlite3", 40, NOW - 10 * HOUR, pinned=True),
+    ]
+    assert _names(plan(artifacts, NOW, budget=100)) == [("b.json", "budget"), ("a.cube", "budget"), ("pinned", "budget")]
+    assert _names(plan(artifacts, NOW, budget=150)) == [("b.json", "budget"), ("a.cube", "budget")]
+
+
+def _locks():
+    return {os.path.basename(a.path) for a in janitor.scan(referenced=set()) if a.path.startswith(LOCK_DIR)}
+
+
+@pytest.mark.skipif(janitor.fcntl is None, reason="需要 fcntl 文件锁")
+def test_held_lock_is_not_collected():
+    old = time.time() - janitor.PARTIAL_TTL - 60
+    with key_lock("held", CancelToken(), Progress()):
+        held = os.path.join(LOCK_DIR, "held.lock")
+        idle = os.path.join(LOCK_DIR, "idle.lock")
+        open(idle, "w").close()
+        os.utime(held, (old, old))  # 计算持续时间超过 PARTIAL_TTL
+        os.utime(idle, (old, old))
+        assert _locks() >= {"idle.lock"}
+        assert "held.lock" not in _locks()
+        doomed = {a.path for a, _ in janitor.plan(janitor.scan(referenced=set()), time.time())}
+        assert idle in doomed and held not in doomed
+    assert "held.lock" in _locks()  # 释放后按最近使用时间照常清理
+
+
+
+@pytest.mark.skipif(janitor.fcntl is None, reason="需要 fcntl 文件锁")
+def test_lock_removed_only_while_unheld():
+    with key_lock("busy", CancelToken(), Progress()):
+        busy = os.path.join(LOCK_DIR, "busy.lock")
+        assert not janitor._remove(busy)
+        assert os.path.exists(busy)
+    assert janitor._remove(busy)
+    assert not os.path.exists(busy)
+
+
+@pytest.mark.skipif(janitor.fcntl is None, reason="需要 fcntl 文件锁")
+def test_key_lock_reopens_file_unlinked_before_flock(monkeypatch):
+    # 模拟 janitor 在 key_lock 打开锁文件之后、加锁之前删除了它
+    import single_flight
+
+    path = os.path.join(LOCK_DIR, "raced.lock")
+    real = janitor.fcntl
+    calls = []
+
+    class RacingFcntl:
+        LOCK_EX, LOCK_NB = real.LOCK_EX, real.LOCK_NB
+
+        @staticmethod
+        def flock(fd, op):
+            if not calls:
+                assert janitor._remove(path)
+            calls.append(fd)
+            real.flock(fd, op)
+
+    monkeypatch.setattr(single_flight, "fcntl", RacingFcntl)
+    with key_lock("raced", CancelToken(), Progress()):
+        assert len(calls) == 2
+        assert os.path.exists(path)
+        assert not janitor._remove(path)  # 锁住的是目录中现有的文件
+
+def test_api_query_refreshes_upload(tmp_path, client, run_job):
+    path = write_csv(tmp_path / "orders.csv", make_orders(50, seed=31))
+    assert run_job(client, "/process", path)["status"] == "done"
+    with client.session_transaction() as sess:
+        item = SESSION_REGISTRY.files(sess["sid"])[0]
+    old = time.time() - janitor.UPLOAD_TTL - 60
+    os.utime(item["path"], (old, old))
+    resp = client.post("/api/metrics/sku", json={"files": [item["sha256"]]})
+    assert resp.status_code == 200
+    assert time.time() - os.stat(item["path"]).st_mtime < 60
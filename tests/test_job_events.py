@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""任务进度推送（SSE）：无新进度时按心跳间隔重发、任务结束后发出终态并关闭、断开后宽限期内无人查看才取消任务"""
+
+import json
+import threading
+import time
+
+import pytest
+
+import app as app_module
+import jobs
+from jobs import CANCELLED, DONE, JOB_QUEUE
+
+
+def _events(resp):
+    """逐条产出 SSE 消息（JSON）"""
+    for chunk in resp.response:
+        text = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        assert text.startswith("data: ") and text.endswith("\n\n")
+        yield json.loads(text[len("data: "):])
+
+
+def _wait(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def blocked_job():
+    """运行中、直到 release 被设置（或被取消）才结束的任务"""
+    release = threading.Event()
+
+    def work(job):
+        while not release.wait(0.01):
+            job.token.check()
+        return {"stats": {}}
+
+    job = JOB_QUEUE.submit("sku", work)
+    _wait(lambda: job.status == jobs.RUNNING)
+    yield job, release
+    release.set()
+
+
+def test_heartbeat_then_terminal_event(monkeypatch, client, blocked_job):
+    job, release = blocked_job
+    monkeypatch.setattr(app_module, "SSE_HEARTBEAT", 0.05)
+    resp = client.get(f"/jobs/{job.id}/events")
+    assert resp.mimetype == "text/event-stream"
+    events = _events(resp)
+    first, second = next(events), next(events)
+    # 没有新进度：按心跳间隔重发同一版本的状态
+    assert first["status"] == second["status"] == "running"
+    assert first["progress"]["version"] == second["progress"]["version"]
+    release.set()
+    rest = list(events)  # 任务结束后流随即关闭
+    assert rest[-1]["status"] == DONE
+    assert all(e["status"] == "running" for e in rest[:-1])
+    resp.close()
+
+
+def test_disconnect_cancels_after_grace(monkeypatch, client, blocked_job):
+    job, _ = blocked_job
+    monkeypatch.setattr(jobs, "DISCONNECT_GRACE", 0.2)
+    resp = client.get(f"/jobs/{job.id}/events")
+    next(_events(resp))
+    assert job.watchers == 1
+    resp.close()  # 浏览器关闭页面
+    assert job.watchers == 0
+    _wait(lambda: job.status == CANCELLED)
+    assert job.result is None
+
+
+def test_reconnect_within_grace_keeps_job(monkeypatch, client, blocked_job):
+    job, release = blocked_job
+    monkeypatch.setattr(jobs, "DISCONNECT_GRACE", 0.2)
+    monkeypatch.setattr(app_module, "SSE_HEARTBEAT", 0.05)
+    first = client.get(f"/jobs/{job.id}/events")
+    next(_events(first))
+    first.close()
+    second = client.get(f"/jobs/{job.id}/events")  # 刷新页面后重新订阅
+    events = _events(second)
+    next(events)
+    time.sleep(0.5)
+    assert job.pending and job.status != CANCELLED
+    release.set()
+    assert list(events)[-1]["status"] == DONE
+    second.close()
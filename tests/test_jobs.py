@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""后台分析任务：提交后立即返回任务 id，状态接口报告完成、错误或取消；取消与过期的任务释放结果"""
+
+import threading
+import time
+
+from jobs import CANCELLED, DONE, JobQueue
+from sample_orders import HEADERS, make_orders, write_csv
+
+
+def _wait(job, timeout=5):
+    deadline = time.time() + timeout
+    while job.pending:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_analysis_runs_as_job(tmp_path, client, run_job):
+    rows = make_orders(120, seed=71)
+    path = write_csv(tmp_path / "orders.csv", rows)
+    status = run_job(client, "/process", path)
+    assert status["status"] == "done", status
+    page = client.get(status["result_url"])
+    assert page.status_code == 200
+    assert rows[0][3] in page.get_data(as_text=True)
+
+    # 不再上传：使用会话中已保存的文件
+    status = run_job(client, "/process_province", data={"start_date": "2025-06-01", "end_date": "2025-06-30"})
+    assert status["status"] == "done", status
+
+
+def test_job_error_is_reported(tmp_path, client, run_job):
+    rows = [row[:3] for row in make_orders(10, seed=72)]
+    path = tmp_path / "broken.csv"
+    path.write_text(",".join(HEADERS[:3]) + "\n\n" + "\n".join(",".join(r) for r in rows) + "\n", encoding="utf-8")
+    status = run_job(client, "/process", str(path))
+    assert status["status"] == "error"
+    assert "列" in status["error"]
+
+
+def test_invalid_input_rejected_before_queueing(client):
+    resp = client.post("/process", headers={"Accept": "application/json"}, data={"start_date": "2025-13-01"})
+    assert resp.status_code == 400
+    assert client.get("/jobs/unknown/status").status_code == 404
+
+
+def test_cancel_running_and_queued_jobs():
+    queue = JobQueue(max_workers=1)
+    started = threading.Event()
+    ran = []
+
+    def slow(job):
+        started.set()
+        while True:
+            job.token.check()  # 与解析循环一样在批次之间检查取消标记
+            time.sleep(0.01)
+
+    running = queue.submit("sku", slow)
+    queued = queue.submit("sku", lambda job: ran.append(job))
+    assert started.wait(5)
+    queue.cancel(queued)
+    queue.cancel(running)
+    _wait(running)
+    _wait(queued)
+    assert running.status == queued.status == CANCELLED
+    assert ran == []  # 排队中取消的任务不会开始
+
+
+def test_expired_job_releases_result():
+    queue = JobQueue(max_workers=1, ttl=0)
+    job = queue.submit("sku", lambda job: {"stats": {"A": {"total": 1}}})
+    _wait(job)
+    assert job.status == DONE and job.result is not None
+    time.sleep(0.01)
+    assert len(queue) == 0  # 过期清理
+    assert job.result is None
+    assert queue.get(job.id) is None
+
+
+def test_cancelled_job_releases_result():
+    queue = JobQueue(max_workers=1)
+    started = threading.Event()
+
+    def fn(job):
+        # 任务函数已经算出结果，返回前被取消
+        started.set()
+        while not job.token.cancelled:
+            time.sleep(0.01)
+        return {"stats": {"A": {"total": 1}}}
+
+    job = queue.submit("sku", fn)
+    started.wait(5)
+    queue.cancel(job)
+    _wait(job)
+    assert job.status == CANCELLED
+    assert job.result is None
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""订单状态分类：规则表与最初的 if/elif 分类一致，查找表只计算一次，规则指纹稳定"""
+
+import itertools
+from collections import defaultdict
+from datetime import datetime
+
+from baseline import _classify
+from order_status import CATEGORY_KEYS, DEFAULT_CLASSIFIER, OTHER, STATUS_RULES, StatusClassifier, is_blank
+
+SUBSTATUS = [
+    "已完成", "已送达", "运输中", "已取消", "待发货",
+    "Completed", " completed ", "DELIVERED", "In transit", "in  transit",
+    "Canceled", "cancelled", "Cancel", "Return/Refund", "partial refund", "RETURNED", "Unpaid",
+    "", "   ", None,
+]
+CANCEL_TYPE = ["", "  ", None, "Cancel", "canceled", " CANCELLED ", "Return", "refund", "other"]
+SHIPPED = [None, "", "   ", "06/01/2025 10:00:00", datetime(2025, 6, 1, 10), 45809.5]
+
+# 规则指纹是立方体（.cube）与结果缓存键的一部分，变化会使磁盘上的缓存全部失效；
+# 有意修改 STATUS_RULES 或 CATEGORY_KEYS 时同步更新此值
+FINGERPRINT = "54e60c2576abccf581e4008a3a0144c9ef862ce8"
+
+
+def _baseline_category(sub, cancel, shipped):
+    counts = defaultdict(int)
+    _classify(counts, sub, cancel, shipped)
+    assert sum(counts.values()) <= 1
+    return next(iter(counts), None)
+
+
+def test_every_combination_matches_baseline():
+    classifier = StatusClassifier()
+    for sub, cancel, shipped in itertools.product(SUBSTATUS, CANCEL_TYPE, SHIPPED):
+        expected = _baseline_category(sub, cancel, shipped)
+        assert classifier.category(sub, cancel, is_blank(shipped)) == expected, (sub, cancel, shipped)
+
+
+def test_lookup_table_computed_once_per_combination():
+    classifier = StatusClassifier()
+    calls = []
+    compute = classifier._compute
+    classifier._compute = lambda *key: calls.append(key) or compute(*key)
+    for _ in range(3):
+        for sub, cancel in itertools.product(SUBSTATUS, CANCEL_TYPE):
+            for shipped_empty in (True, False):
+                classifier.classify(sub, cancel, shipped_empty)
+    combinations = len(SUBSTATUS) * len(CANCEL_TYPE) * 2
+    assert len(calls) == len(classifier.table) == combinations
+    assert classifier.classify("Canceled", "", True) == CATEGORY_KEYS.index("cancel_before")
+    assert classifier.classify("Canceled", "", False) == CATEGORY_KEYS.index("cancel_after")
+    assert classifier.classify("待发货", "", True) == OTHER
+
+
+def test_fingerprint_is_stable():
+    assert DEFAULT_CLASSIFIER.fingerprint == FINGERPRINT
+    assert StatusClassifier().fingerprint == FINGERPRINT
+    assert StatusClassifier([dict(rule) for rule in STATUS_RULES]).fingerprint == FINGERPRINT
+
+
+def test_fingerprint_follows_rules():
+    reordered = [STATUS_RULES[1], STATUS_RULES[0]] + STATUS_RULES[2:]
+    extended = STATUS_RULES + [{"category": "in_transit", "substatus": ["待揽收"]}]
+    assert StatusClassifier(reordered).fingerprint != FINGERPRINT
+    assert StatusClassifier(extended).fingerprint != FINGERPRINT
+    assert StatusClassifier(extended).category("待揽收", "", False) == "in_transit"
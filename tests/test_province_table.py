@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""省份结果表接口：服务端分页、排序与 SKU 过滤（/jobs/<id>/province_rows、/jobs/<id>/sku_provinces）"""
+
+import pytest
+
+from compute_logic import aggregate_files
+from province_table import province_row
+from sample_orders import make_orders, write_csv
+
+
+@pytest.fixture(scope="module")
+def orders(tmp_path_factory):
+    """样例文件与按默认顺序（SKU 升序、SKU 内订单数降序）排列的期望行"""
+    path = write_csv(tmp_path_factory.mktemp("province") / "orders.csv", make_orders(600, seed=81, skus=15))
+    agg = aggregate_files([path], None, None, workers=1)
+    default = [
+        province_row(sku, prov, m, agg.sku_totals[sku])
+        for sku, prov_map in sorted(agg.province_stats.items())
+        for prov, m in sorted(prov_map.items(), key=lambda x: (-x[1]["total"], x[0]))
+    ]
+    return path, agg.sku_totals, default
+
+
+@pytest.fixture
+def job_id(orders, client, run_job):
+    status = run_job(client, "/process_province", orders[0])
+    assert status["status"] == "done", status
+    return status["job_id"]
+
+
+def _page(client, job_id, **params):
+    resp = client.get(f"/jobs/{job_id}/province_rows", query_string=params)
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json()
+
+
+def test_pages_concatenate_to_default_order(client, orders, job_id):
+    default = orders[2]
+    rows, offset = [], 0
+    while True:
+        body = _page(client, job_id, offset=offset, limit=7)
+        assert body["total"] == len(default) and body["offset"] == offset
+        if not body["rows"]:
+            break
+        assert len(body["rows"]) <= 7
+        rows += body["rows"]
+        offset += 7
+    assert rows == default
+
+
+@pytest.mark.parametrize("sort, order", [("total", "desc"), ("province", "asc"), ("share_rate", "desc"), ("sign_rate", "asc")])
+def test_sorted_pages(client, orders, job_id, sort, order):
+    default = orders[2]
+    expected = sorted(default, key=lambda r: r[sort], reverse=order == "desc")
+    first = _page(client, job_id, sort=sort, order=order, limit=20)
+    second = _page(client, job_id, sort=sort, order=order, offset=20, limit=20)
+    got = first["rows"] + second["rows"]
+    assert first["total"] == len(default)
+    # 比率列按未舍入的值排序，舍入后并列的行顺序可能不同，只比较值
+    assert [r[sort] for r in got] == [r[sort] for r in expected[:40]]
+    if sort in ("total", "province"):
+        assert got == expected[:40]  # 相同值保持默认顺序
+
+
+def test_sku_filter(client, orders, job_id):
+    _, sku_totals, default = orders
+    sku = max(sku_totals, key=lambda s: (sku_totals[s], s))
+    expected = [r for r in default if r["seller_sku"] == sku]
+
+    body = _page(client, job_id, sku=sku, limit=2)
+    assert body["total"] == len(expected) and body["rows"] == expected[:2]
+    body = _page(client, job_id, sku=sku, sort="total", order="asc")
+    assert [r["total"] for r in body["rows"]] == sorted(r["total"] for r in expected)
+    assert _page(client, job_id, sku="NO-SUCH-SKU") == {"total": 0, "offset": 0, "rows": []}
+
+    resp = client.get(f"/jobs/{job_id}/sku_provinces", query_string={"sku": sku})
+    assert resp.status_code == 200
+    assert resp.get_json() == {"sku": sku, "total": sku_totals[sku], "rows": expected}
+    assert client.get(f"/jobs/{job_id}/sku_provinces", query_string={"sku": "NO-SUCH-SKU"}).status_code == 404
+
+
+def test_bad_requests(client, job_id):
+    assert client.get(f"/jobs/{job_id}/province_rows", query_string={"sort": "nope"}).status_code == 400
+    assert client.get(f"/jobs/{job_id}/province_rows", query_string={"limit": "x"}).status_code == 400
+    assert client.get("/jobs/unknown/province_rows").status_code == 404
+    assert client.get("/jobs/unknown/sku_provinces", query_string={"sku": "a"}).status_code == 404
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""结果缓存：按字节预算的 LRU 淘汰、重启后按上次使用时间恢复顺序、旧版 .xlsx 缓存的清理"""
+
+import os
+
+from result_cache import ResultCache
+
+
+def _stats(n: int):
+    """约 n 字节的统计结果"""
+    return {"SKU": {"total": 1, "pad": "x" * n}}
+
+
+def _size(tmp_path):
+    probe = ResultCache(str(tmp_path / "probe"))
+    probe.put("k", _stats(1000))
+    return probe.usage()[1]
+
+
+def test_lru_eviction_within_byte_budget(tmp_path):
+    size = _size(tmp_path)
+    cache = ResultCache(str(tmp_path / "results"), budget_bytes=int(size * 2.5))
+    cache.put("a", _stats(1000))
+    cache.put("b", _stats(1000))
+    assert cache.get("a") == _stats(1000)  # a 变为最近使用
+    cache.put("c", _stats(1000))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.usage() == (2, 2 * size)
+    assert sorted(os.listdir(cache.directory)) == ["a.json", "c.json"]
+
+
+def test_single_entry_larger_than_budget_is_kept(tmp_path):
+    cache = ResultCache(str(tmp_path / "results"), budget_bytes=10)
+    cache.put("big", _stats(1000))
+    assert cache.get("big") is not None
+    cache.put("next", _stats(1000))
+    assert cache.get("big") is None and cache.get("next") is not None
+
+
+def test_index_survives_restart(tmp_path):
+    size = _size(tmp_path)
+    directory = str(tmp_path / "results")
+    cache = ResultCache(directory)
+    for i, key in enumerate(["old", "mid", "new"]):
+        cache.put(key, _stats(1000))
+        os.utime(os.path.join(directory, f"{key}.json"), (1000 + i, 1000 + i))
+
+    restarted = ResultCache(directory, budget_bytes=int(size * 3.5))
+    assert restarted.usage() == (3, 3 * size)
+    assert restarted.get("mid") == _stats(1000)
+    restarted.put("newest", _stats(1000))  # 超出预算：淘汰上次使用最早的 old
+    assert restarted.get("old") is None
+    assert all(restarted.get(k) is not None for k in ("mid", "new", "newest"))
+
+
+def test_entry_written_by_other_process_is_found(tmp_path):
+    directory = str(tmp_path / "results")
+    mine, other = ResultCache(directory), ResultCache(directory)
+    assert mine.get("shared") is None
+    other.put("shared", _stats(10))
+    assert mine.get("shared") == _stats(10)
+    assert mine.usage()[0] == 1
+
+
+def test_legacy_xlsx_and_corrupt_entries_removed(tmp_path):
+    directory = tmp_path / "results"
+    directory.mkdir()
+    (directory / "0123abcd.xlsx").write_bytes(b"PK\x03\x04 old workbook")
+    (directory / "broken.json").write_text("{not json", encoding="utf-8")
+    (directory / "notes.txt").write_text("keep", encoding="utf-8")
+    cache = ResultCache(str(directory))
+    assert cache.usage()[0] == 1
+    assert not (directory / "0123abcd.xlsx").exists()
+    assert cache.get("broken") is None
+    assert sorted(os.listdir(directory)) == ["notes.txt"]
+    assert cache.usage() == (0, 0)
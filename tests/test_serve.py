@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""多进程部署：任务请求按 id 中的进程前缀转交给所在的工作进程；停止前进行中的任务照常完成"""
+
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+import pytest
+from werkzeug.test import Client
+
+from jobs import CANCELLED, DONE, JobQueue
+from serve import FORWARDED_HEADER, JobRouter, _make_server, _RequestPool, _serve_in_thread
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix socket")
+
+
+def _echo(name):
+    """记录收到的请求并分块返回的 WSGI 应用"""
+
+    def app(environ, start_response):
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        info = {
+            "served_by": name,
+            "method": environ["REQUEST_METHOD"],
+            "path": environ["PATH_INFO"],
+            "query": environ.get("QUERY_STRING", ""),
+            "body": environ["wsgi.input"].read(length).decode("utf-8") if length else "",
+            "forwarded": environ.get("HTTP_" + FORWARDED_HEADER.upper().replace("-", "_")),
+        }
+        start_response("200 OK", [("Content-Type", "application/json"), ("X-Served-By", name)])
+        raw = json.dumps(info).encode("utf-8")
+        return [raw[:10], raw[10:]]
+
+    return app
+
+
+@pytest.fixture
+def remote_worker():
+    """在 Unix socket 上运行的“另一个工作进程”，返回 (运行目录, 其进程前缀)"""
+    run_dir = tempfile.mkdtemp(prefix="oa_serve_", dir="/tmp")  # socket 路径长度有限，不用 tmp_path
+    server = _make_server(f"unix://{run_dir}/222.sock", 0, _echo("remote"), _RequestPool(4))
+    _serve_in_thread(server)
+    yield run_dir, "222"
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _get(client, path, **kwargs):
+    resp = client.open(path, **kwargs)
+    return resp.headers.get("X-Served-By"), json.loads(resp.get_data())
+
+
+def test_router_forwards_other_workers_jobs(remote_worker):
+    run_dir, remote = remote_worker
+    client = Client(JobRouter(_echo("local"), "111", run_dir))
+    job_id = f"{remote}-{uuid.uuid4().hex}"
+
+    served_by, info = _get(client, f"/jobs/{job_id}/province_rows", query_string={"sku": "A 1", "limit": "5"})
+    assert served_by == "remote"
+    assert info["path"] == f"/jobs/{job_id}/province_rows"
+    assert info["query"] == "sku=A+1&limit=5"
+    assert info["forwarded"] == "111"
+
+    served_by, info = _get(client, f"/jobs/{job_id}/cancel", method="POST", data="x=1",
+                           content_type="application/x-www-form-urlencoded")
+    assert (served_by, info["method"], info["body"]) == ("remote", "POST", "x=1")
+
+
+def test_router_keeps_own_and_unroutable_requests_local(remote_worker):
+    run_dir, remote = remote_worker
+    client = Client(JobRouter(_echo("local"), "111", run_dir))
+    for path in (
+        f"/jobs/111-{uuid.uuid4().hex}/status",  # 本进程的任务
+        f"/jobs/333-{uuid.uuid4().hex}/status",  # 所在进程已退出（没有 socket）
+        f"/jobs/{remote}-not-a-job-id/status",
+        "/api/metrics/sku",
+    ):
+        assert _get(client, path)[0] == "local", path
+    # 已转交过的请求不再转发，避免在进程间来回
+    headers = {FORWARDED_HEADER: "222"}
+    assert _get(client, f"/jobs/{remote}-{uuid.uuid4().hex}/status", headers=headers)[0] == "local"
+
+
+def test_drain_lets_running_jobs_finish():
+    queue = JobQueue(max_workers=2)
+    release = threading.Event()
+
+    def work(job):
+        release.wait(5)
+        job.progress.set_stage("汇总")
+        return {"stats": {}}
+
+    jobs = [queue.submit("sku", work) for _ in range(3)]  # 第三个先排队
+    threading.Timer(0.3, release.set).start()
+    t0 = time.time()
+    assert queue.drain(timeout=10)
+    assert time.time() - t0 >= 0.25
+    assert [j.status for j in jobs] == [DONE] * 3
+    assert all(j.result == {"stats": {}} for j in jobs)
+
+
+def test_drain_cancels_jobs_past_timeout():
+    queue = JobQueue(max_workers=1)
+
+    def endless(job):
+        while True:
+            job.token.check()
+            time.sleep(0.01)
+
+    running = queue.submit("sku", endless)
+    queued = queue.submit("sku", endless)
+    assert not queue.drain(timeout=0.3)
+    assert running.status == queued.status == CANCELLED
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""会话登记：创建与查询、过期清理、文件去重与同名替换，以及旧版 cookie 的迁移"""
+
+import hashlib
+from io import BytesIO
+
+from session_store import SESSION_REGISTRY, SessionRegistry
+from upload_store import save_stream
+
+
+def _registry(tmp_path, **kwargs):
+    return SessionRegistry(str(tmp_path / "sessions.sqlite3"), **kwargs)
+
+
+def _stored(content: bytes, name: str):
+    digest, _ = save_stream(BytesIO(content), name)
+    return name, digest, len(content)
+
+
+def test_create_and_lookup(tmp_path):
+    reg = _registry(tmp_path)
+    sid = reg.new_session()
+    assert reg.files(sid) == [] and reg.files(None) == []
+    a, b = _stored(b"a,b\n1,2\n", "a.csv"), _stored(b"c,d\n3,4\n", "b.csv")
+    reg.add_files(sid, [a, b])
+    files = reg.files(sid)
+    assert [(f["name"], f["sha256"], f["size"]) for f in files] == [a, b]
+    assert all(f["path"] is not None for f in files)
+    assert reg.referenced_digests() == {a[1], b[1]}
+    # 其它会话看不到
+    assert reg.files(reg.new_session()) == []
+
+
+def test_expired_sessions_purged_on_new_session(tmp_path):
+    reg = _registry(tmp_path, ttl=3600)
+    old, fresh = reg.new_session(), reg.new_session()
+    reg.add_files(old, [_stored(b"old\n", "old.csv")])
+    reg.add_files(fresh, [_stored(b"fresh\n", "fresh.csv")])
+    reg._conn().execute("UPDATE sessions SET last_seen = 0 WHERE id = ?", (old,))
+    reg.new_session()
+    assert reg.files(old) == []
+    assert [f["name"] for f in reg.files(fresh)] == ["fresh.csv"]
+    assert reg.referenced_digests() == {hashlib.sha256(b"fresh\n").hexdigest()}
+
+
+def test_add_files_dedup_and_replace(tmp_path):
+    reg = _registry(tmp_path)
+    sid = reg.new_session()
+    a, b = _stored(b"first\n", "a.csv"), _stored(b"second\n", "b.csv")
+    reg.add_files(sid, [a, b])
+    # 相同内容换个名字再上传：仍只保留原条目
+    reg.add_files(sid, [("copy.csv", a[1], a[2])])
+    assert [f["name"] for f in reg.files(sid)] == ["a.csv", "b.csv"]
+    # 同名但内容不同：替换旧条目并保持原位置
+    a2 = _stored(b"first, revised\n", "a.csv")
+    reg.add_files(sid, [a2])
+    assert [(f["name"], f["sha256"]) for f in reg.files(sid)] == [("a.csv", a2[1]), ("b.csv", b[1])]
+    reg.remove_files(sid, [b[1]])
+    assert [f["sha256"] for f in reg.files(sid)] == [a2[1]]
+    reg.clear(sid)
+    assert reg.files(sid) == []
+
+
+def test_legacy_cookie_paths_migrated(tmp_path, client):
+    legacy = tmp_path / "legacy.csv"
+    legacy.write_bytes(b"Seller SKU\nX\n")
+    with client.session_transaction() as sess:
+        sess["uploaded_files"] = [
+            {"name": "legacy.csv", "path": str(legacy)},
+            {"name": "gone.csv", "path": str(tmp_path / "gone.csv")},
+        ]
+    client.get("/")
+    with client.session_transaction() as sess:
+        assert "uploaded_files" not in sess
+        files = SESSION_REGISTRY.files(sess["sid"])
+    assert [(f["name"], f["sha256"]) for f in files] == [
+        ("legacy.csv", hashlib.sha256(b"Seller SKU\nX\n").hexdigest())
+    ]
+    assert files[0]["path"] is not None
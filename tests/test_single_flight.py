@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""相同分析的并发合并：只计算一次、各任务镜像进度、全部取消后才取消计算、异常按任务各自抛出"""
+
+import threading
+import time
+
+import pytest
+
+from jobs import JobError
+from progress import CancelToken, Cancelled, Progress
+from single_flight import SingleFlight
+
+
+class _Waiter(threading.Thread):
+    """在线程中调用 flights.run，记录结果或异常"""
+
+    def __init__(self, flights, key, fn):
+        super().__init__(daemon=True)
+        self.flights, self.key, self.fn = flights, key, fn
+        self.progress = Progress()
+        self.cancel = CancelToken()
+        self.result = self.error = None
+
+    def run(self):
+        try:
+            self.result = self.flights.run(self.key, self.fn, self.progress, self.cancel)
+        except BaseException as e:
+            self.error = e
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def _start(flights, key, fn, n):
+    waiters = [_Waiter(flights, key, fn) for _ in range(n)]
+    for w in waiters:
+        w.start()
+    return waiters
+
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn(progress, cancel):
+        calls.append(1)
+        release.wait(5)
+        return {"answer": 42}
+
+    waiters = _start(flights, "shared", fn, 3)
+    for w in waiters:
+        _wait_for(lambda: w.progress.stage == "处理中")
+    assert flights.in_flight() == 1
+    release.set()
+    for w in waiters:
+        w.join(5)
+    assert len(calls) == 1
+    assert [w.result for w in waiters] == [{"answer": 42}] * 3
+    assert flights.in_flight() == 0
+
+
+def test_progress_mirrored_to_each_waiter():
+    flights = SingleFlight()
+    reported, release = threading.Event(), threading.Event()
+
+    def fn(progress, cancel):
+        progress.add_file(0, "orders.csv", 1000)
+        progress.update(0, 0, 120, 500)
+        reported.set()
+        release.wait(5)
+        return None
+
+    waiters = _start(flights, "progress", fn, 2)
+    reported.wait(5)
+    for w in waiters:
+        _wait_for(lambda: w.progress.snapshot()["rows"] == 120)
+        snap = w.progress.snapshot()
+        assert (snap["current_file"], snap["bytes"], snap["total_bytes"]) == ("orders.csv", 500, 1000)
+    release.set()
+    for w in waiters:
+        w.join(5)
+        assert w.error is None
+
+
+def test_computation_cancelled_only_when_last_waiter_leaves():
+    flights = SingleFlight()
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    def fn(progress, cancel):
+        started.set()
+        while True:
+            try:
+                cancel.check()
+            except Cancelled:
+                cancelled.set()
+                raise
+            time.sleep(0.01)
+
+    first, second = _start(flights, "cancel", fn, 2)
+    started.wait(5)
+    for w in (first, second):
+        _wait_for(lambda: w.progress.stage == "处理中")  # 已挂到计算上
+    first.cancel.cancel()
+    first.join(5)
+    assert isinstance(first.error, Cancelled)
+    time.sleep(0.3)
+    assert not cancelled.is_set() and flights.in_flight() == 1  # 仍有任务在等待，计算继续
+    second.cancel.cancel()
+    second.join(5)
+    assert isinstance(second.error, Cancelled)
+    assert cancelled.wait(5)
+    assert flights.in_flight() == 0
+
+
+def test_error_raised_as_separate_copy_per_waiter():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fn(progress, cancel):
+        release.wait(5)
+        raise JobError("在所选日期范围内未找到符合条件的数据")
+
+    waiters = _start(flights, "error", fn, 2)
+    for w in waiters:
+        _wait_for(lambda: w.progress.stage == "处理中")
+    release.set()
+    for w in waiters:
+        w.join(5)
+    errors = [w.error for w in waiters]
+    assert all(type(e) is JobError and str(e) == "在所选日期范围内未找到符合条件的数据" for e in errors)
+    assert errors[0] is not errors[1]
+    assert errors[0].__cause__ is errors[1].__cause__
+    with pytest.raises(JobError):
+        raise errors[0]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""按内容摘要存储上传文件：相同内容只保存一份，缓存键与文件名无关"""
+
+import hashlib
+import os
+from io import BytesIO
+
+from columnar_cache import CACHE_DIR, cache_path
+from compute_logic import aggregate_files
+from sample_orders import make_orders, write_csv
+from upload_store import UPLOAD_DIR, file_digest, save_stream, stored_path
+
+
+def test_same_content_stored_once(tmp_path):
+    path = write_csv(tmp_path / "orders.csv", make_orders(50, seed=61))
+    with open(path, "rb") as f:
+        data = f.read()
+    digest, stored = save_stream(BytesIO(data), "orders.csv")
+    again, stored_again = save_stream(BytesIO(data), "renamed.csv")
+    assert digest == again == hashlib.sha256(data).hexdigest()
+    assert stored_again == stored == stored_path(digest)
+    assert os.listdir(os.path.join(UPLOAD_DIR, digest)) == ["orders.csv"]
+    assert not [n for n in os.listdir(UPLOAD_DIR) if n.endswith(".part")]
+    assert file_digest(stored) == file_digest(path) == digest
+
+
+def test_cache_shared_between_copies(tmp_path):
+    # 同一内容的另一份副本（不同路径、不同修改时间）直接复用已有缓存
+    path = write_csv(tmp_path / "a.csv", make_orders(80, seed=62))
+    expected = aggregate_files([path], None, None, workers=1).sku_totals
+    assert os.path.exists(cache_path(file_digest(path), "cube"))
+    before = sorted(os.listdir(CACHE_DIR))
+
+    copy = tmp_path / "b.csv"
+    copy.write_bytes(open(path, "rb").read())
+    assert aggregate_files([str(copy)], None, None, workers=1).sku_totals == expected
+    assert sorted(os.listdir(CACHE_DIR)) == before
+    assert stored_path("0" * 64) is None
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""结果工作簿：只写模式与流式写出的内容（表名、维度、列宽、单元格值）与最初的普通模式工作簿一致"""
+
+import zipfile
+from datetime import date
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+
+from baseline import compute, province_workbook, sku_workbook
+from compute_logic import aggregate_files, build_sku_workbook, sku_report
+from compute_province_metrics import build_result_workbook, province_report
+from sample_orders import make_orders, write_csv
+from xlsx_writer import stream_workbook
+
+@pytest.fixture(scope="module")
+def results(tmp_path_factory):
+    path = write_csv(tmp_path_factory.mktemp("wb") / "orders.csv", make_orders(800, seed=51, skus=40))
+    start, end = date(2025, 6, 3), date(2025, 7, 2)
+    baseline = compute([path], start, end)
+    agg = aggregate_files([path], start, end, workers=1)
+    return baseline, agg
+
+
+def _save(wb) -> bytes:
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _content(data: bytes):
+    """表名、维度、列宽与全部单元格值"""
+    ws = load_workbook(BytesIO(data)).active
+    widths = {k: d.width for k, d in ws.column_dimensions.items()}
+    return ws.title, ws.dimensions, widths, [list(r) for r in ws.iter_rows(values_only=True)]
+
+
+def test_sku_workbook_matches_baseline(results):
+    (sku_stats, _, _), agg = results
+    expected = _save(sku_workbook(sku_stats))
+    actual = _save(build_sku_workbook(agg.sku_stats))
+    assert _content(actual) == _content(expected)
+
+
+def test_province_workbook_matches_baseline(results):
+    (_, province_stats, sku_totals), agg = results
+    expected = _save(province_workbook(province_stats, sku_totals))
+    actual = _save(build_result_workbook(agg.province_stats, agg.sku_totals))
+    assert _content(actual) == _content(expected)
+
+
+def test_streamed_workbooks_match_baseline_content(results):
+    (sku_stats, province_stats, sku_totals), agg = results
+    cases = [
+        (sku_workbook(sku_stats), sku_report(agg.sku_stats)),
+        (province_workbook(province_stats, sku_totals), province_report(agg.province_stats, agg.sku_totals)),
+    ]
+    for baseline_wb, (title, headers, row_count, rows) in cases:
+        streamed = b"".join(stream_workbook(title, headers, row_count, rows))
+        assert _content(streamed) == _content(_save(baseline_wb))
+        with zipfile.ZipFile(BytesIO(streamed)) as zf:
+            assert zf.testzip() is None
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+upload_store.py
+--------------------------------------------------
+按内容寻址的上传文件存储。
+
+上传文件边写入磁盘边计算 SHA-256，写完后移动到以摘要命名的目录下
+（UPLOAD_DIR/<摘要>/<原文件名>，文件名仅用于显示与报错）：
+- 相同内容只保存一份，不同会话、不同用户上传同一份导出共用同一个文件；
+- 列式缓存、立方体与聚合结果都以摘要为键，任何引用相同内容的会话都能直接复用；
+- 同名但内容不同的文件得到不同的摘要，不会被误判为重复。
+
+存储目录由环境变量 ORDER_ANALYSIS_UPLOAD_DIR 指定，默认在系统临时目录下。
+存储中的文件可能被多个会话引用，清除会话文件时不删除，由过期清理统一回收（见 janitor.py）。
+"""
+
+import hashlib
+import os
+import re
+import uuid
+from tempfile import gettempdir
+from typing import Dict, Optional, Tuple
+
+UPLOAD_DIR = os.environ.get("ORDER_ANALYSIS_UPLOAD_DIR", os.path.join(gettempdir(), "order_analysis_uploads"))
+
+_CHUNK = 1 << 20
+_DIGEST_NAME = re.compile(r"[0-9a-f]{64}")
+
+# 存储之外的文件（命令行传入的路径）按 (路径, 大小, 修改时间) 缓存摘要，避免重复计算
+_DIGEST_MEMO: Dict[tuple, str] = {}
+
+
+def save_stream(stream, filename: str) -> Tuple[str, str]:
+    """把上传流写入存储，返回 (摘要, 存储路径)；内容已存在时直接复用已有文件。
+
+    filename 应已经过 secure_filename 处理。
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    h = hashlib.sha256()
+    tmp = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                chunk = stream.read(_CHUNK)
+                if not chunk:
+                    break
+                h.update(chunk)
+                out.write(chunk)
+        digest = h.hexdigest()
+        path = stored_path(digest)
+        if path is not None:
+            os.remove(tmp)
+            os.utime(path)  # 刷新修改时间，供过期清理参考
+        else:
+            folder = os.path.join(UPLOAD_DIR, digest)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, filename or "upload")
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return digest, path
+
+
+def stored_path(digest: str) -> Optional[str]:
+    """返回存储中该摘要对应的文件路径，不存在（或不是合法摘要）时返回 None"""
+    if not _DIGEST_NAME.fullmatch(digest):
+        return None
+    folder = os.path.join(UPLOAD_DIR, digest)
+    try:
+        names = sorted(os.listdir(folder))
+    except OSError:
+        return None
+    return os.path.join(folder, names[0]) if names else None
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(path: str) -> Optional[str]:
+    """返回文件内容的 SHA-256；存储中的文件直接取目录名，文件不可访问时返回 None"""
+    folder = os.path.dirname(os.path.abspath(path))
+    if _DIGEST_NAME.fullmatch(os.path.basename(folder)) and os.path.dirname(folder) == os.path.abspath(UPLOAD_DIR):
+        return os.path.basename(folder) if os.path.exists(path) else None
+    try:
+        st = os.stat(path)
+        ident = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        digest = _DIGEST_MEMO.get(ident)
+        if digest is None:
+            digest = _DIGEST_MEMO[ident] = _hash_file(path)
+    except OSError:
+        return None
+    return digest
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xlsx_reader.py
+--------------------------------------------------
+按列投影的 .xlsx 工作表读取器。
+
+订单导出通常有 50 列左右，但计算只需要其中 5~6 列。openpyxl 即使在只读
+模式下也会为每一个单元格解码取值、查共享字符串、转换日期；这里直接从 zip
+中流式解析工作表 XML，只对投影列的单元格取值：
+1. 共享字符串 (sharedStrings.xml) 按需增量加载，只有保留下来的单元格才会查表；
+2. 数字格式为日期的单元格直接按序列号换算成日期（按天取整），不构造 datetime；
+3. 解析过程中及时清理已处理的行节点，内存占用不随行数增长。
+
+标题行仍完整解码，供 _locate_cols / locate_columns 定位列。
+"""
+
+import posixpath
+from datetime import date, datetime
+from typing import Dict, List, Sequence
+from xml.etree.ElementTree import iterparse
+from zipfile import ZipFile
+
+from openpyxl.styles.numbers import builtin_format_code, is_date_format
+from openpyxl.utils import column_index_from_string, get_column_letter
+from openpyxl.utils.exceptions import InvalidFileException
+
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+ROW_TAG = SHEET_NS + "row"
+CELL_TAG = SHEET_NS + "c"
+VALUE_TAG = SHEET_NS + "v"
+INLINE_TAG = SHEET_NS + "is"
+TEXT_TAG = SHEET_NS + "t"
+RUN_TAG = SHEET_NS + "r"
+DATA_TAG = SHEET_NS + "sheetData"
+SI_TAG = SHEET_NS + "si"
+SST_TAG = SHEET_NS + "sst"
+
+_DIGITS = "0123456789"
+# Excel 1900 / 1904 日期系统的起点（按 date.toordinal 计）
+_EPOCH_1900 = date(1899, 12, 30).toordinal()
+_EPOCH_1904 = date(1904, 1, 1).toordinal()
+
+
+def _iter_complete(source, tag: str, parent_tag: str):
+    """流式产出已完整解析的 tag 节点。
+
+    只监听 start 事件：下一个同级节点开始时，上一个节点必然已解析完毕。
+    每处理一批就清空父节点，避免已处理节点在树中累积。
+    """
+    parent = None
+    prev = None
+    count = 0
+    for _, elem in iterparse(source, events=("start",)):
+        if elem.tag == tag:
+            if prev is not None:
+                yield prev
+                count += 1
+                if parent is not None and count % 512 == 0:
+                    # 当前节点仍由解析器持有，清空父节点不影响其后续填充
+                    parent.clear()
+            prev = elem
+        elif elem.tag == parent_tag:
+            parent = elem
+    if prev is not None:
+        yield prev
+
+
+def _rich_text(elem) -> str:
+    """拼接 <is>/<si> 中的文本（含富文本 run，忽略拼音 rPh）"""
+    parts = []
+    for child in elem:
+        if child.tag == TEXT_TAG:
+            parts.append(child.text or "")
+        elif child.tag == RUN_TAG:
+            t = child.find(TEXT_TAG)
+            if t is not None:
+                parts.append(t.text or "")
+    return "".join(parts)
+
+
+class _SharedStrings:
+    """共享字符串表：按需增量解析，只解析到被引用的最大下标为止"""
+
+    def __init__(self, archive: ZipFile, path):
+        self._items: List[str] = []
+        self._source = archive.open(path) if path else None
+        self._iter = _iter_complete(self._source, SI_TAG, SST_TAG) if path else iter(())
+
+    def __getitem__(self, idx: int) -> str:
+        items = self._items
+        while idx >= len(items):
+            si = next(self._iter, None)
+            if si is None:
+                raise IndexError(f"共享字符串下标越界: {idx}")
+            items.append(_rich_text(si))
+        return items[idx]
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+
+
+def _read_rels(archive: ZipFile, part: str) -> Dict[str, tuple]:
+    """读取某个部件的关系文件，返回 {rId: (Type, 绝对路径)}"""
+    folder, name = posixpath.split(part)
+    rels_path = posixpath.join(folder, "_rels", name + ".rels")
+    rels = {}
+    if rels_path not in archive.NameToInfo:
+        return rels
+    with archive.open(rels_path) as f:
+        for _, elem in iterparse(f):
+            if elem.tag == PKG_REL_NS + "Relationship":
+                target = elem.get("Target", "")
+                if target.startswith("/"):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join(folder, target))
+                rels[elem.get("Id")] = (elem.get("Type", ""), target)
+    return rels
+
+
+class XlsxSheetReader:
+    """读取工作簿的活动工作表。
+
+    用法::
+
+        reader = XlsxSheetReader(fp)
+        headers = reader.read_header()
+        for row in reader.iter_rows([3, 6, 24], min_row=3):
+            ...
+        reader.close()
+    """
+
+    def __init__(self, fp):
+        self._archive = ZipFile(fp)  # 非 zip 文件在这里抛出 BadZipFile
+        names = self._archive.NameToInfo
+        wb_path = "xl/workbook.xml"
+        if wb_path not in names:
+            raise InvalidFileException("不是有效的 .xlsx 文件: 缺少 xl/workbook.xml")
+
+        rels = _read_rels(self._archive, wb_path)
+        sheet_rids = []
+        active_tab = 0
+        self._epoch = _EPOCH_1900
+        with self._archive.open(wb_path) as f:
+            for _, elem in iterparse(f):
+                if elem.tag == SHEET_NS + "sheet":
+                    sheet_rids.append(elem.get(REL_NS + "id"))
+                elif elem.tag == SHEET_NS + "workbookView":
+                    active_tab = int(elem.get("activeTab", 0) or 0)
+                elif elem.tag == SHEET_NS + "workbookPr":
+                    if elem.get("date1904") in ("1", "true"):
+                        self._epoch = _EPOCH_1904
+        if not sheet_rids:
+            raise InvalidFileException("工作簿中没有工作表")
+        if not 0 <= active_tab < len(sheet_rids):
+            active_tab = 0
+        self._sheet_path = rels[sheet_rids[active_tab]][1]
+
+        sst_path = styles_path = None
+        for rel_type, target in rels.values():
+            if rel_type.endswith("/sharedStrings"):
+                sst_path = target
+            elif rel_type.endswith("/styles"):
+                styles_path = target
+        self._shared = _SharedStrings(self._archive, sst_path)
+        self._date_styles = self._read_date_styles(styles_path)
+        self._day_cache: Dict[int, date] = {}
+
+        self._source = self._archive.open(self._sheet_path)
+        self._rows = _iter_complete(self._source, ROW_TAG, DATA_TAG)
+        self._row_no = 0
+        self._pending = None
+
+    def _read_date_styles(self, path) -> frozenset:
+        """返回数字格式为日期的单元格样式下标 (cellXfs 下标)"""
+        if not path or path not in self._archive.NameToInfo:
+            return frozenset()
+        custom: Dict[int, str] = {}
+        xf_formats: List[int] = []
+        in_cell_xfs = False
+        with self._archive.open(path) as f:
+            for event, elem in iterparse(f, events=("start", "end")):
+                if elem.tag == SHEET_NS + "cellXfs":
+                    in_cell_xfs = event == "start"
+                elif event == "end":
+                    if elem.tag == SHEET_NS + "numFmt":
+                        custom[int(elem.get("numFmtId"))] = elem.get("formatCode", "")
+                    elif elem.tag == SHEET_NS + "xf" and in_cell_xfs:
+                        xf_formats.append(int(elem.get("numFmtId", 0) or 0))
+        dates = set()
+        for idx, fmt_id in enumerate(xf_formats):
+            fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+            if fmt and is_date_format(fmt):
+                dates.add(idx)
+        return frozenset(dates)
+
+    def _next_row(self):
+        """返回 (行号, row 节点)，无更多行时返回 (None, None)"""
+        if self._pending is not None:
+            row, self._pending = self._pending, None
+            return row
+        elem = next(self._rows, None)
+        if elem is None:
+            return None, None
+        r = elem.get("r")
+        self._row_no = int(r) if r else self._row_no + 1
+        return self._row_no, elem
+
+    def _cell_value(self, cell):
+        """按 openpyxl data_only 的规则解码单个单元格"""
+        t = cell.get("t", "n")
+        if t == "inlineStr":
+            child = cell.find(INLINE_TAG)
+            return _rich_text(child) if child is not None else None
+        v = cell.find(VALUE_TAG)
+        text = v.text if v is not None else None
+        if not text:
+            return None
+        if t == "n":
+            style = cell.get("s")
+            if style and int(style) in self._date_styles:
+                return self._to_day(float(text))
+            if "." in text or "E" in text or "e" in text:
+                return float(text)
+            return int(text)
+        if t == "s":
+            return self._shared[int(text)]
+        if t == "b":
+            return bool(int(text))
+        if t == "d":
+            try:
+                return datetime.fromisoformat(text)
+            except ValueError:
+                return text
+        # str / e：按原文返回
+        return text
+
+    def _to_day(self, serial: float):
+        """Excel 序列号 -> date（按天取整，与 openpyxl from_excel 的 1900 闰年修正保持一致）"""
+        day = int(serial // 1)
+        if 0 < serial < 60 and self._epoch == _EPOCH_1900:
+            day += 1
+        d = self._day_cache.get(day)
+        if d is None:
+            d = self._day_cache[day] = date.fromordinal(self._epoch + day)
+        return d
+
+    def read_header(self) -> List:
+        """读取第 1 行的全部单元格"""
+        row_no, elem = self._next_row()
+        if elem is None:
+            return []
+        if row_no != 1:
+            # 第一行为空：标题缺失，把读到的行留给 iter_rows
+            self._pending = (row_no, elem)
+            return []
+        values: List = []
+        for cell in elem:
+            ref = cell.get("r")
+            idx = column_index_from_string(ref.rstrip(_DIGITS)) - 1 if ref else len(values)
+            if idx >= len(values):
+                values.extend([None] * (idx + 1 - len(values)))
+            values[idx] = self._cell_value(cell)
+        return values
+
+    def iter_rows(self, columns: Sequence[int], min_row: int = 1):
+        """逐行产出投影列的取值元组，顺序与 columns 一致（0-based 列下标）"""
+        width = len(columns)
+        by_letter = {get_column_letter(c + 1): pos for pos, c in enumerate(columns)}
+        by_index = {c: pos for pos, c in enumerate(columns)}
+        empty = (None,) * width
+        cell_value = self._cell_value
+
+        while True:
+            row_no, elem = self._next_row()
+            if elem is None:
+                break
+            if row_no < min_row:
+                continue
+            values = None
+            last = None  # 最近一个带坐标单元格的列字母
+            col = -1     # 当前单元格的 0-based 列下标（仅在坐标缺失时推算）
+            for cell in elem:
+                ref = cell.get("r")
+                if ref is not None:
+                    last = ref.rstrip(_DIGITS)
+                    pos = by_letter.get(last)
+                    col = None
+                else:
+                    # 缺少坐标的单元格按位置顺延
+                    if col is None:
+                        col = column_index_from_string(last) - 1
+                    col += 1
+                    pos = by_index.get(col)
+                if pos is None:
+                    continue
+                if values is None:
+                    values = [None] * width
+                values[pos] = cell_value(cell)
+            yield tuple(values) if values is not None else empty
+
+    def close(self):
+        self._source.close()
+        self._shared.close()
+        self._archive.close()
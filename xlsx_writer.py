@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xlsx_writer.py
+--------------------------------------------------
+边生成边输出的 .xlsx 写出器（与 xlsx_reader.py 对应）。
+
+openpyxl 即使在只写模式下也先把工作表写进临时文件，保存时再整体打包；
+这里直接把 xlsx 的各个部件写进一个面向不可 seek 输出的 zip 流，
+每生成一批行就产出一段字节，可直接作为 HTTP 响应体：
+1. 字符串使用内联字符串 (inlineStr)，不需要先收集整张共享字符串表；
+2. 维度 (<dimension>) 与列宽写在行数据之前，因此需要预先知道数据行数；
+3. zip 成员按数据描述符方式写出，不需要回头改写本地文件头。
+"""
+
+import re
+from typing import Iterable, Iterator, List, Sequence, Tuple
+from xml.sax.saxutils import escape, quoteattr
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from openpyxl.utils import get_column_letter
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# 每输出这么多行拼接一次 XML
+_ROW_BATCH = 1000
+# 压缩输出累积到这么多字节才产出一段
+_CHUNK = 64 * 1024
+# XML 1.0 不允许的控制字符（openpyxl 对此直接报错，这里去掉）
+_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_CONTENT_TYPES = (
+    _XML_DECL
+    + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "</Types>"
+)
+_ROOT_RELS = (
+    _XML_DECL
+    + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_WORKBOOK_RELS = (
+    _XML_DECL
+    + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+_STYLES = (
+    _XML_DECL
+    + f'<styleSheet xmlns="{_MAIN_NS}">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+
+
+class _Sink:
+    """不可 seek 的输出：缓存 zip 写出的字节，由 iter_zip 分段取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def iter_zip(members: Iterable[Tuple[str, Iterable[bytes]]]) -> Iterator[bytes]:
+    """把 (成员名, 字节段迭代器) 逐个压缩进 zip，边写边产出 zip 的字节"""
+    sink = _Sink()
+    with ZipFile(sink, "w", ZIP_DEFLATED) as zf:
+        for name, chunks in members:
+            with zf.open(name, "w") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    if sink.size >= _CHUNK:
+                        yield sink.drain()
+    yield sink.drain()
+
+
+def _cell(ref: str, value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    text = _ILLEGAL_CHARS.sub("", str(value))
+    space = ' xml:space="preserve"' if text != text.strip() else ""
+    return f'<c r="{ref}" t="inlineStr"><is><t{space}>{escape(text)}</t></is></c>'
+
+
+def _sheet_xml(headers: Sequence[str], row_count: int, rows: Iterable[Sequence], width: float) -> Iterator[bytes]:
+    letters = [get_column_letter(i) for i in range(1, len(headers) + 1)]
+    cols = "".join(f'<col min="{i}" max="{i}" width="{width}" customWidth="1"/>' for i in range(1, len(headers) + 1))
+    yield (
+        _XML_DECL
+        + f'<worksheet xmlns="{_MAIN_NS}">'
+        f'<dimension ref="A1:{letters[-1]}{row_count + 1}"/>'
+        '<sheetViews><sheetView workbookViewId="0"><selection activeCell="A1" sqref="A1"/></sheetView></sheetViews>'
+        '<sheetFormatPr baseColWidth="8" defaultRowHeight="15"/>'
+        f"<cols>{cols}</cols><sheetData>"
+    ).encode("utf-8")
+
+    def row_xml(r: int, values: Sequence) -> str:
+        cells = "".join(_cell(f"{letter}{r}", v) for letter, v in zip(letters, values))
+        return f'<row r="{r}">{cells}</row>'
+
+    batch = [row_xml(1, headers)]
+    for r, values in enumerate(rows, 2):
+        batch.append(row_xml(r, values))
+        if len(batch) >= _ROW_BATCH:
+            yield "".join(batch).encode("utf-8")
+            batch.clear()
+    batch.append(
+        '</sheetData><pageMargins left="0.75" right="0.75" top="1" bottom="1" header="0.5" footer="0.5"/></worksheet>'
+    )
+    yield "".join(batch).encode("utf-8")
+
+
+def xlsx_members(
+    title: str, headers: Sequence[str], row_count: int, rows: Iterable[Sequence], width: float = 14
+) -> Iterator[Tuple[str, Iterable[bytes]]]:
+    """单工作表 xlsx 的各个部件 (成员名, 字节段迭代器)；row_count 为数据行数（不含表头）"""
+    workbook = (
+        _XML_DECL
+        + f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+        f'<sheets><sheet name={quoteattr(title)} sheetId="1" r:id="rId1"/></sheets></workbook>'
+    )
+    yield "[Content_Types].xml", [_CONTENT_TYPES.encode("utf-8")]
+    yield "_rels/.rels", [_ROOT_RELS.encode("utf-8")]
+    yield "xl/workbook.xml", [workbook.encode("utf-8")]
+    yield "xl/_rels/workbook.xml.rels", [_WORKBOOK_RELS.encode("utf-8")]
+    yield "xl/styles.xml", [_STYLES.encode("utf-8")]
+    yield "xl/worksheets/sheet1.xml", _sheet_xml(headers, row_count, rows, width)
+
+
+def stream_workbook(
+    title: str, headers: Sequence[str], row_count: int, rows: Iterable[Sequence], width: float = 14
+) -> Iterator[bytes]:
+    """边生成边产出单工作表 xlsx 的字节（各列等宽 width）"""
+    return iter_zip(xlsx_members(title, headers, row_count, rows, width))